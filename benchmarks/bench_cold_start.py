@@ -0,0 +1,111 @@
+# benchmarks/bench_cold_start.py
+"""Cold-start benchmark: time from process start to ready-to-call API clients.
+
+Each sample is a fresh interpreter, as under cron. The "legacy" startup
+imports everything up front and calls build() once per API, each parsing
+its discovery document and creating its own HTTP transport. The "fast"
+startup is the current code path: pinned discovery documents, one shared
+authorized session and lazy optional imports. No network is used.
+
+    python benchmarks/bench_cold_start.py --runs 15
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+LEGACY = '''
+import time
+started = time.perf_counter()
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from google.auth.transport.requests import Request
+from googleapiclient.discovery import build
+from google.auth.credentials import AnonymousCredentials
+import pytz
+from bs4 import BeautifulSoup
+imported = time.perf_counter()
+creds = AnonymousCredentials()
+gmail = build('gmail', 'v1', credentials=creds)
+sheets = build('sheets', 'v4', credentials=creds)
+ready = time.perf_counter()
+'''
+
+FAST = '''
+import time
+started = time.perf_counter()
+import src.main
+from src.gmail_service import GmailService
+from src.sheets_service import SheetsService
+from google.auth.credentials import AnonymousCredentials
+imported = time.perf_counter()
+gmail = GmailService(credentials=AnonymousCredentials())
+gmail.service
+sheets = SheetsService(gmail.creds, http_factory=gmail.http_factory)
+ready = time.perf_counter()
+'''
+
+REPORT = '''
+import json, sys
+print(json.dumps({'import_ms': (imported - started) * 1000,
+                  'build_ms': (ready - imported) * 1000,
+                  'modules': len(sys.modules)}))
+'''
+
+
+def sample(script):
+    """Run script in a fresh interpreter; returns its timings plus wall time"""
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', script + REPORT],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings['wall_ms'] = (time.perf_counter() - start) * 1000
+    return timings
+
+
+def summarize(samples):
+    summary = {}
+    for key in ('wall_ms', 'import_ms', 'build_ms'):
+        values = [s[key] for s in samples]
+        summary[key] = {'median': round(statistics.median(values), 1),
+                        'min': round(min(values), 1)}
+    summary['modules'] = samples[-1]['modules']
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--output', help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    # One unmeasured run each: pins the discovery documents and warms the OS cache
+    sample(LEGACY)
+    sample(FAST)
+
+    results = {'legacy': [], 'fast': []}
+    for _ in range(args.runs):
+        # Interleave so drift on the machine hits both modes alike
+        results['legacy'].append(sample(LEGACY))
+        results['fast'].append(sample(FAST))
+
+    report = {mode: summarize(samples) for mode, samples in results.items()}
+    legacy, fast = report['legacy']['wall_ms']['median'], report['fast']['wall_ms']['median']
+    report['speedup'] = round(legacy / fast, 2)
+    report['runs'] = args.runs
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
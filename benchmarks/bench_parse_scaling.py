@@ -0,0 +1,60 @@
+# benchmarks/bench_parse_scaling.py
+"""Parsing throughput versus worker process count.
+
+Parses the same HTML-heavy corpus in-process and through ProcessPoolParser
+with 1..N workers, checks that every record matches the in-process result,
+and prints messages/sec and speedup over the in-process baseline.
+
+    python benchmarks/bench_parse_scaling.py [--count 2000] [--html-ratio 0.8]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.corpus import make_message
+from src.email_parser import EmailParser
+from src.parallel_parser import ProcessPoolParser
+
+
+def worker_counts(max_workers):
+    counts = [1]
+    while counts[-1] * 2 <= max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--html-ratio', type=float, default=0.8)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=25)
+    args = parser.parse_args(argv)
+
+    messages = [make_message(i, html_ratio=args.html_ratio) for i in range(args.count)]
+
+    start = time.perf_counter()
+    expected = [EmailParser.parse_email(message) for message in messages]
+    baseline = args.count / (time.perf_counter() - start)
+    print(f"cores available: {os.cpu_count()}")
+    print(f"{'mode':<14}{'msgs/sec':>12}{'speedup':>10}{'identical':>11}")
+    print(f"{'in-process':<14}{baseline:>12.0f}{1.0:>9.2f}x{'yes':>11}")
+
+    for workers in worker_counts(args.max_workers):
+        with ProcessPoolParser(workers, args.chunk_size) as pool:
+            pool.parse_batch(messages[:workers * args.chunk_size])  # Warm up workers
+            start = time.perf_counter()
+            records = pool.parse_batch(messages)
+            rate = args.count / (time.perf_counter() - start)
+        identical = 'yes' if records == expected else 'NO'
+        print(f"{f'{workers} process':<14}{rate:>12.0f}{rate / baseline:>9.2f}x{identical:>11}")
+
+
+if __name__ == '__main__':
+    main()
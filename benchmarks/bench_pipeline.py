@@ -0,0 +1,189 @@
+# benchmarks/bench_pipeline.py
+"""End-to-end throughput benchmark against the offline Gmail/Sheets stand-in.
+
+Runs the real GmailService, SheetsService and main.run_sync pipeline against
+FakeGoogleBackend with a synthetic mailbox, then reports messages/sec, API
+calls per message, bytes transferred and peak RSS. With --baseline the run
+is compared to a saved report and exits non-zero on a regression.
+
+    python benchmarks/bench_pipeline.py --messages 10000 --html-ratio 0.5 \\
+        --latency 0.05 --error-rate 0.01 --output report.json
+    python benchmarks/bench_pipeline.py --messages 10000 --baseline report.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from google.auth.credentials import AnonymousCredentials
+
+import config
+from benchmarks.fake_google import FakeGoogleBackend, SyntheticMailbox
+from src.dedup_index import DedupIndex
+from src.gmail_service import GmailService
+from src.main import run_sync
+from src.metrics import metrics
+from src.rate_limiter import AdaptiveRateLimiter
+from src.sheets_service import SheetsService
+from src.sinks import SINK_TYPES
+from src.state_manager import StateManager
+
+SPREADSHEET_ID = 'benchmark-spreadsheet'
+SHEET_NAME = 'Sheet1'
+
+# Metrics where a higher value is a regression (the rest: lower is worse)
+LOWER_IS_BETTER = {'api_calls_per_message', 'http_requests_per_message', 'bytes_per_message'}
+COMPARED = ['messages_per_sec'] + sorted(LOWER_IS_BETTER)
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_benchmark(args):
+    mailbox = SyntheticMailbox(args.messages, seed=args.seed,
+                               html_ratio=args.html_ratio, shape=args.shape)
+    backend = FakeGoogleBackend(mailbox, latency=args.latency,
+                                error_rate=args.error_rate, seed=args.seed)
+
+    # Quota is not what is measured here: let the limiter run flat out, but
+    # keep the real backoff logic (with short delays) for injected 429s
+    limiter = AdaptiveRateLimiter(
+        limits={'gmail': (1e9, 1e9), 'sheets': (1e9, 1e9)},
+        base_delay=0.01, max_delay=0.5, max_retries=8
+    )
+
+    config.MAX_EMAILS_PER_RUN = None
+    for name in ('FETCH_WORKERS', 'PARSE_WORKERS', 'LABEL_WORKERS', 'PARSE_MODE'):
+        value = getattr(args, name.lower())
+        if value is not None:
+            setattr(config, name, value)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Bodies for a content_hash column stay inside the scratch directory
+        config.BODY_STORE_PATH = os.path.join(workdir, 'bodies')
+        config.SQLITE_SINK_PATH = os.path.join(workdir, 'emails.db')
+        config.CSV_SINK_PATH = os.path.join(workdir, 'emails.csv')
+        config.PARQUET_SINK_DIR = os.path.join(workdir, 'parquet')
+        credentials = AnonymousCredentials()
+        gmail = GmailService(limiter, credentials=credentials, http_factory=backend.http)
+        sheets = SheetsService(credentials, limiter,
+                               cache_path=os.path.join(workdir, 'sheet_cache.json'),
+                               columns=args.columns, http_factory=backend.http)
+        state = StateManager(os.path.join(workdir, 'state.json'))
+        dedup = DedupIndex(os.path.join(workdir, 'processed_ids.db'))
+
+        if args.metrics:
+            metrics.enable()
+        output = sys.stdout if args.verbose else open(os.devnull, 'w')
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output):
+            result = run_sync(gmail, sheets, state, dedup, SPREADSHEET_ID, SHEET_NAME,
+                              sinks=args.sink)
+        elapsed = time.perf_counter() - start
+        dedup.close()
+
+    committed = max(result.committed, 1)
+    report = {
+        'messages': args.messages,
+        'committed': result.committed,
+        'marked_read': result.marked,
+        'failed': result.fetch_failed + result.parse_failed + result.write_failed,
+        'elapsed_sec': round(elapsed, 3),
+        'messages_per_sec': round(result.committed / elapsed, 1),
+        'http_requests': backend.http_requests,
+        'api_calls': backend.api_calls,
+        'http_requests_per_message': round(backend.http_requests / committed, 4),
+        'api_calls_per_message': round(backend.api_calls / committed, 4),
+        'bytes_sent': backend.bytes_sent,
+        'bytes_received': backend.bytes_received,
+        'bytes_per_message': round((backend.bytes_sent + backend.bytes_received) / committed),
+        'injected_429s': backend.throttled,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'calls_by_method': dict(sorted(backend.calls.items())),
+        'settings': {
+            'html_ratio': args.html_ratio, 'shape': args.shape, 'latency': args.latency,
+            'error_rate': args.error_rate, 'columns': args.columns, 'sinks': args.sink,
+            'fetch_workers': config.FETCH_WORKERS, 'parse_workers': config.PARSE_WORKERS,
+            'label_workers': config.LABEL_WORKERS, 'parse_mode': config.PARSE_MODE,
+        },
+    }
+    if args.metrics:
+        report['metrics'] = metrics.report()
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """Return regressions of report against baseline beyond tolerance"""
+    regressions = []
+    for metric in COMPARED:
+        old, new = baseline.get(metric), report.get(metric)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = change > tolerance if metric in LOWER_IS_BETTER else change < -tolerance
+        if worse:
+            regressions.append(f"{metric}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=10000)
+    parser.add_argument('--html-ratio', type=float, default=None,
+                        help="share of HTML-only messages (default: mix of all shapes)")
+    parser.add_argument('--shape', default=None, help="use a single corpus shape")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added per HTTP request")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="probability of a 429 per call")
+    parser.add_argument('--columns', nargs='+', default=None, help="sheet columns (default: config)")
+    parser.add_argument('--sink', action='append', choices=SINK_TYPES,
+                        help="sink to write to, repeatable (default: config.SINKS)")
+    parser.add_argument('--fetch-workers', type=int)
+    parser.add_argument('--parse-workers', type=int)
+    parser.add_argument('--label-workers', type=int)
+    parser.add_argument('--parse-mode', choices=['thread', 'process'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the JSON report here")
+    parser.add_argument('--baseline', help="compare against a previous JSON report")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="allowed relative change before a metric counts as regressed")
+    parser.add_argument('--verbose', action='store_true', help="show pipeline output")
+    parser.add_argument('--metrics', action='store_true',
+                        help="include stage timings and API latencies in the report")
+    args = parser.parse_args(argv)
+    if args.columns is None:
+        args.columns = config.SHEET_COLUMNS
+
+    report = run_benchmark(args)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if report['committed'] != args.messages:
+        print(f"✗ Only {report['committed']}/{args.messages} messages were committed")
+        return 1
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print("✗ Regressions against baseline:")
+            for regression in regressions:
+                print(f"   - {regression}")
+            return 1
+        print("✓ No regressions against baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+# benchmarks/corpus.py
+"""Synthetic Gmail API message resources for benchmarks.
+
+Messages mimic what users.messages.get(format='full') returns: a payload
+tree with base64url-encoded bodies. The shapes cover the common cases seen
+in real inboxes, from short plain-text notes to large HTML newsletters
+nested several multipart levels deep.
+"""
+import base64
+import random
+
+WORDS = (
+    "the quarterly report meeting invoice please review attached update team "
+    "project deadline schedule newsletter offer sale customer account order "
+    "shipping delivery confirm thanks regards hello welcome subscription"
+).split()
+
+SENDERS = [
+    'Alice Example <alice@example.com>',
+    'newsletter@shop.example',
+    '"Billing Team" <billing@service.example>',
+    '=?UTF-8?B?SsO8cmdlbiBNw7xsbGVy?= <jurgen@example.de>',
+]
+
+SUBJECTS = [
+    'Weekly update',
+    'Your order has shipped',
+    '=?UTF-8?Q?R=C3=A9sum=C3=A9_of_the_meeting?=',
+    'Re: Re: Fwd: project timeline',
+]
+
+# internalDate of message 0 in epoch seconds; message i arrives i seconds later
+INTERNAL_DATE_BASE = 1704103200
+
+
+def encode(text):
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii')
+
+
+def words(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+def plain_text(rng, paragraphs):
+    return '\n\n'.join(words(rng, rng.randint(20, 80)) for _ in range(paragraphs))
+
+
+def html_text(rng, blocks):
+    """Marketing-style HTML: nested tables, inline styles, tracking pixels"""
+    rows = []
+    for i in range(blocks):
+        rows.append(
+            f'<tr><td style="padding:12px;font-family:Arial,sans-serif;color:#333">'
+            f'<h2 style="margin:0">{words(rng, 4).title()}</h2>'
+            f'<p style="line-height:1.4">{words(rng, rng.randint(30, 90))} '
+            f'<a href="https://click.example/{i}?utm_source=mail">Shop now &raquo;</a></p>'
+            f'<img src="https://img.example/{i}.png" width="600" alt="banner"></td></tr>'
+        )
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8">'
+        '<style>td{font-size:14px} .x{display:none}</style>'
+        '<script>var tracking = {id: 1};</script></head><body>'
+        '<table width="100%" cellpadding="0" cellspacing="0">'
+        + ''.join(rows) +
+        '</table><img src="https://t.example/open.gif" width="1" height="1"></body></html>'
+    )
+
+
+def leaf(mime_type, text):
+    return {'mimeType': mime_type, 'filename': '', 'headers': [],
+            'body': {'size': len(text), 'data': encode(text)}}
+
+
+def attachment(rng, size):
+    data = base64.urlsafe_b64encode(rng.randbytes(size)).decode('ascii')
+    return {'mimeType': 'application/pdf', 'filename': 'report.pdf', 'headers': [],
+            'body': {'size': size, 'attachmentId': 'ANGjdJ' + data[:40]}}
+
+
+def multipart(mime_type, parts):
+    return {'mimeType': mime_type, 'filename': '', 'headers': [],
+            'body': {'size': 0}, 'parts': parts}
+
+
+def make_payload(rng, shape):
+    """Build a payload tree for one of the SHAPES"""
+    if shape == 'plain':
+        return leaf('text/plain', plain_text(rng, rng.randint(1, 5)))
+    if shape == 'large_plain':
+        return leaf('text/plain', plain_text(rng, 1500))
+    if shape == 'alternative':
+        return multipart('multipart/alternative', [
+            leaf('text/plain', plain_text(rng, 3)),
+            leaf('text/html', html_text(rng, 5)),
+        ])
+    if shape == 'html_only':
+        return leaf('text/html', html_text(rng, rng.randint(10, 40)))
+    if shape == 'newsletter':
+        return multipart('multipart/alternative', [leaf('text/html', html_text(rng, 400))])
+    if shape == 'nested':
+        # mixed -> related -> alternative -> html, plus an attachment
+        return multipart('multipart/mixed', [
+            multipart('multipart/related', [
+                multipart('multipart/alternative', [
+                    leaf('text/html', html_text(rng, 60)),
+                ]),
+            ]),
+            attachment(rng, 2048),
+        ])
+    raise ValueError(f"Unknown shape: {shape}")
+
+
+SHAPES = ['plain', 'large_plain', 'alternative', 'html_only', 'newsletter', 'nested']
+
+
+def make_message(index, shape=None, seed=0, html_ratio=None):
+    """Deterministically build message number `index`.
+
+    The same (index, seed) always gives the same message, so a mailbox of any
+    size can be generated on demand without keeping it in memory.
+    html_ratio, when given, is the share of messages that carry only HTML.
+    """
+    rng = random.Random(seed * 1_000_003 + index)
+    if shape is None:
+        if html_ratio is not None:
+            shape = rng.choice(['html_only', 'newsletter', 'nested']
+                               if rng.random() < html_ratio else ['plain', 'alternative'])
+        else:
+            shape = rng.choice(SHAPES)
+    payload = make_payload(rng, shape)
+    headers = [
+        {'name': 'From', 'value': rng.choice(SENDERS)},
+        {'name': 'To', 'value': 'me@example.com'},
+        {'name': 'Subject', 'value': rng.choice(SUBJECTS)},
+        {'name': 'Date', 'value': f'Mon, {1 + index % 28} Jan 2024 10:{index % 60:02d}:00 +0000'},
+        {'name': 'Content-Type', 'value': payload['mimeType']},
+    ]
+    payload = dict(payload, headers=headers)
+    msg_id = f'{index:016x}'
+    return {
+        'id': msg_id,
+        'threadId': msg_id,
+        'labelIds': ['INBOX', 'UNREAD'],
+        'snippet': words(rng, 20),
+        'historyId': str(1000 + index),
+        'internalDate': str((INTERNAL_DATE_BASE + index) * 1000),
+        'sizeEstimate': len(str(payload)),
+        'payload': payload,
+    }
+
+
+def make_corpus(count=200, seed=0):
+    """A mixed corpus covering every shape"""
+    return [make_message(i, SHAPES[i % len(SHAPES)], seed) for i in range(count)]
@@ -0,0 +1,389 @@
+# benchmarks/fake_google.py
+"""In-process stand-in for the Gmail and Sheets REST APIs.
+
+FakeGoogleBackend answers the HTTP requests googleapiclient sends, including
+Gmail batch (multipart/mixed) requests, from a SyntheticMailbox and an
+in-memory spreadsheet. Pass `backend.http` as the services' http_factory and
+the real GmailService/SheetsService/pipeline code runs unchanged, offline.
+
+Latency and 429 rates can be injected, and every request is counted so
+benchmarks can report API calls and bytes transferred per message.
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from email.parser import FeedParser
+from urllib.parse import parse_qs, unquote, urlparse
+
+import httplib2
+
+from benchmarks.corpus import INTERNAL_DATE_BASE, make_message
+
+REASONS = {200: 'OK', 204: 'No Content', 400: 'Bad Request', 404: 'Not Found',
+           429: 'Too Many Requests'}
+
+RATE_LIMITED = {'error': {'code': 429, 'message': 'Rate Limit Exceeded',
+                          'errors': [{'reason': 'rateLimitExceeded'}]}}
+
+
+def parse_fields(mask):
+    """Parse a partial-response fields mask into a nested dict (None = all)"""
+    pos = 0
+
+    def parse_list():
+        nonlocal pos
+        tree = {}
+        while pos < len(mask) and mask[pos] != ')':
+            path = re.match(r'[\w/.]+', mask[pos:]).group(0)
+            pos += len(path)
+            sub = None
+            if pos < len(mask) and mask[pos] == '(':
+                pos += 1
+                sub = parse_list()
+                pos += 1  # Closing parenthesis
+            node = tree
+            keys = re.split(r'[/.]', path)
+            for key in keys[:-1]:
+                node = node.setdefault(key, {})
+            node[keys[-1]] = sub
+            if pos < len(mask) and mask[pos] == ',':
+                pos += 1
+        return tree
+
+    return parse_list()
+
+
+def project(value, tree):
+    """Apply a parsed fields mask to a response"""
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: project(value[key], sub) for key, sub in tree.items() if key in value}
+    return value
+
+
+def column_index(letters):
+    """A1 column letters to a 1-based index"""
+    index = 0
+    for char in letters:
+        index = index * 26 + ord(char) - ord('A') + 1
+    return index
+
+
+class SyntheticMailbox:
+    """A mailbox of `size` unread inbox messages generated on demand.
+
+    Messages are rebuilt from their index every time they are fetched, so
+    memory stays flat even for a million messages; only read/unread state is
+    stored. Listing returns newest first, like Gmail.
+    """
+
+    def __init__(self, size, seed=0, html_ratio=None, shape=None):
+        self.size = size
+        self.seed = seed
+        self.html_ratio = html_ratio
+        self.shape = shape
+        self.read = set()
+        self.history_id = 1000 + size
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def message_id(index):
+        return f'{index:016x}'
+
+    def contains(self, msg_id):
+        try:
+            return 0 <= int(msg_id, 16) < self.size
+        except ValueError:
+            return False
+
+    def get(self, msg_id):
+        message = make_message(int(msg_id, 16), self.shape, self.seed, self.html_ratio)
+        if msg_id in self.read:
+            message['labelIds'] = ['INBOX']
+        return message
+
+    def index_range(self, after=None, before=None):
+        """Message indexes whose internalDate is in (after, before), epoch seconds"""
+        low = 0 if after is None else max(0, after + 1 - INTERNAL_DATE_BASE)
+        high = self.size if before is None else min(self.size, max(0, before - INTERNAL_DATE_BASE))
+        return low, max(low, high)
+
+    def list_unread(self, start, page_size, after=None, before=None):
+        """Unread ids from position `start` (newest first); returns (ids, next)"""
+        low, high = self.index_range(after, before)
+        ids = []
+        position = start
+        while position < high - low and len(ids) < page_size:
+            msg_id = self.message_id(high - 1 - position)
+            position += 1
+            if msg_id not in self.read:
+                ids.append(msg_id)
+        return ids, (position if position < high - low else None)
+
+    def mark_read(self, msg_ids):
+        with self._lock:
+            self.read.update(msg_ids)
+            self.history_id += 1
+
+
+class FakeSpreadsheet:
+    """Spreadsheet tabs that remember their header and Message_ID column.
+
+    Only the column holding message ids is kept per row (plus a row count),
+    which is all the sync reads back, so a million appended rows stay cheap.
+    """
+
+    def __init__(self):
+        self.tabs = {'Sheet1': {'sheetId': 0, 'header': [], 'ids': []}}
+        self.next_sheet_id = 1
+
+    def tab(self, title):
+        return self.tabs.get(title)
+
+
+class FakeHttp:
+    """httplib2.Http look-alike that forwards requests to a FakeGoogleBackend"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=None, connection_type=None):
+        return self.backend.request(uri, method, body, headers or {})
+
+
+class FakeGoogleBackend:
+    """Routes Gmail and Sheets API calls to in-memory state"""
+
+    def __init__(self, mailbox, latency=0.0, error_rate=0.0, seed=0):
+        self.mailbox = mailbox
+        self.spreadsheets = {}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.http_requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.throttled = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def http(self):
+        """http_factory for GmailService/SheetsService"""
+        return FakeHttp(self)
+
+    @property
+    def api_calls(self):
+        return sum(self.calls.values())
+
+    def _throttle(self):
+        with self._lock:
+            if self.error_rate and self._rng.random() < self.error_rate:
+                self.throttled += 1
+                return True
+        return False
+
+    def request(self, uri, method, body, headers):
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        with self._lock:
+            self.http_requests += 1
+            self.bytes_sent += len(uri) + len(body or b'')
+
+        url = urlparse(uri)
+        if url.path == '/batch' or url.path.startswith('/batch/'):
+            status, response_headers, content = self._batch(body, headers)
+        else:
+            status, payload = self._route(method, url, body)
+            response_headers = {'content-type': 'application/json; charset=UTF-8'}
+            content = b'' if payload is None else json.dumps(payload).encode('utf-8')
+
+        with self._lock:
+            self.bytes_received += len(content)
+        response_headers['status'] = str(status)
+        return httplib2.Response(response_headers), content
+
+    def _route(self, method, url, body):
+        """Handle one API call; returns (status, JSON payload or None)"""
+        if self._throttle():
+            return 429, RATE_LIMITED
+        query = {key: values if len(values) > 1 else values[0]
+                 for key, values in parse_qs(url.query).items()}
+        data = json.loads(body) if body else {}
+        path = unquote(url.path)
+
+        try:
+            if path.startswith('/gmail/v1/users/me/'):
+                status, payload = self._gmail(method, path[len('/gmail/v1/users/me/'):], query, data)
+            elif path.startswith('/v4/spreadsheets/'):
+                status, payload = self._sheets(method, path[len('/v4/spreadsheets/'):], query, data)
+            else:
+                status, payload = 404, {'error': {'code': 404, 'message': f'No route for {path}'}}
+        except KeyError as e:
+            status, payload = 404, {'error': {'code': 404, 'message': f'Not found: {e}'}}
+
+        if status == 200 and 'fields' in query:
+            payload = project(payload, parse_fields(query['fields']))
+        return status, payload
+
+    def _count(self, method):
+        with self._lock:
+            self.calls[method] += 1
+
+    def _gmail(self, method, path, query, data):
+        mailbox = self.mailbox
+        if path == 'profile':
+            self._count('gmail.getProfile')
+            return 200, {'emailAddress': 'me@example.com', 'historyId': str(mailbox.history_id)}
+        if path == 'history':
+            # No mail arrives during a benchmark run
+            self._count('gmail.history.list')
+            return 200, {'historyId': str(mailbox.history_id)}
+        if path == 'messages' and method == 'GET':
+            self._count('gmail.messages.list')
+            # Only the after:/before: epoch terms of the search are honoured
+            terms = dict(term.split(':', 1) for term in query.get('q', '').split()
+                         if term.startswith(('after:', 'before:')))
+            after, before = (int(terms[k]) if terms.get(k, '').isdigit() else None
+                             for k in ('after', 'before'))
+            ids, next_position = mailbox.list_unread(
+                int(query.get('pageToken', 0)), int(query.get('maxResults', 100)), after, before)
+            low, high = mailbox.index_range(after, before)
+            payload = {'messages': [{'id': i, 'threadId': i} for i in ids],
+                       'resultSizeEstimate': high - low}
+            if next_position is not None:
+                payload['nextPageToken'] = str(next_position)
+            return 200, payload
+        if path == 'messages/batchModify':
+            self._count('gmail.messages.batchModify')
+            mailbox.mark_read(data['ids'])
+            return 204, None
+        if path.startswith('messages/'):
+            msg_id, _, action = path[len('messages/'):].partition('/')
+            if not mailbox.contains(msg_id):
+                return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}}
+            if action == 'modify':
+                self._count('gmail.messages.modify')
+                mailbox.mark_read([msg_id])
+                return 200, {'id': msg_id}
+            self._count('gmail.messages.get')
+            return 200, self._format_message(mailbox.get(msg_id), query)
+        return 404, {'error': {'code': 404, 'message': f'No Gmail route for {path}'}}
+
+    @staticmethod
+    def _format_message(message, query):
+        if query.get('format') == 'metadata':
+            wanted = query.get('metadataHeaders', [])
+            wanted = {wanted} if isinstance(wanted, str) else set(wanted)
+            payload = message['payload']
+            message['payload'] = {
+                'mimeType': payload['mimeType'],
+                'headers': [h for h in payload['headers'] if not wanted or h['name'] in wanted],
+            }
+        return message
+
+    def _sheets(self, method, path, query, data):
+        spreadsheet_id, _, rest = path.partition('/')
+        spreadsheet_id, _, action = spreadsheet_id.partition(':')
+        with self._lock:
+            spreadsheet = self.spreadsheets.setdefault(spreadsheet_id, FakeSpreadsheet())
+
+        if not rest and action == 'batchUpdate':
+            self._count('sheets.batchUpdate')
+            replies = []
+            with self._lock:
+                for request in data.get('requests', []):
+                    if 'addSheet' in request:
+                        title = request['addSheet']['properties']['title']
+                        sheet_id = spreadsheet.next_sheet_id
+                        spreadsheet.next_sheet_id += 1
+                        spreadsheet.tabs[title] = {'sheetId': sheet_id, 'header': [], 'ids': []}
+                        replies.append({'addSheet': {'properties': {'sheetId': sheet_id, 'title': title}}})
+                    else:
+                        replies.append({})
+            return 200, {'spreadsheetId': spreadsheet_id, 'replies': replies}
+        if not rest:
+            self._count('sheets.get')
+            return 200, {'spreadsheetId': spreadsheet_id, 'sheets': [
+                {'properties': {'sheetId': tab['sheetId'], 'title': title}}
+                for title, tab in spreadsheet.tabs.items()
+            ]}
+
+        value_range = rest[len('values/'):]
+        value_action = None
+        if value_range.endswith(':append'):
+            value_range, value_action = value_range[:-len(':append')], 'append'
+        title, _, cells = value_range.rpartition('!')
+        tab = spreadsheet.tab(title)
+        if tab is None:
+            return 400, {'error': {'code': 400, 'message': f'Unable to parse range: {value_range}'}}
+
+        if value_action == 'append':
+            self._count('sheets.values.append')
+            values = data.get('values', [])
+            with self._lock:
+                id_index = tab['header'].index('Message_ID') if 'Message_ID' in tab['header'] else None
+                for row in values:
+                    tab['ids'].append(row[id_index] if id_index is not None and id_index < len(row) else '')
+                last_row = len(tab['ids']) + 1
+            return 200, {'updates': {
+                'updatedRange': f'{title}!A{last_row - len(values) + 1}:{last_row}',
+                'updatedRows': len(values),
+                'updatedCells': sum(len(row) for row in values),
+            }}
+        if method == 'PUT':
+            self._count('sheets.values.update')
+            with self._lock:
+                tab['header'] = list(data.get('values', [[]])[0])
+            return 200, {'updatedRows': 1}
+
+        self._count('sheets.values.get')
+        match = re.match(r'([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?$', cells)
+        column, start_row = match.group(1), int(match.group(2) or 1)
+        with self._lock:
+            header = tab['header']
+            index = column_index(column)
+            # Row 1 is the header; only the Message_ID column has data rows
+            values = [[header[index - 1]]] if index <= len(header) else [[]]
+            if 'Message_ID' in header and index == header.index('Message_ID') + 1:
+                values += [[msg_id] for msg_id in tab['ids']]
+            values = values[start_row - 1:]
+        return 200, {'range': value_range, 'majorDimension': 'ROWS', 'values': values}
+
+    def _batch(self, body, headers):
+        """Answer a multipart/mixed batch request part by part"""
+        self._count('batch')
+        content_type = {k.lower(): v for k, v in headers.items()}['content-type']
+        parser = FeedParser()
+        parser.feed(f'content-type: {content_type}\r\n\r\n')
+        parser.feed(body.decode('utf-8'))
+        envelope = parser.close()
+
+        boundary = 'fake_batch_boundary'
+        chunks = []
+        for part in envelope.get_payload():
+            content_id = part['Content-ID'].strip('<>')
+            request = part.get_payload()
+            head, _, sub_body = re.split(r'(\r?\n\r?\n)', request, maxsplit=1)
+            sub_method, target, _ = head.splitlines()[0].split(' ', 2)
+            status, payload = self._route(sub_method, urlparse(target), sub_body.encode('utf-8'))
+            content = '' if payload is None else json.dumps(payload)
+            chunks.append(
+                f'--{boundary}\r\n'
+                f'Content-Type: application/http\r\n'
+                f'Content-ID: <response-{content_id}>\r\n\r\n'
+                f'HTTP/1.1 {status} {REASONS.get(status, "")}\r\n'
+                f'Content-Type: application/json; charset=UTF-8\r\n'
+                f'Content-Length: {len(content.encode("utf-8"))}\r\n\r\n'
+                f'{content}\r\n'
+            )
+        chunks.append(f'--{boundary}--\r\n')
+        return 200, {'content-type': f'multipart/mixed; boundary={boundary}'}, ''.join(chunks).encode('utf-8')
@@ -16,5 +16,58 @@ SCOPES = [
 SPREADSHEET_ID = "1-v4qcX1d2pRu0YLd-L9CdKp1mXKjHIDHVoJKcCUMbok"  # You'll get this from your sheet URL
 SHEET_NAME = "Email Log"
 
+# Sheet columns, in order; drop "content" to log headers only (much cheaper fetches).
+# Add "content_hash" to keep full bodies in a local store and only a preview in the sheet.
+SHEET_COLUMNS = ["from", "subject", "date", "content", "message_id"]
+SHEET_PARTITION = None  # None (one tab), "month" (a tab per month) or "size" (roll over when full)
+SHEET_PARTITION_MAX_ROWS = 100_000  # Data rows per partition tab before rolling over
+BODY_STORE_PATH = BASE_DIR / "data" / "bodies"  # Full bodies for the "content_hash" column
+BODY_STORE_MAX_BYTES = 1024 ** 3  # Compressed size before least recently used bodies are evicted
+BODY_PREVIEW_CHARS = 500  # Characters of the body kept in the "content" column
+FETCH_PROFILE = None  # "metadata", "text" or "full"; None picks the cheapest for SHEET_COLUMNS
+
+# Where rows are written: any of "sheets", "sqlite", "csv", "parquet" (several fan out)
+SINKS = ["sheets"]
+SQLITE_SINK_PATH = BASE_DIR / "data" / "emails.db"
+CSV_SINK_PATH = BASE_DIR / "data" / "emails.csv"
+PARQUET_SINK_DIR = BASE_DIR / "data" / "parquet"  # Needs pyarrow (pip install pyarrow)
+SINK_COLUMNS = None  # Record fields kept by local sinks (None = src.sinks.SINK_COLUMNS)
+SINK_BATCH_ROWS = 5000  # Rows per SQLite transaction or CSV write; Parquet row groups are 10x this
+
+# Raw Gmail responses kept for --reparse-from-cache and to skip re-downloads.
+# Off by default: the cache holds a copy of every message (up to
+# MESSAGE_CACHE_MAX_BYTES on disk). Responses are cached as fetched: use
+# FETCH_PROFILE = "full" to be able to reparse with any parser or column change.
+MESSAGE_CACHE_ENABLED = False
+MESSAGE_CACHE_PATH = BASE_DIR / "data" / "message_cache.db"
+MESSAGE_CACHE_MAX_BYTES = 2 * 1024 ** 3  # Compressed size before least recently used entries go
+
 # Email processing
-MAX_RESULTS = 50  # Max emails to process per run
\ No newline at end of file
+MAX_EMAILS_PER_RUN = 1000  # Max new emails to process per run (None for no limit)
+LIST_PAGE_SIZE = 500  # Message ids per messages.list page (Gmail allows up to 500)
+BACKFILL_QUERY = "in:inbox"  # Messages imported by --backfill (read or unread)
+BACKFILL_WINDOW_SIZE = 2000  # Target emails per date window with --backfill --since
+BACKFILL_LIST_WORKERS = 4  # Date windows listed concurrently
+BACKFILL_MAX_ATTEMPTS = 3  # Runs that may fail on an email before --backfill gives up on it
+
+# Pipeline workers (each stage runs on its own threads)
+FETCH_WORKERS = 4  # Concurrent Gmail batch fetches
+PARSE_WORKERS = 2  # Email parsing threads
+PARSE_MODE = "thread"  # "thread" parses in-process, "process" uses a process pool
+PARSE_PROCESSES = None  # Worker processes for PARSE_MODE = "process" (None = CPU count)
+LABEL_WORKERS = 2  # Concurrent mark-as-read calls
+PIPELINE_QUEUE_SIZE = 8  # Chunks buffered between stages (backpressure)
+
+# Run metrics (stage timings, API call latencies, retries, queue depths)
+METRICS_ENABLED = False  # Write the metrics files below (also --metrics-json / --metrics-prom)
+METRICS_JSON_PATH = BASE_DIR / "data" / "run_report.json"  # JSON run report
+METRICS_PROM_PATH = None  # Prometheus textfile, e.g. /var/lib/node_exporter/gmail_to_sheets.prom
+
+# Daemon mode (python src/main.py --daemon)
+DAEMON_POLL_INTERVAL = 60  # Seconds between sync passes
+DAEMON_POLL_JITTER = 0.1  # Random ± fraction of the interval
+TOKEN_REFRESH_MARGIN = 300  # Refresh the access token this many seconds before expiry
+
+# Multiple mailboxes (python src/main.py --tenants tenants.json)
+TENANT_WORKERS = 2  # Tenants synced at the same time
+TENANT_SLICE_SIZE = 500  # Emails a tenant processes before yielding its slot
@@ -0,0 +1,430 @@
+# backfill.py
+import json
+import os
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from src.metrics import metrics
+
+
+class BackfillJournal:
+    """Write-ahead journal that makes a backfill resumable.
+
+    An append-only JSON-lines file; every record is flushed and fsynced
+    before the work it describes moves on:
+
+        {"type": "start", "query": ...}            backfill parameters
+        {"type": "page", "token": t, "next": n, "ids": [...]}
+                                                    a listed page, before its ids are queued
+        {"type": "plan", "windows": [[after, before], ...]}
+                                                    date windows of a sharded backfill
+        {"type": "window", "window": [after, before], "ids": [...]}
+                                                    a fully listed window
+        {"type": "appended", "ids": [...]}          rows the sheet committed
+        {"type": "labelled", "ids": [...]}          ids marked as read
+        {"type": "skipped", "ids": [...]}           deleted since listing, nothing to do
+        {"type": "failed", "ids": [...]}            one more failed attempt for each id
+        {"type": "done"}                            listing and all work finished
+
+    Replaying it gives the listing cursor, ids that were listed but never
+    appended (fetched again), and ids appended but not yet labelled (only
+    marked as read). Everything else is finished and never touched again;
+    an id that fails max_attempts times is given up (kept in abandoned)
+    so one bad message cannot keep the backfill from finishing.
+    Resuming compacts the journal into a single snapshot record.
+    """
+
+    def __init__(self, path=None, max_attempts=3):
+        BASE_DIR = Path(__file__).parent.parent
+        self.path = Path(path) if path else BASE_DIR / "data" / "backfill_journal.jsonl"
+        self.max_attempts = max_attempts
+        os.makedirs(self.path.parent, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = None
+        self._reset()
+        self._replay()
+
+    def _reset(self):
+        self.query = None
+        self.started_at = None
+        self.cursor = None
+        self.listing_complete = False
+        self.done = False
+        self.windows = None  # planned [after, before) windows, oldest first
+        self.listed_windows = set()
+        self.pending = {}  # listed, not yet appended (dict keeps listing order)
+        self.unlabelled = {}  # appended, not yet marked as read
+        self.attempts = {}  # pending id -> failed attempts so far
+        self.abandoned = {}  # failed max_attempts times, no longer pending
+        self.appended_count = 0
+        self.labelled_count = 0
+        self.skipped_count = 0
+
+    @property
+    def started(self):
+        return self.query is not None
+
+    def _apply(self, record):
+        kind = record.get('type')
+        if kind in ('start', 'snapshot'):
+            self.query = record['query']
+            self.started_at = record.get('started_at')
+        if kind == 'snapshot':
+            self.cursor = record['cursor']
+            self.listing_complete = record['listing_complete']
+            if record.get('windows') is not None:
+                self.windows = [tuple(window) for window in record['windows']]
+            self.listed_windows = {tuple(window) for window in record.get('listed_windows', [])}
+            self.pending = dict.fromkeys(record['pending'])
+            self.unlabelled = dict.fromkeys(record['unlabelled'])
+            self.attempts = dict(record.get('attempts', {}))
+            self.abandoned = dict.fromkeys(record.get('abandoned', []))
+            self.appended_count = record['appended_count']
+            self.labelled_count = record['labelled_count']
+            self.skipped_count = record.get('skipped_count', 0)
+        elif kind == 'page':
+            self.pending.update(dict.fromkeys(record['ids']))
+            self.cursor = record['next']
+            self.listing_complete = record['next'] is None
+        elif kind == 'plan':
+            self.windows = [tuple(window) for window in record['windows']]
+        elif kind == 'window':
+            self.pending.update(dict.fromkeys(record['ids']))
+            self.listed_windows.add(tuple(record['window']))
+            self.listing_complete = len(self.listed_windows) == len(self.windows)
+        elif kind == 'appended':
+            for msg_id in record['ids']:
+                self.pending.pop(msg_id, None)
+                self.attempts.pop(msg_id, None)
+                self.unlabelled[msg_id] = None
+            self.appended_count += len(record['ids'])
+        elif kind == 'labelled':
+            for msg_id in record['ids']:
+                self.unlabelled.pop(msg_id, None)
+            self.labelled_count += len(record['ids'])
+        elif kind == 'skipped':
+            for msg_id in record['ids']:
+                self.pending.pop(msg_id, None)
+                self.attempts.pop(msg_id, None)
+            self.skipped_count += len(record['ids'])
+        elif kind == 'failed':
+            for msg_id in record['ids']:
+                if msg_id not in self.pending:
+                    continue
+                self.attempts[msg_id] = self.attempts.get(msg_id, 0) + 1
+                if self.attempts[msg_id] >= self.max_attempts:
+                    del self.pending[msg_id]
+                    del self.attempts[msg_id]
+                    self.abandoned[msg_id] = None
+        elif kind == 'done':
+            self.done = True
+
+    def _replay(self):
+        if not self.path.exists():
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-write; the work it
+                    # described was not acknowledged, so it is redone
+                    break
+                self._apply(record)
+
+    def _snapshot(self):
+        return {
+            'type': 'snapshot',
+            'query': self.query,
+            'started_at': self.started_at,
+            'cursor': self.cursor,
+            'listing_complete': self.listing_complete,
+            'windows': self.windows,
+            'listed_windows': sorted(self.listed_windows),
+            'pending': list(self.pending),
+            'unlabelled': list(self.unlabelled),
+            'attempts': self.attempts,
+            'abandoned': list(self.abandoned),
+            'appended_count': self.appended_count,
+            'labelled_count': self.labelled_count,
+            'skipped_count': self.skipped_count,
+        }
+
+    def compact(self):
+        """Replace the journal with one snapshot record (temp file + rename)"""
+        with self._lock:
+            self._close_file()
+            if not self.started:
+                return
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp_path, 'w') as f:
+                f.write(json.dumps(self._snapshot()) + '\n')
+                if self.done:
+                    f.write(json.dumps({'type': 'done'}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _append(self, record):
+        """Apply a record and make it durable before returning"""
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a')
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._apply(record)
+        metrics.inc('journal_records_total', type=record['type'])
+
+    def start(self, query):
+        """Begin a new backfill, discarding any previous journal"""
+        with self._lock:
+            self._close_file()
+            if self.path.exists():
+                os.remove(self.path)
+            self._reset()
+        self._append({'type': 'start', 'query': query,
+                      'started_at': datetime.now().isoformat()})
+
+    def record_page(self, token, next_token, ids):
+        self._append({'type': 'page', 'token': token, 'next': next_token, 'ids': list(ids)})
+
+    def record_plan(self, windows):
+        self._append({'type': 'plan', 'windows': [list(window) for window in windows]})
+
+    def record_window(self, window, ids):
+        self._append({'type': 'window', 'window': list(window), 'ids': list(ids)})
+
+    def record_appended(self, ids):
+        self._append({'type': 'appended', 'ids': list(ids)})
+
+    def record_labelled(self, ids):
+        self._append({'type': 'labelled', 'ids': list(ids)})
+
+    def record_skipped(self, ids):
+        self._append({'type': 'skipped', 'ids': list(ids)})
+
+    def record_failed(self, ids):
+        self._append({'type': 'failed', 'ids': list(ids)})
+
+    def finish(self):
+        self._append({'type': 'done'})
+
+    def close(self):
+        with self._lock:
+            self._close_file()
+
+
+def window_query(query, window):
+    """Restrict query to [after, before) in epoch seconds.
+
+    Gmail treats after: as exclusive, so the window starts one second early;
+    the resulting overlap is removed by message-id dedup.
+    """
+    after, before = window
+    return f"{query} after:{after - 1} before:{before}".strip()
+
+
+def plan_windows(gmail, query, start, end, target_size=2000, min_span=3600, workers=4):
+    """Split [start, end) (epoch seconds) into windows of ~target_size messages.
+
+    Windows are bisected while Gmail's resultSizeEstimate for them exceeds
+    target_size (down to min_span seconds), estimating each level
+    concurrently. Neighbouring windows are then merged back while their
+    combined estimate still fits, so sparse years cost one listing each.
+    Returns [(after, before), ...] oldest first.
+    """
+    def estimate(window):
+        return gmail.estimate_message_count(window_query(query, window))
+
+    todo = [(start, end)]
+    sized = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while todo:
+            estimates = list(pool.map(estimate, todo))
+            split = []
+            for (after, before), count in zip(todo, estimates):
+                if count > target_size and before - after > min_span:
+                    middle = after + (before - after) // 2
+                    split.extend([(after, middle), (middle, before)])
+                else:
+                    sized.append(((after, before), count))
+            todo = split
+
+    windows = []
+    total = 0
+    for window, count in sorted(sized):
+        if windows and total + count <= target_size:
+            windows[-1] = (windows[-1][0], window[1])
+            total += count
+        else:
+            windows.append(window)
+            total = count
+    return windows
+
+
+def iter_window_ids(gmail, query, windows, page_size=500, workers=4, on_listed=None):
+    """Yield message ids window by window, oldest window and message first.
+
+    Up to `workers` windows are listed concurrently ahead of the consumer
+    (all calls still go through the shared rate limiter); ids come out in
+    window order, so the sheet receives them in date order. on_listed(window,
+    ids) runs once a window is fully listed, before its ids are yielded, and
+    returns the ids to yield.
+    """
+    def list_window(window):
+        ids = []
+        for messages, _ in gmail.iter_message_pages(window_query(query, window), page_size):
+            ids.extend(msg['id'] for msg in messages)
+        # Gmail lists newest first
+        ids.reverse()
+        return ids
+
+    windows = iter(windows)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        ahead = deque()
+
+        def submit_next():
+            window = next(windows, None)
+            if window is not None:
+                ahead.append((window, pool.submit(list_window, window)))
+
+        for _ in range(max(1, workers) * 2):
+            submit_next()
+        while ahead:
+            window, future = ahead.popleft()
+            ids = future.result()
+            submit_next()
+            if on_listed is not None:
+                ids = on_listed(window, ids)
+            yield from ids
+
+
+def run_backfill(gmail, sheets, dedup, journal, spreadsheet_id, sheet_name, query,
+                 make_pipeline, restart=False, page_size=500, since=None, until=None,
+                 window_size=2000, list_workers=4, prepare_writer=None):
+    """Import every message matching query, resuming from the journal.
+
+    With since (and optionally until) as datetimes, the range is sharded
+    into date windows that are listed concurrently and written oldest
+    first; otherwise the query is listed as one stream of pages.
+    make_pipeline(writer) returns an EmailPipeline wired to the journal.
+    prepare_writer() formats the sheet, reconciles dedup and returns the
+    writer (default: a BufferedSheetWriter on sheet_name).
+    Returns the PipelineResult of this run, or None if the journal
+    already records a finished backfill.
+    """
+    from src.sheets_service import BufferedSheetWriter
+
+    if restart or not journal.started:
+        journal.start(query)
+        print(f"Starting backfill for query: {query}")
+        if since is not None:
+            start = int(since.timestamp())
+            end = int((until or datetime.now()).timestamp())
+            windows = plan_windows(gmail, query, start, end, window_size, workers=list_workers)
+            journal.record_plan(windows)
+            print(f"   Planned {len(windows)} date windows of up to ~{window_size} emails")
+    elif journal.done:
+        print(f"✓ Backfill for '{journal.query}' already finished "
+              f"({journal.appended_count} appended). Use --restart-backfill to run again.")
+        return None
+    else:
+        if journal.query != query:
+            print(f"Note: Resuming the unfinished backfill for '{journal.query}' "
+                  f"(ignoring '{query}')", file=sys.stderr)
+        query = journal.query
+        journal.compact()
+        print(f"Resuming backfill: {journal.appended_count} appended, "
+              f"{len(journal.pending)} listed but not appended, "
+              f"{len(journal.unlabelled)} not yet marked as read")
+
+    # Rows appended just before a crash, but not journalled, are found by
+    # the dedup reconcile here
+    if prepare_writer is not None:
+        writer = prepare_writer()
+    else:
+        sheets.ensure_sheet(spreadsheet_id, sheet_name)
+        dedup.reconcile(sheets, spreadsheet_id, sheet_name)
+        writer = BufferedSheetWriter(sheets, spreadsheet_id, sheet_name, dedup=dedup)
+
+    # Listed ids the sheet already has were appended before the journal said so
+    in_sheet = [msg_id for msg_id in journal.pending if msg_id in dedup]
+    if in_sheet:
+        journal.record_appended(in_sheet)
+
+    # Finish labelling rows that reached the sheet before the interruption
+    if journal.unlabelled:
+        unlabelled = list(journal.unlabelled)
+        journal.record_labelled(gmail.mark_as_read_batch(unlabelled))
+
+    listing = {'complete': journal.listing_complete}
+    # Ids handed to the pipeline this run; overlapping windows list some twice
+    listed = set()
+
+    def on_window_listed(window, ids):
+        ids = [msg_id for msg_id in ids if msg_id not in listed and msg_id not in dedup]
+        listed.update(ids)
+        journal.record_window(window, ids)
+        return ids
+
+    def iter_ids():
+        # Listed before the interruption but never appended: fetch these again
+        pending = list(journal.pending)
+        listed.update(pending)
+        yield from pending
+        if journal.listing_complete:
+            return
+        if journal.windows is not None:
+            remaining = [window for window in journal.windows
+                         if window not in journal.listed_windows]
+            try:
+                yield from iter_window_ids(gmail, query, remaining, page_size,
+                                           list_workers, on_window_listed)
+                listing['complete'] = True
+            except Exception as e:
+                print(f"Error listing emails: {e}", file=sys.stderr)
+            return
+        token = journal.cursor
+        try:
+            for messages, next_token in gmail.iter_message_pages(query, page_size, page_token=token):
+                # Ids already in the sheet (e.g. from regular syncs) need no work
+                ids = [msg['id'] for msg in messages if msg['id'] not in dedup]
+                # Journal the page before its ids enter the pipeline
+                journal.record_page(token, next_token, ids)
+                yield from ids
+                token = next_token
+            listing['complete'] = True
+        except Exception as e:
+            print(f"Error listing emails: {e}", file=sys.stderr)
+
+    try:
+        result = make_pipeline(writer).run(iter_ids())
+    finally:
+        if hasattr(writer, 'close'):
+            writer.close()
+
+    # Every listed id ends up appended, skipped or abandoned in the journal,
+    # so a run with failures can still finish the backfill
+    if listing['complete'] and not journal.pending and not journal.unlabelled:
+        journal.finish()
+        print(f"✓ Backfill complete: {journal.appended_count} emails appended, "
+              f"{journal.skipped_count} deleted before they could be fetched")
+        if journal.abandoned:
+            print(f"✗ Gave up on {len(journal.abandoned)} emails that failed "
+                  f"{journal.max_attempts} times (listed as abandoned in {journal.path})",
+                  file=sys.stderr)
+    else:
+        print(f"Backfill paused: {len(journal.pending)} listed emails still to append, "
+              f"{len(journal.unlabelled)} to mark as read. Run again to resume.")
+    journal.compact()
+    return result
@@ -0,0 +1,144 @@
+# body_store.py
+import hashlib
+import os
+import threading
+import zlib
+from pathlib import Path
+
+from src.metrics import metrics
+
+
+class BodyStore:
+    """Content-addressed, compressed store for full email bodies.
+
+    Bodies are keyed by the sha256 of their UTF-8 text and kept zlib
+    compressed under <root>/<first two hex chars>/<hash>.z, so identical
+    bodies (newsletters, notifications) are stored once. Reads and repeat
+    writes refresh a body's mtime; when the store grows past max_bytes the
+    least recently used bodies are evicted until it is back under
+    low_water of the limit.
+    """
+
+    SUFFIX = '.z'
+
+    def __init__(self, root=None, max_bytes=None, low_water=0.9, compression_level=6):
+        BASE_DIR = Path(__file__).parent.parent
+        self.root = Path(root) if root else BASE_DIR / "data" / "bodies"
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.compression_level = compression_level
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+    @staticmethod
+    def content_hash(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _path(self, digest):
+        return self.root / digest[:2] / f"{digest}{self.SUFFIX}"
+
+    def _iter_files(self):
+        for path in self.root.glob(f"*/*{self.SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # evicted meanwhile
+            yield path, stat
+
+    @property
+    def total_bytes(self):
+        """Compressed bytes on disk (scanned once, then tracked)"""
+        with self._lock:
+            return self._tracked_total()
+
+    def _tracked_total(self):
+        # Caller holds self._lock
+        if self._total_bytes is None:
+            self._total_bytes = sum(stat.st_size for _, stat in self._iter_files())
+        return self._total_bytes
+
+    def __contains__(self, digest):
+        return self._path(digest).exists()
+
+    def put(self, text):
+        """Store a body; returns its hash. Storing a known body only touches it."""
+        digest = self.content_hash(text)
+        path = self._path(digest)
+        if not path.exists():
+            data = zlib.compress(text.encode('utf-8'), self.compression_level)
+            # Check and count under one lock: parse threads may store the same
+            # body at once, and only the one that writes it adds its bytes
+            with self._lock:
+                stored = not path.exists()
+                if stored:
+                    os.makedirs(path.parent, exist_ok=True)
+                    tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+                    with open(tmp_path, 'wb') as f:
+                        f.write(data)
+                    os.replace(tmp_path, path)
+                    if self._total_bytes is None:
+                        total = self._tracked_total()  # the scan sees the new file
+                    else:
+                        total = self._total_bytes = self._total_bytes + len(data)
+            if stored:
+                metrics.inc('body_store_writes_total', result='stored')
+                if self.max_bytes and total > self.max_bytes:
+                    self.evict()
+                return digest
+
+        self._touch(path)
+        metrics.inc('body_store_writes_total', result='duplicate')
+        return digest
+
+    def get(self, digest):
+        """Full body for a hash, or None if unknown or evicted"""
+        path = self._path(digest)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        self._touch(path)
+        return zlib.decompress(data).decode('utf-8')
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self, max_bytes=None):
+        """Delete least recently used bodies until under low_water * max_bytes
+
+        Returns the number of bodies removed.
+        """
+        limit = max_bytes or self.max_bytes
+        if not limit:
+            return 0
+        with self._lock:
+            files = sorted(self._iter_files(), key=lambda item: item[1].st_mtime)
+            total = sum(stat.st_size for _, stat in files)
+            target = limit * self.low_water
+            removed = 0
+            for path, stat in files:
+                if total <= target:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= stat.st_size
+                removed += 1
+            self._total_bytes = total
+        if removed:
+            metrics.inc('body_store_evictions_total', removed)
+            print(f"   Evicted {removed} stored bodies to stay under {limit:,} bytes")
+        return removed
+
+    @staticmethod
+    def preview(content, preview_chars=500):
+        """Start of a body, as shown next to its hash"""
+        return content if len(content) <= preview_chars else content[:preview_chars] + '…'
+
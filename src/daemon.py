@@ -0,0 +1,102 @@
+# daemon.py
+import random
+import signal
+import sys
+import threading
+import time
+
+from src.metrics import metrics
+
+
+class SyncDaemon:
+    """Run sync passes on a polling interval with warm services.
+
+    Credentials, API clients (and their connections), the sheet format cache,
+    the dedup index and the parser stay in memory between passes, so a pass
+    costs only the incremental history listing plus the new emails.
+
+    SIGINT/SIGTERM request a graceful stop: listing ends, emails already
+    listed are written, flushed and marked as read, state is saved, then the
+    loop exits. A second signal stops waiting and raises KeyboardInterrupt.
+    """
+
+    def __init__(self, sync, gmail=None, interval=60.0, jitter=0.1,
+                 refresh_margin=300, max_error_delay=600.0, on_pass=None):
+        # sync(stop_event) runs one pass and returns its PipelineResult
+        self.sync = sync
+        self.gmail = gmail
+        self.interval = interval
+        self.jitter = jitter
+        self.refresh_margin = refresh_margin
+        self.max_error_delay = max_error_delay
+        self.on_pass = on_pass
+        self.stop_event = threading.Event()
+        self.passes = 0
+        self.consecutive_errors = 0
+
+    def stop(self):
+        self.stop_event.set()
+
+    def next_delay(self):
+        """Seconds until the next pass: the interval ± jitter, longer after errors"""
+        delay = self.interval
+        if self.consecutive_errors:
+            delay = min(self.max_error_delay, self.interval * 2 ** self.consecutive_errors)
+        # Jitter keeps several daemons from polling in lockstep
+        return max(0.0, delay * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def _handle_signal(self, signum, frame):
+        if self.stop_event.is_set():
+            raise KeyboardInterrupt
+        print(f"\n⏹  Received signal {signum}, finishing the current pass...")
+        self.stop()
+
+    def _install_signal_handlers(self):
+        """Install stop handlers; returns the previous ones (main thread only)"""
+        if threading.current_thread() is not threading.main_thread():
+            return {}
+        previous = {}
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            previous[signum] = signal.signal(signum, self._handle_signal)
+        return previous
+
+    def run_once(self):
+        """One pass with a proactive token refresh first; returns the result or None"""
+        started = time.perf_counter()
+        try:
+            if self.gmail is not None:
+                self.gmail.refresh_credentials(self.refresh_margin)
+            result = self.sync(self.stop_event)
+        except Exception as e:
+            self.consecutive_errors += 1
+            metrics.inc('daemon_passes_total', status='error')
+            print(f"✗ Sync pass failed: {e}", file=sys.stderr)
+            return None
+
+        self.passes += 1
+        self.consecutive_errors = 0
+        metrics.inc('daemon_passes_total', status='ok' if result.ok else 'partial')
+        metrics.observe('daemon_pass_seconds', time.perf_counter() - started)
+        print(f"✓ Pass {self.passes}: {result.committed} emails added "
+              f"in {time.perf_counter() - started:.1f}s")
+        if self.on_pass is not None:
+            self.on_pass(result)
+        return result
+
+    def run(self):
+        """Poll until stopped; returns the number of completed passes"""
+        previous = self._install_signal_handlers()
+        try:
+            print(f"🔁 Daemon started, polling every {self.interval:g}s (±{self.jitter:.0%})")
+            while not self.stop_event.is_set():
+                self.run_once()
+                if self.stop_event.is_set():
+                    break
+                delay = self.next_delay()
+                print(f"   Next pass in {delay:.0f}s")
+                self.stop_event.wait(delay)
+            print(f"✓ Daemon stopped after {self.passes} passes")
+            return self.passes
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
@@ -0,0 +1,126 @@
+# dedup_index.py
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+
+class DedupIndex:
+    """Local on-disk index of message IDs that are already in the sheet.
+    
+    Lookups are O(1) primary-key hits in SQLite instead of scanning the whole
+    Message_ID column. The index remembers how many sheet rows it has seen,
+    so reconcile() only reads rows appended since the last run (or by
+    someone else: rows this process appends are recorded as they land).
+    """
+    
+    HEADER_ROWS = 1
+    
+    def __init__(self, db_path=None):
+        BASE_DIR = Path(__file__).parent.parent
+        self.db_path = Path(db_path) if db_path else BASE_DIR / "data" / "processed_ids.db"
+        
+        # Create directory if it doesn't exist
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS processed_ids ("
+                "message_id TEXT PRIMARY KEY)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS sheet_sync ("
+                "spreadsheet_id TEXT, sheet_name TEXT, row_count INTEGER, "
+                "PRIMARY KEY (spreadsheet_id, sheet_name))"
+            )
+    
+    def __contains__(self, msg_id):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM processed_ids WHERE message_id = ?", (msg_id,)
+            ).fetchone()
+        return row is not None
+    
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM processed_ids").fetchone()[0]
+    
+    def add_many(self, msg_ids):
+        """Record message IDs as processed"""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO processed_ids (message_id) VALUES (?)",
+                ((msg_id,) for msg_id in msg_ids)
+            )
+    
+    def get_row_count(self, spreadsheet_id, sheet_name):
+        """Number of sheet rows (header included) already folded into the index"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT row_count FROM sheet_sync WHERE spreadsheet_id = ? AND sheet_name = ?",
+                (spreadsheet_id, sheet_name)
+            ).fetchone()
+        return row[0] if row else self.HEADER_ROWS
+    
+    def _set_row_count(self, spreadsheet_id, sheet_name, row_count):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sheet_sync (spreadsheet_id, sheet_name, row_count) "
+                "VALUES (?, ?, ?)",
+                (spreadsheet_id, sheet_name, row_count)
+            )
+    
+    def record_rows(self, spreadsheet_id, sheet_name, msg_ids, first_row, last_row):
+        """Record ids just appended to sheet rows first_row..last_row
+        
+        The seen row count only moves when the rows directly follow it;
+        rows someone else appended in between are left for reconcile().
+        """
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO processed_ids (message_id) VALUES (?)",
+                ((msg_id,) for msg_id in msg_ids)
+            )
+            row = self.conn.execute(
+                "SELECT row_count FROM sheet_sync WHERE spreadsheet_id = ? AND sheet_name = ?",
+                (spreadsheet_id, sheet_name)
+            ).fetchone()
+            if first_row == (row[0] if row else self.HEADER_ROWS) + 1:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO sheet_sync (spreadsheet_id, sheet_name, row_count) "
+                    "VALUES (?, ?, ?)",
+                    (spreadsheet_id, sheet_name, last_row)
+                )
+    
+    def reconcile(self, sheets, spreadsheet_id, sheet_name):
+        """Fold sheet rows appended since the last reconcile into the index
+        
+        Returns the number of rows read, or None if the sheet could not be read.
+        """
+        row_count = self.get_row_count(spreadsheet_id, sheet_name)
+        result = sheets.get_message_ids_since(spreadsheet_id, sheet_name, row_count + 1)
+        if result is None:
+            return None
+        
+        message_ids, last_row = result
+        self.add_many(message_ids)
+        if last_row > row_count:
+            self._set_row_count(spreadsheet_id, sheet_name, last_row)
+        return last_row - row_count
+    
+    def clear(self):
+        """Forget every indexed id and sheet row count"""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM processed_ids")
+            self.conn.execute("DELETE FROM sheet_sync")
+    
+    def rebuild(self, sheets, spreadsheet_id, sheet_name):
+        """Drop the index and rebuild it from a full read of the sheet"""
+        self.clear()
+        return self.reconcile(sheets, spreadsheet_id, sheet_name)
+    
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -1,10 +1,43 @@
 import base64
-import email
+import codecs
+import email.utils
 from email.header import decode_header
+import html
 import re
-from bs4 import BeautifulSoup
-from datetime import datetime
-import pytz
+from datetime import datetime, timezone
+
+# Most text a body may contribute (Sheets cell limit)
+BODY_CHAR_LIMIT = 50000
+# Base64 characters decoded per step; a multiple of 4
+DECODE_CHUNK_SIZE = 64 * 1024
+
+
+# Fast HTML-to-text: drop non-text blocks, then strip the remaining tags
+_SKIP_BLOCKS = re.compile(r'<(script|style|template)\b.*?</\1\s*>|<!--.*?-->', re.S | re.I)
+_OPEN_SKIP_BLOCK = re.compile(r'<(?:script|style|template)\b|<!--', re.I)
+_TAGS = re.compile(r'<[^>]*>')
+
+
+def _split_html(buffer):
+    """Split buffered HTML into a part that is safe to convert now and a
+    tail (unfinished tag, block or entity) to keep for the next chunk"""
+    buffer = _SKIP_BLOCKS.sub('', buffer)
+    cut = len(buffer)
+    
+    open_block = _OPEN_SKIP_BLOCK.search(buffer)
+    if open_block:
+        cut = open_block.start()
+    
+    last_open = buffer.rfind('<', 0, cut)
+    if last_open > buffer.rfind('>', 0, cut):
+        cut = last_open
+    
+    last_amp = buffer.rfind('&', 0, cut)
+    if last_amp > buffer.rfind(';', 0, cut) and cut - last_amp < 32:
+        cut = last_amp
+    
+    return buffer[:cut], buffer[cut:]
+
 
 class EmailParser:
     @staticmethod
@@ -23,29 +56,96 @@ class EmailParser:
         return subject
     
     @staticmethod
-    def get_body(message):
-        """Extract plain text body from email"""
-        if 'parts' in message['payload']:
-            for part in message['payload']['parts']:
-                if part['mimeType'] == 'text/plain':
-                    data = part['body'].get('data', '')
-                    if data:
-                        return base64.urlsafe_b64decode(data).decode('utf-8', errors='replace')
-                elif part['mimeType'] == 'multipart/alternative':
-                    for subpart in part['parts']:
-                        if subpart['mimeType'] == 'text/plain':
-                            data = subpart['body'].get('data', '')
-                            if data:
-                                return base64.urlsafe_b64decode(data).decode('utf-8', errors='replace')
+    def _iter_parts(payload):
+        """Walk a MIME tree of any depth iteratively, in document order"""
+        stack = [payload]
+        while stack:
+            part = stack.pop()
+            yield part
+            # Reverse so the first child is visited first
+            stack.extend(reversed(part.get('parts') or []))
+    
+    @staticmethod
+    def _iter_decoded(data, chunk_size=DECODE_CHUNK_SIZE):
+        """Decode base64url data lazily, yielding text one chunk at a time"""
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        # chunk_size is a multiple of 4 so every slice decodes on its own
+        for start in range(0, len(data), chunk_size):
+            chunk = data[start:start + chunk_size]
+            final = start + chunk_size >= len(data)
+            if final:
+                chunk += '=' * (-len(chunk) % 4)
+            yield decoder.decode(base64.urlsafe_b64decode(chunk), final=final)
+    
+    @staticmethod
+    def _decode_text(data, max_chars):
+        """Decode at most max_chars characters of a base64url text body"""
+        text = []
+        length = 0
+        for piece in EmailParser._iter_decoded(data):
+            text.append(piece)
+            length += len(piece)
+            if length >= max_chars:
+                # Stop decoding once the cell-size budget is reached
+                break
+        return ''.join(text)[:max_chars]
+    
+    @staticmethod
+    def _html_to_text(data, max_chars):
+        """Convert a base64url HTML body to text, decoding only what is needed
+        
+        Markup is stripped chunk by chunk with regular expressions, which is
+        far cheaper than building a BeautifulSoup tree; script/style blocks
+        are skipped like get_text() does.
+        """
+        decoded = []
+        text = []
+        length = 0
+        buffer = ''
+        try:
+            for piece in EmailParser._iter_decoded(data):
+                decoded.append(piece)
+                ready, buffer = _split_html(buffer + piece)
+                chunk = html.unescape(_TAGS.sub('', ready))
+                text.append(chunk)
+                length += len(chunk)
+                if length >= max_chars:
+                    break
+            else:
+                text.append(html.unescape(_TAGS.sub('', _SKIP_BLOCKS.sub('', buffer))))
+            return ''.join(text)[:max_chars]
+        except Exception:
+            # Fall back to BeautifulSoup for markup the fast path chokes on
+            from bs4 import BeautifulSoup
+            soup = BeautifulSoup(''.join(decoded), 'html.parser')
+            return soup.get_text()[:max_chars]
+    
+    @staticmethod
+    def get_body(message, max_chars=BODY_CHAR_LIMIT):
+        """Extract plain text body from email
+        
+        Prefers the first text/plain part anywhere in the MIME tree, then the
+        first text/html part (converted to text), then the snippet.
+        Attachments are ignored. At most max_chars characters are decoded.
+        """
+        html_data = None
+        for part in EmailParser._iter_parts(message['payload']):
+            if part.get('filename'):
+                continue  # Attachment
+            
+            mime_type = part.get('mimeType', '')
+            data = part.get('body', {}).get('data', '')
+            if not data:
+                continue
+            
+            if mime_type == 'text/plain':
+                return EmailParser._decode_text(data, max_chars)
+            if mime_type == 'text/html' and html_data is None:
+                html_data = data
         
         # Fallback to HTML or snippet
-        if 'body' in message['payload']:
-            data = message['payload']['body'].get('data', '')
-            if data:
-                html_content = base64.urlsafe_b64decode(data).decode('utf-8', errors='replace')
-                # Convert HTML to plain text
-                soup = BeautifulSoup(html_content, 'html.parser')
-                return soup.get_text()[:1000]  # Limit to 1000 chars
+        if html_data:
+            return EmailParser._html_to_text(html_data, max_chars)
         
         return message.get('snippet', '')[:500]
     
@@ -61,7 +161,7 @@ class EmailParser:
             # Try to parse date
             date_obj = email.utils.parsedate_to_datetime(date_str)
         except:
-            date_obj = datetime.now(pytz.UTC)
+            date_obj = datetime.now(timezone.utc)
         
         # Parse sender
         from_header = headers.get('From', '')
@@ -4,26 +4,130 @@ import base64
 from pathlib import Path
 import sys
 import pickle
+import threading
 import time
+from datetime import datetime, timedelta, timezone
 
 sys.path.append(str(Path(__file__).parent.parent))
 
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+from src.google_client import SharedTransport, build_service
+from src.metrics import metrics
+from src.rate_limiter import default_limiter, is_retryable
+
+
+def _part_fields(depth):
+    """fields projection for a MIME part and `depth` levels of sub-parts"""
+    fields = 'mimeType,filename,body/data'
+    if depth:
+        fields += f',parts({_part_fields(depth - 1)})'
+    return fields
+
+
+# messages.get parameters per kind of sheet row, cheapest first.
+# "text" keeps only what EmailParser reads; messages whose MIME tree is
+# deeper than TEXT_PART_DEPTH levels are refetched with "full".
+TEXT_PART_DEPTH = 6
+FETCH_PROFILES = {
+    'metadata': {
+        'format': 'metadata',
+        'metadataHeaders': ['From', 'Subject', 'Date'],
+        'fields': 'id,threadId,snippet,payload/headers',
+    },
+    'text': {
+        'format': 'full',
+        'fields': f'id,threadId,snippet,payload(headers,{_part_fields(TEXT_PART_DEPTH)})',
+    },
+    'full': {
+        'format': 'full',
+    },
+}
+
+def is_projection_truncated(message):
+    """True when the "text" projection cut off part of the MIME tree
+    
+    Past TEXT_PART_DEPTH levels a multipart part comes back without its
+    sub-parts, so the body may be missing from what was fetched.
+    """
+    stack = [message.get('payload') or {}]
+    while stack:
+        part = stack.pop()
+        parts = part.get('parts')
+        if part.get('mimeType', '').startswith('multipart/') and not parts:
+            return True
+        stack.extend(parts or [])
+    return False
+
+
+# Sheet columns that need the message body rather than headers/snippet
+BODY_COLUMNS = {'content', 'content_hash'}
+
+
+def select_fetch_profile(columns):
+    """Cheapest fetch profile that still fills every configured sheet column"""
+    if BODY_COLUMNS.intersection(columns):
+        return 'text'
+    return 'metadata'
+
+
+class HistoryExpiredError(Exception):
+    """The stored historyId is too old for users.history.list"""
+
 
 class GmailService:
-    def __init__(self):
-        self.creds = None
-        self.service = None
-        self._authenticate()
+    # Gmail accepts at most 100 calls in a single batch request
+    BATCH_SIZE = 100
+    # messages.batchModify accepts at most 1000 ids per call
+    MODIFY_BATCH_SIZE = 1000
+    # messages.list returns at most 500 ids per page
+    LIST_PAGE_SIZE = 500
+    
+    def __init__(self, limiter=None, credentials=None, http_factory=None, token_path=None,
+                 message_cache=None):
+        self.creds = credentials
+        self.limiter = limiter or default_limiter
+        # Optional MessageCache consulted before every messages.get
+        self.message_cache = message_cache
+        BASE_DIR = Path(__file__).parent.parent
+        # Each mailbox keeps its own OAuth token
+        self.token_path = Path(token_path) if token_path else BASE_DIR / "credentials" / "token.json"
+        self._local = threading.local()
+        if self.creds is None:
+            self._authenticate()
+        # Callable returning an httplib2-compatible transport per thread; by
+        # default one authorized session that the Sheets client can share
+        self.http_factory = http_factory or SharedTransport(self.creds).http
+        if credentials is None:
+            self.service = self._build_service()
+            print("Gmail authentication successful!")
+    
+    @property
+    def service(self):
+        """Gmail API client for the calling thread
+        
+        The httplib2 transport behind googleapiclient is not thread-safe, so
+        every thread gets its own client (and HTTP connection) built lazily
+        from the shared credentials.
+        """
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = self._build_service()
+            self._local.service = service
+        return service
+    
+    @service.setter
+    def service(self, service):
+        self._local.service = service
+    
+    def _build_service(self):
+        return build_service('gmail', 'v1', http=self.http_factory())
     
     def _authenticate(self):
         """Authenticate using OAuth 2.0"""
         BASE_DIR = Path(__file__).parent.parent
         CREDENTIALS_PATH = BASE_DIR / "credentials" / "credentials.json"
-        TOKEN_PATH = BASE_DIR / "credentials" / "token.json"
+        TOKEN_PATH = self.token_path
         
         # Updated scopes - now includes modify permission
         SCOPES = [
@@ -37,8 +141,13 @@ class GmailService:
         
         if not self.creds or not self.creds.valid:
             if self.creds and self.creds.expired and self.creds.refresh_token:
-                self.creds.refresh(Request())
+                # httplib2 transport: avoids importing requests just to refresh
+                import httplib2
+                from google_auth_httplib2 import Request
+                self.creds.refresh(Request(httplib2.Http()))
             else:
+                # Only needed for the interactive first login
+                from google_auth_oauthlib.flow import InstalledAppFlow
                 flow = InstalledAppFlow.from_client_secrets_file(
                     str(CREDENTIALS_PATH), SCOPES)
                 self.creds = flow.run_local_server(port=0)
@@ -46,54 +155,325 @@ class GmailService:
             # Save the token
             with open(TOKEN_PATH, 'wb') as token:
                 pickle.dump(self.creds, token)
+    
+    def refresh_credentials(self, margin=300):
+        """Refresh the access token if it expires within `margin` seconds
+        
+        Long-running processes call this between passes so a token never
+        expires in the middle of a batch. Returns True if it was refreshed.
+        """
+        creds = self.creds
+        if not getattr(creds, 'refresh_token', None) or getattr(creds, 'expiry', None) is None:
+            return False
+        # google-auth keeps expiry as a naive UTC datetime
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        if creds.expiry - now > timedelta(seconds=margin):
+            return False
         
-        self.service = build('gmail', 'v1', credentials=self.creds)
-        print("Gmail authentication successful!")
+        import httplib2
+        from google_auth_httplib2 import Request
+        creds.refresh(Request(httplib2.Http()))
+        
+        with open(self.token_path, 'wb') as token:
+            pickle.dump(creds, token)
+        print(f"✓ Refreshed Gmail access token (valid until {creds.expiry} UTC)")
+        return True
     
-    def get_unread_emails(self, last_processed_date=None):
-        """Fetch unread emails since last processed date"""
+    def _execute(self, method, request):
+        """Execute a Gmail request under the shared rate limiter"""
+        return self.limiter.execute(request, 'gmail', method)
+    
+    def build_unread_query(self, last_processed_date=None):
+        """Gmail search query for unread inbox emails since last processed date"""
         query = 'is:unread in:inbox'
         if last_processed_date:
             query += f' after:{last_processed_date.strftime("%Y/%m/%d")}'
-        
-        try:
-            results = self.service.users().messages().list(
+        return query
+    
+    def estimate_message_count(self, query):
+        """Gmail's rough resultSizeEstimate for a search query (one cheap list call)"""
+        results = self._execute('messages.list', self.service.users().messages().list(
+            userId='me',
+            q=query,
+            maxResults=1,
+            fields='resultSizeEstimate'
+        ))
+        return results.get('resultSizeEstimate', 0)
+    
+    def iter_message_pages(self, query, page_size=500, page_token=None):
+        """Yield (messages, next_page_token) for every page of a messages.list query"""
+        page_size = max(1, min(page_size, self.LIST_PAGE_SIZE))
+        while True:
+            results = self._execute('messages.list', self.service.users().messages().list(
                 userId='me',
                 q=query,
-                maxResults=50
-            ).execute()
+                maxResults=page_size,
+                pageToken=page_token
+            ))
+            
+            page_token = results.get('nextPageToken')
+            yield results.get('messages', []), page_token
+            if not page_token:
+                break
+    
+    def get_history_id(self):
+        """Current mailbox historyId, used as the incremental sync checkpoint"""
+        profile = self._execute('getProfile', self.service.users().getProfile(userId='me'))
+        return profile['historyId']
+    
+    def iter_history_message_ids(self, start_history_id, page_size=500):
+        """Lazily yield ids of unread inbox messages added since start_history_id
+        
+        Raises HistoryExpiredError when Gmail no longer has history that far
+        back (HTTP 404); callers should fall back to a full scan.
+        """
+        page_size = max(1, min(page_size, self.LIST_PAGE_SIZE))
+        page_token = None
+        seen = set()
+        while True:
+            try:
+                results = self._execute('history.list', self.service.users().history().list(
+                    userId='me',
+                    startHistoryId=start_history_id,
+                    historyTypes=['messageAdded'],
+                    labelId='INBOX',
+                    maxResults=page_size,
+                    pageToken=page_token
+                ))
+            except HttpError as e:
+                if e.resp.status == 404:
+                    raise HistoryExpiredError(start_history_id) from e
+                raise
             
-            messages = results.get('messages', [])
-            print(f"Found {len(messages)} unread messages")
-            return messages
+            for record in results.get('history', []):
+                for added in record.get('messagesAdded', []):
+                    message = added['message']
+                    if 'UNREAD' not in message.get('labelIds', []):
+                        continue
+                    if message['id'] in seen:
+                        continue
+                    seen.add(message['id'])
+                    yield message['id']
             
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+    
+    def iter_unread_message_ids(self, last_processed_date=None, page_size=500, limit=None):
+        """Lazily yield unread message ids, following nextPageToken across pages"""
+        query = self.build_unread_query(last_processed_date)
+        count = 0
+        try:
+            for messages, _ in self.iter_message_pages(query, page_size):
+                for msg in messages:
+                    if limit is not None and count >= limit:
+                        return
+                    count += 1
+                    yield msg['id']
         except Exception as e:
-            print(f"Error fetching emails: {e}")
-            return []
+            print(f"Error fetching emails: {e}", file=sys.stderr)
     
-    def get_email_details(self, msg_id):
-        """Get full email details"""
+    def get_unread_emails(self, last_processed_date=None, max_results=None):
+        """Fetch unread emails since last processed date"""
+        messages = [
+            {'id': msg_id}
+            for msg_id in self.iter_unread_message_ids(last_processed_date, limit=max_results)
+        ]
+        print(f"Found {len(messages)} unread messages")
+        return messages
+    
+    def get_email_details(self, msg_id, profile='full'):
+        """Get email details using one of the FETCH_PROFILES"""
+        if self.message_cache is not None:
+            message = self.message_cache.get(msg_id, profile)
+            if message is not None:
+                return message
         try:
-            message = self.service.users().messages().get(
+            message = self._execute('messages.get', self.service.users().messages().get(
                 userId='me',
                 id=msg_id,
-                format='full'
-            ).execute()
+                **FETCH_PROFILES[profile]
+            ))
+            if self.message_cache is not None:
+                self.message_cache.put_many({msg_id: message}, profile)
             return message
         except Exception as e:
-            print(f"Error fetching email {msg_id}: {e}")
+            print(f"Error fetching email {msg_id}: {e}", file=sys.stderr)
             return None
     
+    def get_email_details_batch(self, msg_ids, max_retries=3, profile='full', failures=None):
+        """Get email details for many messages using Gmail batch requests
+        
+        Messages in the message cache are served from it; the rest are
+        fetched (and cached) with up to BATCH_SIZE messages.get calls
+        grouped into one batch HTTP request. Sub-requests that hit a rate
+        limit or server error are retried on their own in later batches;
+        permanent errors (e.g. 404 for a deleted message) are not retried
+        and, if a failures dict is passed, recorded there as id -> status.
+        Returns a dict keyed by message id; messages that could not be
+        fetched are left out.
+        """
+        results = {}
+        # This call's own failures; the caller's dict only gets final statuses
+        failed_for_good = {}
+        pending = list(dict.fromkeys(msg_ids))
+        if self.message_cache is not None:
+            cached = self.message_cache.get_many(pending, profile)
+            pending = [msg_id for msg_id in pending if msg_id not in cached]
+        
+        for attempt in range(max_retries + 1):
+            if not pending:
+                break
+            if attempt:
+                # Back off before retrying the failed sub-requests
+                metrics.inc('retries_total', len(pending), api='gmail', method='messages.get')
+                time.sleep(self.limiter.backoff_delay(attempt))
+            
+            failed = []
+            for start in range(0, len(pending), self.BATCH_SIZE):
+                chunk = pending[start:start + self.BATCH_SIZE]
+                failed.extend(self._execute_get_batch(chunk, results, profile, failed_for_good))
+            pending = failed
+        
+        for msg_id in pending:
+            print(f"Error fetching email {msg_id}: giving up after {max_retries} retries",
+                  file=sys.stderr)
+        
+        if profile == 'text':
+            # MIME trees deeper than the projection would fall back to the
+            # snippet; fetch those few messages again in full
+            truncated = [msg_id for msg_id, message in results.items()
+                         if is_projection_truncated(message)]
+            if truncated:
+                metrics.inc('fetch_profile_upgrades_total', len(truncated))
+                print(f"   Refetching {len(truncated)} deeply nested emails in full")
+                # The refetch reports its own errors; an email it misses keeps
+                # the projection already fetched, so it is not a failure here
+                results.update(self.get_email_details_batch(
+                    truncated, max_retries, profile='full'))
+        
+        for msg_id, status in failed_for_good.items():
+            print(f"Error fetching email {msg_id}: HTTP {status} (not retried)", file=sys.stderr)
+        if failures is not None:
+            failures.update(failed_for_good)
+        if self.message_cache is not None:
+            self.message_cache.put_many(results, profile)
+            results.update(cached)
+        return results
+    
+    def _execute_get_batch(self, msg_ids, results, profile='full', failures=None):
+        """Run one batch of messages.get calls; returns ids worth retrying
+        
+        Sub-requests that failed permanently go into failures (id -> status).
+        """
+        if failures is None:
+            failures = {}
+        throttled = []
+        
+        def callback(request_id, response, exception):
+            if exception is None:
+                results[request_id] = response
+            elif is_retryable(exception):
+                throttled.append(request_id)
+            else:
+                failures[request_id] = getattr(getattr(exception, 'resp', None), 'status',
+                                               type(exception).__name__)
+        
+        batch = self.service.new_batch_http_request(callback=callback)
+        for msg_id in msg_ids:
+            batch.add(
+                self.service.users().messages().get(
+                    userId='me',
+                    id=msg_id,
+                    **FETCH_PROFILES[profile]
+                ),
+                request_id=msg_id
+            )
+        
+        # Every sub-request is charged against the quota separately
+        self.limiter.acquire('gmail', 'messages.get', count=len(msg_ids))
+        started = time.perf_counter()
+        try:
+            batch.execute()
+        except Exception as e:
+            print(f"Error executing batch of {len(msg_ids)} emails: {e}", file=sys.stderr)
+            status = getattr(getattr(e, 'resp', None), 'status', type(e).__name__)
+            metrics.api_call('gmail', 'batch', time.perf_counter() - started, status)
+            unfinished = [msg_id for msg_id in msg_ids if msg_id not in results]
+            if is_retryable(e):
+                self.limiter.on_throttle('gmail')
+            elif isinstance(e, HttpError):
+                # The whole batch was rejected (e.g. 401/403): retrying won't help
+                failures.update((msg_id, status) for msg_id in unfinished)
+                return []
+            # Rate limits, server errors and network trouble are retried
+            return unfinished
+        
+        permanent = [msg_id for msg_id in msg_ids if msg_id in failures]
+        metrics.api_call('gmail', 'batch', time.perf_counter() - started, 200)
+        metrics.inc('batch_subrequests_total', len(msg_ids) - len(throttled) - len(permanent), api='gmail', method='messages.get', status='200')
+        metrics.inc('batch_subrequests_total', len(throttled), api='gmail', method='messages.get', status='retryable')
+        metrics.inc('batch_subrequests_total', len(permanent), api='gmail', method='messages.get', status='error')
+        if throttled:
+            self.limiter.on_throttle('gmail')
+        else:
+            self.limiter.on_success('gmail')
+        return throttled
+    
     def mark_as_read(self, msg_id):
         """Mark email as read"""
         try:
-            self.service.users().messages().modify(
+            self._execute('messages.modify', self.service.users().messages().modify(
                 userId='me',
                 id=msg_id,
                 body={'removeLabelIds': ['UNREAD']}
-            ).execute()
+            ))
             print(f"✓ Marked email {msg_id} as read")
             return True
         except Exception as e:
-            print(f"Error marking email as read: {e}")
-            return False
\ No newline at end of file
+            print(f"Error marking email as read: {e}", file=sys.stderr)
+            return False
+    
+    def mark_as_read_batch(self, msg_ids):
+        """Mark many emails as read using messages.batchModify
+        
+        Ids are sent in chunks of MODIFY_BATCH_SIZE. A chunk rejected with
+        400 (bad ids) is split in half and retried, so one bad id only costs
+        a few extra calls instead of failing the whole chunk; other errors
+        fail the chunk right away. Returns the ids that were marked.
+        """
+        msg_ids = list(dict.fromkeys(msg_ids))
+        marked = []
+        for start in range(0, len(msg_ids), self.MODIFY_BATCH_SIZE):
+            marked.extend(self._batch_modify(msg_ids[start:start + self.MODIFY_BATCH_SIZE]))
+        
+        if marked:
+            print(f"✓ Marked {len(marked)} emails as read")
+        failed = len(msg_ids) - len(marked)
+        if failed:
+            print(f"✗ Could not mark {failed} emails as read", file=sys.stderr)
+        return marked
+    
+    def _batch_modify(self, msg_ids):
+        """Remove UNREAD from msg_ids, bisecting on failure; returns marked ids"""
+        if not msg_ids:
+            return []
+        
+        try:
+            self._execute('messages.batchModify', self.service.users().messages().batchModify(
+                userId='me',
+                body={'ids': msg_ids, 'removeLabelIds': ['UNREAD']}
+            ))
+            return msg_ids
+        except Exception as e:
+            if len(msg_ids) == 1:
+                print(f"Error marking email {msg_ids[0]} as read: {e}", file=sys.stderr)
+                return []
+            # Only a 400 points at bad ids; auth errors, outages and throttling
+            # the limiter already retried would fail every half just the same
+            if not (isinstance(e, HttpError) and e.resp.status == 400):
+                print(f"Error marking {len(msg_ids)} emails as read: {e}", file=sys.stderr)
+                return []
+        
+        middle = len(msg_ids) // 2
+        return self._batch_modify(msg_ids[:middle]) + self._batch_modify(msg_ids[middle:])
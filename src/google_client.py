@@ -0,0 +1,82 @@
+# google_client.py
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+from googleapiclient.discovery import build_from_document
+
+BASE_DIR = Path(__file__).parent.parent
+DISCOVERY_DIR = BASE_DIR / "data" / "discovery"
+
+# Parsed discovery documents, shared by every client built in the process
+_documents = {}
+_documents_lock = threading.Lock()
+
+
+def load_discovery_document(api, version, cache_dir=DISCOVERY_DIR):
+    """Discovery document for api/version, parsed once per process.
+
+    A pinned copy in cache_dir wins; otherwise the copy bundled with
+    google-api-python-client is used and pinned there, so upgrading the
+    client library never silently changes the API surface a run sees.
+    Nothing is fetched from the network.
+    """
+    key = (api, version, str(cache_dir))
+    with _documents_lock:
+        document = _documents.get(key)
+        if document is not None:
+            return document
+
+        path = Path(cache_dir) / f"{api}.{version}.json"
+        if path.exists():
+            with open(path) as f:
+                content = f.read()
+        else:
+            from googleapiclient.discovery_cache import get_static_doc
+            content = get_static_doc(api, version)
+            if content is None:
+                raise ValueError(f"No discovery document available for {api} {version}")
+            try:
+                os.makedirs(path.parent, exist_ok=True)
+                tmp_path = path.with_name(path.name + '.tmp')
+                with open(tmp_path, 'w') as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Note: Could not pin discovery document {path}: {e}", file=sys.stderr)
+
+        document = _documents[key] = json.loads(content)
+        return document
+
+
+def build_service(api, version, credentials=None, http=None):
+    """Build an API client from the cached discovery document"""
+    document = load_discovery_document(api, version)
+    if http is not None:
+        return build_from_document(document, http=http)
+    return build_from_document(document, credentials=credentials)
+
+
+class SharedTransport:
+    """One authorized HTTP session per thread, shared by the Gmail and Sheets clients.
+
+    Pass `transport.http` as the services' http_factory: both clients on a
+    thread then reuse the same connection pool and credentials refresh,
+    instead of each opening its own TLS connections.
+    """
+
+    def __init__(self, credentials, timeout=60):
+        self.creds = credentials
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def http(self):
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            import httplib2
+            from google_auth_httplib2 import AuthorizedHttp
+            http = AuthorizedHttp(self.creds, http=httplib2.Http(timeout=self.timeout))
+            self._local.http = http
+        return http
@@ -1,16 +1,484 @@
 # main.py
+import argparse
+import contextlib
+import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
-import time
 
 sys.path.append(str(Path(__file__).parent.parent))
 
-from src.gmail_service import GmailService
-from src.sheets_service import SheetsService
+import config
+from src.gmail_service import GmailService, HistoryExpiredError, select_fetch_profile
+from src.sheets_service import SheetsService, BufferedSheetWriter, PartitionedSheetWriter
+from src.partition_catalog import PartitionCatalog
+from src.body_store import BodyStore
+from src.message_cache import MessageCache, CachedMailbox, ReparseIndex
+from src.sinks import SINK_COLUMNS, SINK_TYPES, SQLiteSink, CSVSink, ParquetSink, FanOutSink
 from src.email_parser import EmailParser
 from src.state_manager import StateManager
+from src.dedup_index import DedupIndex
+from src.pipeline import EmailPipeline
+from src.daemon import SyncDaemon
+from src.backfill import BackfillJournal, run_backfill
+from src.tenants import MultiTenantRunner, load_tenants
+from src import metrics as run_metrics
+from src.metrics import metrics
 
-def main():
+def date_arg(value):
+    return datetime.strptime(value, "%Y-%m-%d")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Log unread Gmail emails to Google Sheets")
+    parser.add_argument(
+        '--rebuild-index', action='store_true',
+        help="rebuild the local dedup index from a full read of the sheet"
+    )
+    parser.add_argument(
+        '--metrics-json', metavar='PATH',
+        help="collect run metrics and write a JSON report to PATH"
+    )
+    parser.add_argument(
+        '--metrics-prom', metavar='PATH',
+        help="collect run metrics and write a Prometheus textfile to PATH"
+    )
+    parser.add_argument(
+        '--backfill', action='store_true',
+        help="import all matching historical emails; resumes an interrupted backfill"
+    )
+    parser.add_argument(
+        '--query', metavar='GMAIL_QUERY',
+        help="Gmail search query for --backfill (default: config.BACKFILL_QUERY)"
+    )
+    parser.add_argument(
+        '--since', type=date_arg, metavar='YYYY-MM-DD',
+        help="with --backfill: shard the range from this date into parallel date windows"
+    )
+    parser.add_argument(
+        '--until', type=date_arg, metavar='YYYY-MM-DD',
+        help="with --backfill --since: end of the range (default: now)"
+    )
+    parser.add_argument(
+        '--restart-backfill', action='store_true',
+        help="discard the backfill journal and start over"
+    )
+    parser.add_argument(
+        '--tenants', metavar='PATH',
+        help="sync every mailbox -> spreadsheet mapping in this JSON file"
+    )
+    parser.add_argument(
+        '--daemon', action='store_true',
+        help="keep running and poll for new emails (stop with Ctrl+C or SIGTERM)"
+    )
+    parser.add_argument(
+        '--interval', type=float, metavar='SECONDS',
+        help="seconds between polls in --daemon mode (default: config.DAEMON_POLL_INTERVAL)"
+    )
+    parser.add_argument(
+        '--sink', action='append', choices=SINK_TYPES,
+        help="write rows to this sink; repeat to fan out to several (default: config.SINKS)"
+    )
+    parser.add_argument(
+        '--reparse-from-cache', action='store_true',
+        help="rebuild rows for every synced email from the message cache (no Gmail calls)"
+    )
+    parser.add_argument(
+        '--reparse-tab', metavar='NAME',
+        help="sheet tab for --reparse-from-cache (default: a new '<sheet> reparsed <time>' tab)"
+    )
+    parser.add_argument(
+        '--show-body', metavar='CONTENT_HASH',
+        help="print the full stored body for a Content_Hash cell and exit"
+    )
+    parser.add_argument(
+        '--quiet', action='store_true',
+        help="suppress progress output; metrics files are still written"
+    )
+    return parser.parse_args(argv)
+
+def export_metrics(result, json_path=None, prom_path=None):
+    """Write the collected run metrics to the configured destinations"""
+    metrics.gauge('last_run_success', int(result.ok))
+    if json_path:
+        run_metrics.write_json_report(json_path, extra={
+            'committed': result.committed,
+            'ok': result.ok,
+        })
+    if prom_path:
+        run_metrics.write_prometheus_textfile(prom_path)
+
+def prepare_sheet(sheets, existing_ids, spreadsheet_id, sheet_name, rebuild_index=False,
+                  formatted_tabs=None):
+    """Format the target tab(s) and sync the dedup index with them
+    
+    With config.SHEET_PARTITION set, rows go to per-month or size-capped
+    tabs, each created and formatted when the first row is routed to it,
+    and only the active partition is reconciled (all of them for a
+    rebuild). Tabs in formatted_tabs (kept across daemon passes)
+    are not checked again; tabs formatted here are added to it.
+    Returns (writer, new sheet rows indexed).
+    """
+    if config.SHEET_PARTITION:
+        catalog = PartitionCatalog(Path(existing_ids.db_path).with_name("partitions.db"))
+        writer = PartitionedSheetWriter(
+            sheets, catalog, spreadsheet_id, sheet_name,
+            mode=config.SHEET_PARTITION, max_rows=config.SHEET_PARTITION_MAX_ROWS,
+            preview_chars=config.BODY_PREVIEW_CHARS, dedup=existing_ids
+        )
+        tabs = writer.active_tabs()
+        if rebuild_index:
+            # Rebuild every known partition; with none yet there is nothing to read
+            tabs = [tab for tab, *_ in catalog.partitions(spreadsheet_id, sheet_name)]
+            if not tabs:
+                existing_ids.clear()
+    else:
+        # Create or format the sheet only when it is missing or its schema changed
+        if formatted_tabs is None or sheet_name not in formatted_tabs:
+            sheet_id = sheets.ensure_sheet(spreadsheet_id, sheet_name)
+            if sheet_id is not None and formatted_tabs is not None:
+                formatted_tabs.add(sheet_name)
+        writer = BufferedSheetWriter(sheets, spreadsheet_id, sheet_name,
+                                     preview_chars=config.BODY_PREVIEW_CHARS,
+                                     dedup=existing_ids)
+        tabs = [sheet_name]
+    
+    # Fold rows appended since the last run (by anyone) into the dedup index
+    new_rows = 0
+    for index, tab in enumerate(tabs):
+        if rebuild_index and index == 0:
+            new_rows += existing_ids.rebuild(sheets, spreadsheet_id, tab) or 0
+        else:
+            new_rows += existing_ids.reconcile(sheets, spreadsheet_id, tab) or 0
+        if config.SHEET_PARTITION:
+            writer.sync_row_count(tab, existing_ids.get_row_count(spreadsheet_id, tab)
+                                  - DedupIndex.HEADER_ROWS)
+    return writer, new_rows
+
+def open_local_sink(kind, sink_dir=None):
+    """A SQLite, CSV or Parquet sink at its configured path (or inside sink_dir)"""
+    columns = config.SINK_COLUMNS
+    batch_rows = config.SINK_BATCH_ROWS
+    if kind == 'sqlite':
+        path = Path(sink_dir) / "emails.db" if sink_dir else config.SQLITE_SINK_PATH
+        return SQLiteSink(path, columns, max_rows=batch_rows)
+    if kind == 'csv':
+        path = Path(sink_dir) / "emails.csv" if sink_dir else config.CSV_SINK_PATH
+        return CSVSink(path, columns, max_rows=batch_rows)
+    if kind == 'parquet':
+        path = Path(sink_dir) / "parquet" if sink_dir else config.PARQUET_SINK_DIR
+        return ParquetSink(path, columns, max_rows=batch_rows * 10)
+    raise ValueError(f"Unknown sink: {kind}")
+
+def prepare_writer(sheets, existing_ids, spreadsheet_id, sheet_name, rebuild_index=False,
+                   sinks=None, sink_dir=None, sheet_writer=None, formatted_tabs=None):
+    """Writer for the configured sinks; returns (writer, new sheet rows indexed)
+    
+    Without the "sheets" sink the sheet is neither formatted nor read, so
+    local imports cost no Sheets quota. Several sinks are wrapped in a
+    FanOutSink. Local sink files go to their configured paths, or into
+    sink_dir when given (one directory per tenant). A sheet_writer passed
+    in replaces the prepared sheet writer; formatted_tabs is passed on to
+    prepare_sheet.
+    """
+    sinks = list(dict.fromkeys(sinks or config.SINKS))
+    writers = [open_local_sink(kind, sink_dir) for kind in sinks if kind != 'sheets']
+    new_rows = 0
+    if 'sheets' in sinks:
+        writer = sheet_writer
+        if writer is None:
+            writer, new_rows = prepare_sheet(sheets, existing_ids, spreadsheet_id, sheet_name,
+                                             rebuild_index, formatted_tabs)
+        writers.insert(sinks.index('sheets'), writer)
+    if len(writers) == 1:
+        return writers[0], new_rows
+    return FanOutSink(writers), new_rows
+
+def fetch_columns(sheets, sinks=None):
+    """Record fields the configured sinks store (drives the fetch profile)"""
+    sinks = sinks or config.SINKS
+    columns = set(sheets.column_keys) if 'sheets' in sinks else set()
+    if any(kind != 'sheets' for kind in sinks):
+        columns.update(config.SINK_COLUMNS or SINK_COLUMNS)
+    return columns
+
+def create_parser():
+    """Email parser for the configured PARSE_MODE"""
+    if config.PARSE_MODE == "process":
+        # CPU-heavy parsing runs on worker processes, outside the GIL
+        from src.parallel_parser import ProcessPoolParser
+        return ProcessPoolParser(config.PARSE_PROCESSES)
+    return EmailParser()
+
+_body_store = None
+_body_store_lock = threading.Lock()
+
+def open_body_store(sheets):
+    """Shared BodyStore when the sheet has a content_hash column, else None"""
+    global _body_store
+    if 'content_hash' not in sheets.column_keys:
+        return None
+    with _body_store_lock:
+        if _body_store is None:
+            _body_store = BodyStore(config.BODY_STORE_PATH, max_bytes=config.BODY_STORE_MAX_BYTES)
+        return _body_store
+
+def open_message_cache(db_path=None):
+    """The raw message cache, or None when config.MESSAGE_CACHE_ENABLED is off"""
+    if not config.MESSAGE_CACHE_ENABLED:
+        return None
+    return MessageCache(db_path or config.MESSAGE_CACHE_PATH,
+                        max_bytes=config.MESSAGE_CACHE_MAX_BYTES)
+
+def run_reparse(sheets, existing_ids, cache, spreadsheet_id, tab_name, sinks=None):
+    """Rebuild rows for every synced email from cached Gmail responses.
+    
+    Runs the normal parse/write stages with the current parser and columns
+    against the cache instead of Gmail, so no Gmail API calls are made.
+    Sheet rows go to tab_name, which should be a new or empty tab; emails
+    whose cached response is missing or too sparse for the columns count as
+    fetch failures. Returns the PipelineResult.
+    """
+    print(f"3. Rebuilding rows from {len(cache)} cached messages...")
+    sheet_writer = None
+    if 'sheets' in (sinks or config.SINKS):
+        sheets.ensure_sheet(spreadsheet_id, tab_name)
+        sheet_writer = BufferedSheetWriter(sheets, spreadsheet_id, tab_name,
+                                           preview_chars=config.BODY_PREVIEW_CHARS,
+                                           dedup=existing_ids)
+    writer, _ = prepare_writer(sheets, existing_ids, spreadsheet_id, tab_name,
+                               sinks=sinks, sheet_writer=sheet_writer)
+    
+    parser = create_parser()
+    pipeline = EmailPipeline(
+        CachedMailbox(cache), writer, ReparseIndex(),
+        parser=parser,
+        parse_workers=config.PARSE_WORKERS,
+        queue_size=config.PIPELINE_QUEUE_SIZE,
+        fetch_profile=config.FETCH_PROFILE or select_fetch_profile(fetch_columns(sheets, sinks)),
+        body_store=open_body_store(sheets)
+    )
+    try:
+        # Only emails that made it into the sheet (or sinks) before
+        result = pipeline.run(msg_id for msg_id in cache.iter_ids() if msg_id in existing_ids)
+    finally:
+        writer.close()
+        if hasattr(parser, 'close'):
+            parser.close()
+    if result.fetch_failed:
+        print(f"   {result.fetch_failed} emails were not cached with enough detail "
+              f"(set FETCH_PROFILE = \"full\" to cache complete messages)", file=sys.stderr)
+    return result
+
+def show_body(content_hash):
+    """Print a stored body; returns False when it is unknown or was evicted"""
+    body = BodyStore(config.BODY_STORE_PATH).get(content_hash.strip())
+    if body is None:
+        print(f"✗ No stored body for {content_hash}", file=sys.stderr)
+        return False
+    print(body)
+    return True
+
+def run_sync(gmail, sheets, state, existing_ids, spreadsheet_id, sheet_name,
+             rebuild_index=False, parser=None, stop_event=None, budget=None,
+             sinks=None, sink_dir=None, executor=None, formatted_tabs=None):
+    """One sync pass: list new emails, write them to the sinks, mark them read.
+    
+    A parser passed in is reused (and left open); otherwise one is created
+    for the pass. Setting stop_event ends listing early, while emails
+    already listed are still written and marked. budget caps the emails
+    queued this pass (default: config.MAX_EMAILS_PER_RUN). sinks and
+    sink_dir select where rows go (see prepare_writer). An executor passed
+    in runs the pipeline stages (see EmailPipeline). A formatted_tabs set
+    kept across passes skips re-checking tabs already formatted.
+    Returns the PipelineResult of the run.
+    """
+    print("3. Formatting Google Sheet...")
+    owns_parser = parser is None
+    if owns_parser:
+        parser = create_parser()
+    
+    # Load last processed date and history checkpoint
+    last_processed = state.load_state()
+    start_history_id = state.load_history_id()
+    print(f"4. Last processed: {last_processed} (history checkpoint: {start_history_id})")
+    
+    # Take the next checkpoint before listing so nothing added meanwhile is missed
+    try:
+        next_history_id = gmail.get_history_id()
+    except Exception as e:
+        print(f"Note: Could not read mailbox historyId: {e}", file=sys.stderr)
+        next_history_id = None
+    
+    # Committed by an earlier run whose mark-as-read failed; dedup skips them
+    # on listing, so they are only ever marked from here
+    unlabelled = earlier_unlabelled = state.load_unlabelled()
+    if unlabelled:
+        print(f"   Marking {len(unlabelled)} emails left unread by an earlier run...")
+        marked = set(gmail.mark_as_read_batch(unlabelled))
+        unlabelled = [msg_id for msg_id in unlabelled if msg_id not in marked]
+    
+    # Rows are buffered and written to the sheet in batches
+    writer, new_rows = prepare_writer(sheets, existing_ids, spreadsheet_id, sheet_name,
+                                      rebuild_index, sinks, sink_dir,
+                                      formatted_tabs=formatted_tabs)
+    print(f"5. Found {len(existing_ids)} already processed emails "
+          f"({new_rows or 0} new sheet rows indexed)")
+    
+    listing = {'complete': False}
+    
+    def iter_new_message_ids():
+        """Incremental history listing, falling back to a full unread scan"""
+        try:
+            if start_history_id:
+                try:
+                    yield from gmail.iter_history_message_ids(
+                        start_history_id, page_size=config.LIST_PAGE_SIZE)
+                    listing['complete'] = True
+                    return
+                except HistoryExpiredError:
+                    print("   History checkpoint expired, falling back to a full scan")
+            
+            query = gmail.build_unread_query(last_processed)
+            for messages, _ in gmail.iter_message_pages(query, config.LIST_PAGE_SIZE):
+                for msg in messages:
+                    yield msg['id']
+            listing['complete'] = True
+        except Exception as e:
+            print(f"Error fetching emails: {e}", file=sys.stderr)
+    
+    # Stream unread message ids through the fetch/parse/write/label stages
+    # Fetch only the parts of each message the sheet columns need
+    fetch_profile = config.FETCH_PROFILE or select_fetch_profile(fetch_columns(sheets, sinks))
+    if budget is None:
+        budget = config.MAX_EMAILS_PER_RUN
+    print(f"6. Processing unread emails (budget: {budget or 'unlimited'}, "
+          f"fetch profile: {fetch_profile})...")
+    pipeline = EmailPipeline(
+        gmail, writer, existing_ids,
+        parser=parser,
+        fetch_workers=config.FETCH_WORKERS,
+        parse_workers=config.PARSE_WORKERS,
+        label_workers=config.LABEL_WORKERS,
+        queue_size=config.PIPELINE_QUEUE_SIZE,
+        fetch_profile=fetch_profile,
+        budget=budget,
+        stop_event=stop_event,
+        body_store=open_body_store(sheets),
+        executor=executor
+    )
+    try:
+        result = pipeline.run(iter_new_message_ids())
+    finally:
+        writer.close()
+        if owns_parser and hasattr(parser, 'close'):
+            parser.close()
+    
+    if result.queued == 0:
+        print("✓ No new unread emails to process.")
+    if result.write_failed:
+        print(f"     ✗ Failed to add {result.write_failed} emails to sheet", file=sys.stderr)
+    if unlabelled or result.unmarked_ids:
+        print(f"     ✗ {len(unlabelled) + len(result.unmarked_ids)} emails in the sheet "
+              f"are still unread; the next run marks them", file=sys.stderr)
+    if earlier_unlabelled or result.unmarked_ids:
+        state.save_unlabelled(unlabelled + result.unmarked_ids)
+    
+    # Only move the checkpoints when every listed email was handled. Listing
+    # is newest first, so a pass cut short by its budget (or a stop, or a
+    # failure) still has older unread emails below the newest committed
+    # date; the next run re-lists from the old checkpoints (dedup skips the rest)
+    if listing['complete'] and result.ok:
+        if result.latest_email_date:
+            state.update_last_processed(result.latest_email_date)
+        elif result.committed > 0:
+            state.save_state()
+        if next_history_id:
+            state.save_history_id(next_history_id)
+    elif result.committed:
+        print("   Checkpoints kept: emails listed this run are still pending")
+    
+    return result
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.show_body:
+        sys.exit(0 if show_body(args.show_body) else 1)
+    
+    json_path = args.metrics_json or (config.METRICS_JSON_PATH if config.METRICS_ENABLED else None)
+    prom_path = args.metrics_prom or (config.METRICS_PROM_PATH if config.METRICS_ENABLED else None)
+    # The console summary and the exported files are all read from the
+    # metrics registry
+    if json_path or prom_path or not args.quiet:
+        metrics.enable()
+    
+    def report(result):
+        """Hand a finished pass to the metrics consumers"""
+        if metrics.enabled:
+            if not args.quiet:
+                run_metrics.print_summary()
+            export_metrics(result, json_path, prom_path)
+    
+    # Progress output is just one consumer of the run; --quiet drops it,
+    # while errors and warnings still reach stderr
+    with contextlib.ExitStack() as stack:
+        if args.quiet:
+            stack.enter_context(contextlib.redirect_stdout(
+                stack.enter_context(open(os.devnull, 'w'))))
+        run(args, report)
+
+def run_tenants(args, report):
+    """Sync every configured tenant on a shared, fairly scheduled worker pool"""
+    tenants, sheets_budgets = load_tenants(args.tenants)
+    print(f"Starting Gmail to Sheets automation for {len(tenants)} mailboxes...")
+    print("=" * 50)
+    
+    # One parser (and process pool) serves every tenant
+    parser = create_parser()
+    rebuilt = set()
+    report_lock = threading.Lock()
+    
+    def sync(tenant, budget):
+        # --rebuild-index applies to each tenant's first slice only
+        rebuild_index = args.rebuild_index and tenant.name not in rebuilt
+        rebuilt.add(tenant.name)
+        result = run_sync(
+            tenant.gmail, tenant.sheets, tenant.state, tenant.dedup,
+            tenant.spreadsheet_id, tenant.sheet_name,
+            rebuild_index=rebuild_index, parser=parser, budget=budget,
+            sinks=args.sink, sink_dir=tenant.data_dir
+        )
+        with report_lock:
+            report(result)
+        return result
+    
+    runner = MultiTenantRunner(
+        tenants, sync,
+        workers=config.TENANT_WORKERS,
+        slice_size=config.TENANT_SLICE_SIZE,
+        sheets_budgets=sheets_budgets
+    )
+    try:
+        runner.open()
+        for tenant in runner.tenants:
+            # Each mailbox caches its messages next to its other local state
+            tenant.gmail.message_cache = open_message_cache(tenant.data_dir / "message_cache.db")
+        runner.run()
+    finally:
+        if hasattr(parser, 'close'):
+            parser.close()
+        runner.close()
+    
+    total = sum(tenant.committed for tenant in runner.tenants)
+    print("\n" + "=" * 50)
+    print(f"✅ Processing complete! {total} emails added across {len(runner.tenants)} sheets.")
+    print("=" * 50)
+
+def run(args, report):
+    if args.tenants:
+        return run_tenants(args, report)
+    
     print("Starting Gmail to Sheets automation...")
     print("=" * 50)
     
@@ -21,97 +489,131 @@ def main():
     try:
         # Initialize services
         print("1. Authenticating with Gmail...")
-        gmail = GmailService()
+        gmail = GmailService(message_cache=open_message_cache())
         
         print("2. Initializing Sheets service...")
-        sheets = SheetsService(gmail.creds)
-        
-        print("3. Formatting Google Sheet...")
-        # Format or create sheet with proper headers
-        sheets.create_or_reset_sheet(SPREADSHEET_ID, SHEET_NAME)
+        # Share Gmail's authorized HTTP session instead of opening a second one
+        sheets = SheetsService(gmail.creds, columns=config.SHEET_COLUMNS,
+                               http_factory=gmail.http_factory)
         
-        parser = EmailParser()
         state = StateManager()
+        existing_ids = DedupIndex()
         
-        # Load last processed date
-        last_processed = state.load_state()
-        print(f"4. Last processed: {last_processed}")
-        
-        # Get unread emails since last run
-        print("5. Fetching unread emails...")
-        messages = gmail.get_unread_emails(last_processed)
-        
-        if not messages:
-            print("✓ No new unread emails to process.")
+        if args.reparse_from_cache:
+            if gmail.message_cache is None:
+                print("✗ The message cache is disabled (config.MESSAGE_CACHE_ENABLED)",
+                      file=sys.stderr)
+                return
+            tab_name = args.reparse_tab or f"{SHEET_NAME} reparsed {datetime.now():%Y-%m-%d %H%M}"
+            try:
+                result = run_reparse(sheets, existing_ids, gmail.message_cache,
+                                     SPREADSHEET_ID, tab_name, sinks=args.sink)
+            finally:
+                gmail.message_cache.close()
+                existing_ids.close()
+            print(f"✅ Rebuilt {result.committed} rows"
+                  + (f" in tab '{tab_name}'" if 'sheets' in (args.sink or config.SINKS) else ""))
+            report(result)
             return
         
-        print(f"6. Found {len(messages)} unread messages")
-        
-        # Get existing message IDs to prevent duplicates
-        existing_ids = sheets.get_existing_message_ids(SPREADSHEET_ID, SHEET_NAME)
-        print(f"7. Found {len(existing_ids)} already processed emails")
-        
-        processed_count = 0
-        latest_email_date = None
-        
-        # Process emails (limit to reasonable number)
-        max_emails = min(10, len(messages))  # Process max 10 emails
-        print(f"8. Processing {max_emails} emails...")
-        
-        for i, msg in enumerate(messages[:max_emails]):
-            msg_id = msg['id']
+        if args.backfill:
+            journal = BackfillJournal(max_attempts=config.BACKFILL_MAX_ATTEMPTS)
+            parser = create_parser()
             
-            # Skip if already processed
-            if msg_id in existing_ids:
-                print(f"   [{i+1}/{max_emails}] Skipping already processed: {msg_id[:10]}...")
-                continue
+            def make_pipeline(writer):
+                return EmailPipeline(
+                    gmail, writer, existing_ids,
+                    parser=parser,
+                    fetch_workers=config.FETCH_WORKERS,
+                    parse_workers=config.PARSE_WORKERS,
+                    label_workers=config.LABEL_WORKERS,
+                    queue_size=config.PIPELINE_QUEUE_SIZE,
+                    fetch_profile=config.FETCH_PROFILE or select_fetch_profile(
+                        fetch_columns(sheets, args.sink)),
+                    journal=journal,
+                    body_store=open_body_store(sheets)
+                )
             
-            # Get email details
-            email_details = gmail.get_email_details(msg_id)
-            if not email_details:
-                print(f"   [{i+1}/{max_emails}] Failed to fetch email details")
-                continue
-            
-            # Parse email
-            parsed_email = parser.parse_email(email_details)
-            parsed_email['message_id'] = msg_id  # Add message_id for duplicate tracking
-            
-            print(f"   [{i+1}/{max_emails}] Processing: {parsed_email['subject'][:40]}...")
-            
-            # Append to Google Sheets
-            success = sheets.append_row(SPREADSHEET_ID, SHEET_NAME, parsed_email)
+            try:
+                result = run_backfill(
+                    gmail, sheets, existing_ids, journal, SPREADSHEET_ID, SHEET_NAME,
+                    args.query or config.BACKFILL_QUERY, make_pipeline,
+                    restart=args.restart_backfill, page_size=config.LIST_PAGE_SIZE,
+                    since=args.since, until=args.until,
+                    window_size=config.BACKFILL_WINDOW_SIZE,
+                    list_workers=config.BACKFILL_LIST_WORKERS,
+                    prepare_writer=lambda: prepare_writer(
+                        sheets, existing_ids, SPREADSHEET_ID, SHEET_NAME, sinks=args.sink)[0]
+                )
+            finally:
+                if hasattr(parser, 'close'):
+                    parser.close()
+                journal.close()
+                existing_ids.close()
+                if gmail.message_cache is not None:
+                    gmail.message_cache.close()
+            if result is not None:
+                report(result)
+            return
+        
+        if args.daemon:
+            # Services, dedup index, parser and pipeline threads (with their
+            # API clients and connections) stay warm between passes
+            parser = create_parser()
+            executor = ThreadPoolExecutor(
+                max_workers=EmailPipeline.thread_count(
+                    config.FETCH_WORKERS, config.PARSE_WORKERS, config.LABEL_WORKERS),
+                thread_name_prefix='pipeline')
+            rebuild_index = [args.rebuild_index]
+            # Tabs are formatted once per daemon, not on every pass
+            formatted_tabs = set()
             
-            if success:
-                # Mark as read in Gmail
-                gmail.mark_as_read(msg_id)
-                processed_count += 1
-                
-                # Track latest email date for state update
-                if latest_email_date is None or parsed_email['date'] > latest_email_date:
-                    latest_email_date = parsed_email['date']
-                
-                print(f"     ✓ Added to sheet")
-            else:
-                print(f"     ✗ Failed to add to sheet")
+            def sync(stop_event):
+                result = run_sync(
+                    gmail, sheets, state, existing_ids, SPREADSHEET_ID, SHEET_NAME,
+                    rebuild_index=rebuild_index.pop() if rebuild_index else False,
+                    parser=parser, stop_event=stop_event, sinks=args.sink,
+                    executor=executor, formatted_tabs=formatted_tabs
+                )
+                sys.stdout.flush()
+                return result
             
-            # Rate limiting
-            time.sleep(0.5)
+            daemon = SyncDaemon(
+                sync, gmail,
+                interval=args.interval or config.DAEMON_POLL_INTERVAL,
+                jitter=config.DAEMON_POLL_JITTER,
+                refresh_margin=config.TOKEN_REFRESH_MARGIN,
+                on_pass=report
+            )
+            try:
+                daemon.run()
+            finally:
+                executor.shutdown(wait=True)
+                if hasattr(parser, 'close'):
+                    parser.close()
+                existing_ids.close()
+                if gmail.message_cache is not None:
+                    gmail.message_cache.close()
+            return
         
-        # Update state
-        if latest_email_date:
-            state.update_last_processed(latest_email_date)
-        elif processed_count > 0:
-            state.save_state()
+        result = run_sync(
+            gmail, sheets, state, existing_ids, SPREADSHEET_ID, SHEET_NAME,
+            rebuild_index=args.rebuild_index, sinks=args.sink
+        )
+        existing_ids.close()
+        if gmail.message_cache is not None:
+            gmail.message_cache.close()
         
         print("\n" + "=" * 50)
-        print(f"✅ Processing complete! {processed_count} emails added to sheet.")
+        print(f"✅ Processing complete! {result.committed} emails added to sheet.")
         print(f"📊 Sheet URL: https://docs.google.com/spreadsheets/d/{SPREADSHEET_ID}/edit")
         print("=" * 50)
+        report(result)
         
     except Exception as e:
-        print(f"\n✗ Error in main process: {e}")
+        print(f"\n✗ Error in main process: {e}", file=sys.stderr)
         import traceback
         traceback.print_exc()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,222 @@
+# message_cache.py
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from src.metrics import metrics
+
+# Fetch profiles from least to most complete; a cached response serves its
+# own profile and every cheaper one
+PROFILE_RANK = {'metadata': 0, 'text': 1, 'full': 2}
+
+
+class MessageCache:
+    """Persistent cache of raw Gmail messages.get responses by message id.
+
+    Responses are stored zlib-compressed in SQLite together with the fetch
+    profile they were requested with. Lookups refresh an entry's access
+    time; once the stored bytes pass max_bytes the least recently used
+    entries are evicted until the cache is back under low_water of the
+    limit. The database runs in WAL mode, so other processes (a reparse, a
+    second daemon) can read it while a sync writes to it.
+    """
+
+    def __init__(self, db_path=None, max_bytes=None, low_water=0.9, compression_level=6):
+        BASE_DIR = Path(__file__).parent.parent
+        self.db_path = Path(db_path) if db_path else BASE_DIR / "data" / "message_cache.db"
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.compression_level = compression_level
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        # Must be set before the first table exists to take effect
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "message_id TEXT PRIMARY KEY, profile TEXT, data BLOB, "
+                "size INTEGER, accessed REAL)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS messages_accessed ON messages (accessed)"
+            )
+        self._total_bytes = None
+
+    @property
+    def total_bytes(self):
+        """Compressed bytes stored (summed once, then tracked)"""
+        with self._lock:
+            return self._tracked_total()
+
+    def _tracked_total(self):
+        # Caller holds self._lock
+        if self._total_bytes is None:
+            self._total_bytes = self.conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM messages").fetchone()[0]
+        return self._total_bytes
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def get_many(self, msg_ids, profile='full'):
+        """Cached responses for msg_ids that satisfy profile, keyed by id"""
+        wanted = PROFILE_RANK[profile]
+        msg_ids = list(dict.fromkeys(msg_ids))
+        found = {}
+        for start in range(0, len(msg_ids), 500):
+            chunk = msg_ids[start:start + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            with self._lock:
+                rows = self.conn.execute(
+                    f"SELECT message_id, profile, data FROM messages "
+                    f"WHERE message_id IN ({placeholders})", chunk
+                ).fetchall()
+            for msg_id, cached_profile, data in rows:
+                if PROFILE_RANK.get(cached_profile, -1) >= wanted:
+                    found[msg_id] = json.loads(zlib.decompress(data))
+
+        if found:
+            self._touch(list(found))
+        metrics.inc('message_cache_lookups_total', len(found), result='hit')
+        metrics.inc('message_cache_lookups_total', len(msg_ids) - len(found), result='miss')
+        return found
+
+    def get(self, msg_id, profile='full'):
+        return self.get_many([msg_id], profile).get(msg_id)
+
+    def _touch(self, msg_ids):
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "UPDATE messages SET accessed = ? WHERE message_id = ?",
+                ((now, msg_id) for msg_id in msg_ids)
+            )
+
+    def put_many(self, messages, profile='full'):
+        """Store {msg_id: response} fetched with profile
+
+        An entry already cached with a more complete profile is kept.
+        """
+        if not messages:
+            return
+        rank = PROFILE_RANK[profile]
+        now = time.time()
+        entries = []
+        for msg_id, message in messages.items():
+            data = zlib.compress(json.dumps(message, separators=(',', ':')).encode('utf-8'),
+                                 self.compression_level)
+            entries.append((msg_id, profile, data, len(data), now))
+
+        # Read and update the total under one lock, or concurrent puts lose bytes
+        with self._lock, self.conn:
+            total = self._tracked_total()
+            replaced = {}
+            for start in range(0, len(entries), 500):
+                chunk = [entry[0] for entry in entries[start:start + 500]]
+                placeholders = ', '.join('?' for _ in chunk)
+                replaced.update(
+                    (msg_id, (cached_profile, size)) for msg_id, cached_profile, size in
+                    self.conn.execute(
+                        f"SELECT message_id, profile, size FROM messages "
+                        f"WHERE message_id IN ({placeholders})", chunk
+                    )
+                )
+            stored = [entry for entry in entries
+                      if PROFILE_RANK.get(replaced.get(entry[0], (None,))[0], -1) <= rank]
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO messages (message_id, profile, data, size, accessed) "
+                "VALUES (?, ?, ?, ?, ?)", stored
+            )
+            total += sum(entry[3] for entry in stored)
+            total -= sum(replaced[entry[0]][1] for entry in stored if entry[0] in replaced)
+            self._total_bytes = total
+
+        if self.max_bytes and total > self.max_bytes:
+            self.evict()
+
+    def evict(self, max_bytes=None):
+        """Delete least recently used entries until under low_water * max_bytes
+
+        Returns the number of entries removed.
+        """
+        limit = max_bytes or self.max_bytes
+        if not limit:
+            return 0
+        with self._lock:
+            total = self.conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM messages").fetchone()[0]
+            target = limit * self.low_water
+            victims = []
+            cursor = self.conn.execute("SELECT message_id, size FROM messages ORDER BY accessed")
+            for msg_id, size in cursor:
+                if total <= target:
+                    break
+                victims.append((msg_id,))
+                total -= size
+            cursor.close()
+            with self.conn:
+                self.conn.executemany("DELETE FROM messages WHERE message_id = ?", victims)
+            # Hand the freed pages back to the file system (executescript runs
+            # the pragma to completion; execute() frees a single page)
+            self.conn.executescript("PRAGMA incremental_vacuum;")
+            self._total_bytes = total
+        if victims:
+            metrics.inc('message_cache_evictions_total', len(victims))
+            print(f"   Evicted {len(victims)} cached messages to stay under {limit:,} bytes")
+        return len(victims)
+
+    def iter_ids(self, page_size=1000):
+        """Every cached message id, oldest entry first"""
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT rowid, message_id FROM messages WHERE rowid > ? "
+                    "ORDER BY rowid LIMIT ?", (last_rowid, page_size)
+                ).fetchall()
+            if not rows:
+                return
+            last_rowid = rows[-1][0]
+            for _, msg_id in rows:
+                yield msg_id
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class CachedMailbox:
+    """Read-only stand-in for GmailService that serves messages from a cache.
+
+    Lets EmailPipeline rebuild rows from cached responses with no Gmail API
+    calls: fetches come from the cache (misses count as fetch failures) and
+    marking as read is a no-op, since cached messages were marked when they
+    were first synced.
+    """
+
+    BATCH_SIZE = 100
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def get_email_details_batch(self, msg_ids, max_retries=3, profile='full', failures=None):
+        return self.cache.get_many(msg_ids, profile)
+
+    def mark_as_read_batch(self, msg_ids):
+        return list(msg_ids)
+
+
+class ReparseIndex(set):
+    """Dedup index for a reparse: only ids already rebuilt this run are skipped"""
+
+    def add_many(self, msg_ids):
+        self.update(msg_ids)
@@ -0,0 +1,239 @@
+# metrics.py
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PROMETHEUS_PREFIX = 'gmail_to_sheets_'
+
+_NULL_CONTEXT = nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'avg': round(self.sum / self.count, 6) if self.count else 0.0,
+            'buckets': {str(bound): count for bound, count in zip(self.buckets, self.counts)},
+        }
+
+
+class _StageTimer:
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe('stage_seconds', time.perf_counter() - self.started, stage=self.stage)
+        return False
+
+
+class Metrics:
+    """Per-run counters, gauges and histograms.
+
+    Everything is keyed by a metric name plus labels, e.g.
+    `api_calls_total{api="gmail",method="messages.get",status="200"}`.
+    While disabled (the default) every method returns immediately, so the
+    instrumentation left in hot paths costs one attribute check.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.started_at = datetime.now()
+
+    def enable(self):
+        self.reset()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        """Record a gauge reading; the report keeps the last and peak values"""
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            _, peak = self.gauges.get(key, (value, value))
+            self.gauges[key] = (value, max(peak, value))
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def stage(self, stage):
+        """Context manager timing one unit of work in a pipeline stage"""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _StageTimer(self, stage)
+
+    def api_call(self, api, method, seconds, status):
+        """Record one Google API call with its latency and HTTP status"""
+        if not self.enabled:
+            return
+        self.inc('api_calls_total', api=api, method=method, status=str(status))
+        self.observe('api_latency_seconds', seconds, api=api, method=method)
+
+    def report(self):
+        """Snapshot of every metric as a JSON-friendly dict"""
+        def label_str(labels):
+            return ','.join(f'{k}={v}' for k, v in labels) or '_'
+
+        report = {
+            'started_at': self.started_at.isoformat(),
+            'generated_at': datetime.now().isoformat(),
+            'counters': {}, 'gauges': {}, 'histograms': {},
+        }
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                report['counters'].setdefault(name, {})[label_str(labels)] = value
+            for (name, labels), (last, peak) in sorted(self.gauges.items()):
+                report['gauges'].setdefault(name, {})[label_str(labels)] = {'last': last, 'peak': peak}
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                report['histograms'].setdefault(name, {})[label_str(labels)] = histogram.to_dict()
+        return report
+
+    def prometheus_lines(self):
+        """Metrics in the Prometheus text exposition format"""
+        def labels_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"') for _, v in pairs)
+            return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+        lines = []
+        with self._lock:
+            seen = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = PROMETHEUS_PREFIX + name
+                if metric not in seen:
+                    seen.add(metric)
+                    lines.append(f'# TYPE {metric} counter')
+                lines.append(f'{metric}{labels_text(labels)} {value}')
+            for (name, labels), (last, peak) in sorted(self.gauges.items()):
+                metric = PROMETHEUS_PREFIX + name
+                if metric not in seen:
+                    seen.add(metric)
+                    lines.append(f'# TYPE {metric} gauge')
+                    lines.append(f'# TYPE {metric}_peak gauge')
+                lines.append(f'{metric}{labels_text(labels)} {last}')
+                lines.append(f'{metric}_peak{labels_text(labels)} {peak}')
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                metric = PROMETHEUS_PREFIX + name
+                if metric not in seen:
+                    seen.add(metric)
+                    lines.append(f'# TYPE {metric} histogram')
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'{metric}_bucket{labels_text(labels, [("le", bound)])} {count}')
+                lines.append(f'{metric}_bucket{labels_text(labels, [("le", "+Inf")])} {histogram.count}')
+                lines.append(f'{metric}_sum{labels_text(labels)} {histogram.sum}')
+                lines.append(f'{metric}_count{labels_text(labels)} {histogram.count}')
+        return lines
+
+
+def _write_atomic(path, text):
+    """Write via a temp file and rename so readers never see a partial file"""
+    path = Path(path)
+    os.makedirs(path.parent, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_json_report(path, extra=None):
+    """Export the run report as JSON; `extra` adds run-level fields"""
+    report = metrics.report()
+    if extra:
+        report.update(extra)
+    _write_atomic(path, json.dumps(report, indent=2))
+
+
+def write_prometheus_textfile(path):
+    """Export for the node_exporter textfile collector"""
+    _write_atomic(path, '\n'.join(metrics.prometheus_lines()) + '\n')
+
+
+# Order of the email outcomes in the console summary, as the pipeline counts them
+OUTCOMES = ('listed', 'skipped', 'queued', 'gone', 'fetch_failed', 'parse_failed',
+            'stage_failed', 'committed', 'write_failed', 'marked')
+
+
+def print_summary():
+    """Console consumer: email outcomes, per-stage timings and API call totals"""
+    report = metrics.report()
+    outcomes = report['counters'].get('messages_total', {})
+    counts = [(outcome, outcomes.get(f'outcome={outcome}', 0)) for outcome in OUTCOMES]
+    if outcomes:
+        print("📬 Emails: " + ", ".join(f"{count} {outcome.replace('_', ' ')}"
+                                       for outcome, count in counts if count))
+    stages = report['histograms'].get('stage_seconds', {})
+    if stages:
+        print("⏱  Stage timings:")
+        for labels, data in stages.items():
+            print(f"   - {labels.split('=', 1)[-1]:<10} {data['count']:>6} runs  "
+                  f"{data['sum']:>9.2f}s total  {data['avg'] * 1000:>8.1f}ms avg")
+    calls = report['histograms'].get('api_latency_seconds', {})
+    if calls:
+        print("🌐 API calls:")
+        for labels, data in calls.items():
+            print(f"   - {labels:<40} {data['count']:>6} calls  {data['avg'] * 1000:>8.1f}ms avg")
+    counters = report['counters']
+    for name in ('retries_total', 'throttle_events_total'):
+        if name in counters:
+            print(f"   {name}: {sum(counters[name].values())}")
+
+
+# Process-wide metrics, disabled until enable() is called
+metrics = Metrics()
@@ -0,0 +1,119 @@
+# partition_catalog.py
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+
+def partition_tab_name(base_name, period=None, seq=1):
+    """Tab title for a partition: 'Log', 'Log 2024-05', 'Log 2024-05 (2)'"""
+    name = f"{base_name} {period}" if period else base_name
+    return f"{name} ({seq})" if seq > 1 else name
+
+
+class PartitionCatalog:
+    """Local catalog of the tabs a partitioned log is spread over.
+
+    For each partition it keeps the period (month, or none for size-capped
+    rollover), its sequence number within the period, the data row count
+    and the range of email dates stored in it, plus which partition every
+    message id was written to (recorded as rows commit). Appends and dedup
+    reconciles consult it to touch only the active partition instead of
+    reading every tab.
+    """
+
+    def __init__(self, db_path=None):
+        BASE_DIR = Path(__file__).parent.parent
+        self.db_path = Path(db_path) if db_path else BASE_DIR / "data" / "partitions.db"
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS partitions ("
+                "spreadsheet_id TEXT, tab_name TEXT, base_name TEXT, period TEXT, "
+                "seq INTEGER, row_count INTEGER DEFAULT 0, min_date TEXT, max_date TEXT, "
+                "PRIMARY KEY (spreadsheet_id, tab_name))"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS partition_ids ("
+                "message_id TEXT PRIMARY KEY, spreadsheet_id TEXT, tab_name TEXT)"
+            )
+
+    def active(self, spreadsheet_id, base_name, period=None):
+        """(tab_name, seq, row_count) of the newest partition for a period, or None"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT tab_name, seq, row_count FROM partitions "
+                "WHERE spreadsheet_id = ? AND base_name = ? AND period IS ? "
+                "ORDER BY seq DESC LIMIT 1",
+                (spreadsheet_id, base_name, period)
+            ).fetchone()
+
+    def add_partition(self, spreadsheet_id, base_name, period, seq, row_count=0):
+        tab_name = partition_tab_name(base_name, period, seq)
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO partitions "
+                "(spreadsheet_id, tab_name, base_name, period, seq, row_count) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (spreadsheet_id, tab_name, base_name, period, seq, row_count)
+            )
+        return tab_name
+
+    def set_row_count(self, spreadsheet_id, tab_name, row_count):
+        """Raise the stored row count to at least row_count (e.g. rows added by hand)"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE partitions SET row_count = MAX(row_count, ?) "
+                "WHERE spreadsheet_id = ? AND tab_name = ?",
+                (row_count, spreadsheet_id, tab_name)
+            )
+
+    def record_rows(self, spreadsheet_id, tab_name, rows):
+        """Account for rows committed to a partition"""
+        dates = [row['date'] for row in rows if row.get('date')]
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO partition_ids (message_id, spreadsheet_id, tab_name) "
+                "VALUES (?, ?, ?)",
+                ((row['message_id'], spreadsheet_id, tab_name) for row in rows)
+            )
+            self.conn.execute(
+                "UPDATE partitions SET row_count = row_count + ?, "
+                "min_date = CASE WHEN min_date IS NULL OR min_date > ? THEN ? ELSE min_date END, "
+                "max_date = CASE WHEN max_date IS NULL OR max_date < ? THEN ? ELSE max_date END "
+                "WHERE spreadsheet_id = ? AND tab_name = ?",
+                (len(rows), min(dates, default=None), min(dates, default=None),
+                 max(dates, default=None), max(dates, default=None), spreadsheet_id, tab_name)
+            )
+
+    def find_message(self, message_id):
+        """(spreadsheet_id, tab_name) a message was written to, or None"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT spreadsheet_id, tab_name FROM partition_ids WHERE message_id = ?",
+                (message_id,)
+            ).fetchone()
+
+    def partitions(self, spreadsheet_id, base_name, start_date=None, end_date=None):
+        """Partitions of a log whose date range overlaps [start_date, end_date]
+
+        Dates are ISO strings, compared as text like the stored ones.
+        """
+        query = ("SELECT tab_name, period, seq, row_count, min_date, max_date FROM partitions "
+                 "WHERE spreadsheet_id = ? AND base_name = ?")
+        params = [spreadsheet_id, base_name]
+        if start_date is not None:
+            query += " AND (max_date IS NULL OR max_date >= ?)"
+            params.append(start_date)
+        if end_date is not None:
+            query += " AND (min_date IS NULL OR min_date <= ?)"
+            params.append(end_date)
+        with self._lock:
+            return self.conn.execute(query + " ORDER BY period, seq", params).fetchall()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
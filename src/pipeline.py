@@ -0,0 +1,381 @@
+# pipeline.py
+import queue
+import sys
+import threading
+import time
+
+from src.email_parser import EmailParser
+from src.metrics import OUTCOMES, metrics
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class PipelineResult:
+    """Counters collected while the pipeline runs"""
+
+    def __init__(self):
+        self.listed = 0
+        self.skipped = 0
+        self.queued = 0
+        self.fetch_failed = 0
+        self.parse_failed = 0
+        self.committed = 0
+        self.write_failed = 0
+        self.marked = 0
+        # Committed, but marking them as read failed
+        self.unmarked_ids = []
+        # Queued, but lost to an unexpected error inside a stage
+        self.stage_failed = 0
+        # Listed, but deleted before it could be fetched (404)
+        self.gone = 0
+        self.latest_email_date = None
+        self.budget_exhausted = False
+        self.interrupted = False
+        self._lock = threading.Lock()
+
+    def add(self, name, count=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + count)
+
+    def add_unmarked(self, msg_ids):
+        with self._lock:
+            self.unmarked_ids.extend(msg_ids)
+
+    @property
+    def ok(self):
+        """True when every queued email landed in the sheet and was marked as read"""
+        return not (self.budget_exhausted or self.interrupted or self.fetch_failed or
+                    self.parse_failed or self.stage_failed or self.write_failed or
+                    self.unmarked_ids)
+
+
+class EmailPipeline:
+    """Staged fetch -> parse -> write -> label pipeline.
+
+    Each stage runs on its own worker threads, connected by bounded queues so
+    a slow stage applies backpressure instead of letting work pile up in
+    memory:
+
+        listing (1) -> fetch (N) -> parse (N) -> write (1) -> label (N)
+
+    Listing dedups ids and cuts them into chunks with a sequence number.
+    Fetch and parse workers may finish chunks out of order; the single writer
+    reorders them so rows land in the sheet in listing order, and only rows
+    the sheet committed are passed on to be marked as read.
+    
+    Stages run on fresh threads by default. A long-lived process can pass
+    an executor with at least thread_count() threads instead, so worker
+    threads (and the per-thread API clients they hold) survive between runs.
+    """
+
+    def __init__(self, gmail, writer, dedup, parser=None, fetch_workers=4,
+                 parse_workers=2, label_workers=2, queue_size=8,
+                 batch_size=None, budget=None, fetch_profile='full', stop_event=None,
+                 journal=None, body_store=None, executor=None):
+        self.gmail = gmail
+        self.writer = writer
+        self.dedup = dedup
+        self.parser = parser or EmailParser()
+        self.fetch_workers = max(1, fetch_workers)
+        self.parse_workers = max(1, parse_workers)
+        self.label_workers = max(1, label_workers)
+        self.queue_size = max(1, queue_size)
+        self.batch_size = batch_size or gmail.BATCH_SIZE
+        self.budget = budget
+        self.fetch_profile = fetch_profile
+        # Setting this stops listing; work already listed still drains
+        self.stop_event = stop_event
+        # Optional BackfillJournal told about every append and label
+        self.journal = journal
+        # Optional BodyStore: full bodies go there and rows get their content_hash
+        self.body_store = body_store
+        # Optional ThreadPoolExecutor the stages run on instead of new threads
+        self.executor = executor
+    
+    @staticmethod
+    def thread_count(fetch_workers=4, parse_workers=2, label_workers=2):
+        """Threads one run keeps busy: listing, writer and the worker pools"""
+        return 2 + max(1, fetch_workers) + max(1, parse_workers) + max(1, label_workers)
+
+    def run(self, message_ids):
+        """Process an iterable of message ids; returns a PipelineResult"""
+        result = PipelineResult()
+        fetch_q = queue.Queue(self.queue_size)
+        parse_q = queue.Queue(self.queue_size)
+        write_q = queue.Queue(self.queue_size)
+        label_q = queue.Queue(self.queue_size)
+
+        waits = [
+            *self._start_thread('list', self._list_stage, message_ids, fetch_q, result),
+            *self._start_pool('fetch', self.fetch_workers, fetch_q, parse_q,
+                             lambda item: self._fetch(item, result),
+                             lambda item: (*self._stage_failed('fetch', *item, result), {}, [])),
+            *self._start_pool('parse', self.parse_workers, parse_q, write_q,
+                             lambda item: self._parse(item, result),
+                             lambda item: self._stage_failed('parse', item[0], item[1], result)),
+            *self._start_thread('write', self._write_stage, write_q, label_q, result),
+            *self._start_pool('label', self.label_workers, label_q, None,
+                             lambda item: self._label(item, result),
+                             lambda item: result.add_unmarked(item)),
+        ]
+        for wait in waits:
+            wait()
+
+        for outcome in OUTCOMES:
+            metrics.inc('messages_total', getattr(result, outcome), outcome=outcome)
+        return result
+
+    def _start_thread(self, name, target, *args):
+        """Run target on a stage thread; returns callables that wait for it"""
+        if self.executor is not None:
+            return [self.executor.submit(target, *args).result]
+        thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+        thread.start()
+        return [thread.join]
+
+    def _start_pool(self, name, workers, in_q, out_q, fn, on_error=None):
+        """Start a worker pool; returns callables that wait for its workers
+        
+        The last worker to see the end of input passes it on. When fn
+        raises, on_error(item) (if given) accounts for the item and returns
+        the output to pass on in its place.
+        """
+        running = [workers]
+        lock = threading.Lock()
+        
+        def worker():
+            while True:
+                item = in_q.get()
+                metrics.gauge('queue_depth', in_q.qsize(), queue=name)
+                if item is _DONE:
+                    # Let sibling workers see the end of input too
+                    in_q.put(_DONE)
+                    with lock:
+                        running[0] -= 1
+                        last = running[0] == 0
+                    if last and out_q is not None:
+                        out_q.put(_DONE)
+                    return
+                try:
+                    output = fn(item)
+                except Exception as e:
+                    print(f"✗ Error in {name} stage: {e}", file=sys.stderr)
+                    if on_error is None:
+                        continue
+                    output = on_error(item)
+                if out_q is not None and output is not None:
+                    out_q.put(output)
+
+        return [wait for i in range(workers)
+                for wait in self._start_thread(f'{name}-{i}', worker)]
+
+    def _list_stage(self, message_ids, fetch_q, result):
+        """Dedup listed ids and hand them to the fetch stage in chunks"""
+        seen = set()
+        chunk = []
+        seq = 0
+        # Time spent listing and deduping, excluding waits on a full fetch queue
+        started = time.perf_counter()
+        try:
+            for msg_id in message_ids:
+                result.add('listed')
+
+                # Skip if already processed (in the sheet or earlier this run)
+                if msg_id in seen or msg_id in self.dedup:
+                    result.add('skipped')
+                    continue
+
+                if self.stop_event is not None and self.stop_event.is_set():
+                    print("   Stop requested, finishing emails already listed")
+                    result.interrupted = True
+                    break
+
+                if self.budget is not None and result.queued >= self.budget:
+                    print(f"   Reached per-run budget of {self.budget} emails")
+                    result.budget_exhausted = True
+                    break
+
+                seen.add(msg_id)
+                result.add('queued')
+                chunk.append(msg_id)
+                if len(chunk) >= self.batch_size:
+                    metrics.observe('stage_seconds', time.perf_counter() - started, stage='list')
+                    fetch_q.put((seq, chunk))
+                    started = time.perf_counter()
+                    seq += 1
+                    chunk = []
+
+            metrics.observe('stage_seconds', time.perf_counter() - started, stage='list')
+            if chunk:
+                fetch_q.put((seq, chunk))
+                seq += 1
+        except Exception as e:
+            print(f"✗ Error in list stage: {e}", file=sys.stderr)
+        finally:
+            fetch_q.put(_DONE)
+
+    def _fetch(self, item, result):
+        seq, chunk = item
+        failures = {}
+        try:
+            # Get email details for the whole chunk in one batch request
+            with metrics.stage('fetch'):
+                details = self.gmail.get_email_details_batch(
+                    chunk, profile=self.fetch_profile, failures=failures)
+        except Exception as e:
+            print(f"✗ Error fetching {len(chunk)} emails: {e}", file=sys.stderr)
+            details = {}
+        # Deleted after listing: nothing to write, and nothing to retry later
+        gone = [msg_id for msg_id, status in failures.items() if status == 404]
+        return seq, [msg_id for msg_id in chunk if msg_id not in gone], details, gone
+
+    def _parse_messages(self, messages):
+        """Parse a list of messages; failures come back as exceptions"""
+        if hasattr(self.parser, 'parse_batch'):
+            # Process pool: the whole chunk goes out in one round trip
+            return self.parser.parse_batch(messages)
+        
+        records = []
+        for message in messages:
+            try:
+                records.append(self.parser.parse_email(message))
+            except Exception as e:
+                records.append(e)
+        return records
+
+    def _parse(self, item, result):
+        seq, chunk, details, gone = item
+        if gone:
+            print(f"   Skipped {len(gone)} emails deleted since they were listed", file=sys.stderr)
+            result.add('gone', len(gone))
+            if self.journal is not None:
+                self.journal.record_skipped(gone)
+        fetched = []
+        for msg_id in chunk:
+            if details.get(msg_id):
+                fetched.append(msg_id)
+            else:
+                print(f"   Failed to fetch email details: {msg_id[:10]}...", file=sys.stderr)
+        
+        # Counters are only added once the whole chunk is through, so a chunk
+        # that raises is counted once, by _stage_failed
+        records = []
+        parse_failed = []
+        with metrics.stage('parse'):
+            parsed = self._parse_messages([details[msg_id] for msg_id in fetched])
+        for msg_id, parsed_email in zip(fetched, parsed):
+            if isinstance(parsed_email, Exception):
+                print(f"   Failed to parse email {msg_id[:10]}...: {parsed_email}", file=sys.stderr)
+                parse_failed.append(msg_id)
+                continue
+            parsed_email['message_id'] = msg_id  # Add message_id for duplicate tracking
+            if self.body_store is not None:
+                # Rows keep the full body; the sheet writer cuts it to a preview
+                parsed_email['content_hash'] = self.body_store.put(
+                    parsed_email.get('content', ''))
+            records.append(parsed_email)
+        result.add('fetch_failed', len(chunk) - len(fetched))
+        result.add('parse_failed', len(parse_failed))
+        self._record_failed([msg_id for msg_id in chunk if msg_id not in fetched] + parse_failed)
+        print(f"   Parsed {len(records)}/{len(chunk)} emails (chunk {seq + 1})")
+        return seq, records
+
+    def _record_failed(self, msg_ids):
+        """Journal a failed attempt for each id (the journal caps retries)"""
+        if self.journal is not None and msg_ids:
+            self.journal.record_failed(msg_ids)
+
+    def _stage_failed(self, name, seq, msg_ids, result):
+        """Count a chunk lost to a stage error; returns its empty stand-in"""
+        print(f"✗ Dropped {len(msg_ids)} emails of chunk {seq + 1} in the {name} stage",
+              file=sys.stderr)
+        result.add('stage_failed', len(msg_ids))
+        self._record_failed(msg_ids)
+        # Keeps the writer's reorder buffer moving past this sequence number
+        return seq, []
+
+    def _write_stage(self, write_q, label_q, result):
+        """Write parsed chunks to the sheet in listing order"""
+        pending = {}
+        next_seq = 0
+        item = None
+        # Records of the chunk being written that the writer has not taken yet
+        writing = []
+        failed_before = len(self.writer.failed)
+
+        def commit(rows):
+            if not rows:
+                return
+            print(f"     ✓ Added {len(rows)} emails to sheet")
+            if self.journal is not None:
+                self.journal.record_appended(row['message_id'] for row in rows)
+            self.dedup.add_many(row['message_id'] for row in rows)
+            result.add('committed', len(rows))
+            for row in rows:
+                # Track latest email date for state update
+                if result.latest_email_date is None or row['date'] > result.latest_email_date:
+                    result.latest_email_date = row['date']
+            label_q.put([row['message_id'] for row in rows])
+
+        try:
+            while True:
+                try:
+                    item = write_q.get(timeout=1.0)
+                except queue.Empty:
+                    # Nothing new: still honour the writer's time-based flush
+                    commit(self.writer.flush_if_due())
+                    continue
+                if item is _DONE:
+                    break
+
+                seq, records = item
+                pending[seq] = records
+                while next_seq in pending:
+                    writing = pending.pop(next_seq)
+                    while writing:
+                        commit(self.writer.add(writing[0]))
+                        writing.pop(0)
+                    next_seq += 1
+
+            # Chunks lost to a failing stage leave gaps; write what remains in order
+            for seq in sorted(pending):
+                writing = pending.pop(seq)
+                while writing:
+                    commit(self.writer.add(writing[0]))
+                    writing.pop(0)
+
+            # Write whatever is still buffered
+            commit(self.writer.flush())
+        except Exception as e:
+            print(f"✗ Error in write stage: {e}", file=sys.stderr)
+            # Count what can no longer be written: the chunk being written,
+            # chunks waiting for their turn, rows the writer still buffers
+            # (dropped, so closing the writer cannot commit them unrecorded)
+            # and everything still queued, which is drained so the parse
+            # workers never block on a full queue
+            lost = {record['message_id'] for record in writing}
+            lost.update(record['message_id'] for records in pending.values()
+                        for record in records)
+            lost.update(row['message_id'] for row in self.writer.discard())
+            while item is not _DONE:
+                item = write_q.get()
+                if item is not _DONE:
+                    lost.update(record['message_id'] for record in item[1])
+            result.add('stage_failed', len(lost))
+            self._record_failed(lost)
+        finally:
+            result.write_failed = len(self.writer.failed) - failed_before
+            self._record_failed([row['message_id'] for row in self.writer.failed[failed_before:]])
+            label_q.put(_DONE)
+
+    def _label(self, msg_ids, result):
+        # Mark the whole committed batch as read in as few calls as possible
+        with metrics.stage('mark_read'):
+            marked = self.gmail.mark_as_read_batch(msg_ids)
+        if self.journal is not None and marked:
+            self.journal.record_labelled(marked)
+        result.add('marked', len(marked))
+        if len(marked) < len(msg_ids):
+            marked = set(marked)
+            result.add_unmarked(msg_id for msg_id in msg_ids if msg_id not in marked)
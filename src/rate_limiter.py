@@ -0,0 +1,160 @@
+# rate_limiter.py
+import random
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+from src.metrics import metrics
+
+# Status codes worth retrying: rate limits and transient server errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Gmail charges different quota units per method; Sheets counts requests
+QUOTA_UNITS = {
+    'gmail': {
+        'messages.list': 5,
+        'messages.get': 5,
+        'messages.modify': 5,
+        'messages.batchModify': 50,
+        'history.list': 2,
+        'getProfile': 1,
+    },
+    'sheets': {},
+}
+
+# Starting and maximum rates in quota units per second for each API
+DEFAULT_LIMITS = {
+    'gmail': (150.0, 250.0),  # Gmail allows 250 units/sec per user
+    'sheets': (1.0, 1.0),  # Sheets allows ~60 requests/min per user
+}
+
+
+def is_retryable(error):
+    """True for HTTP errors caused by throttling or transient server trouble"""
+    return isinstance(error, HttpError) and error.resp.status in RETRYABLE_STATUSES
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens per second"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available, then take them"""
+        while True:
+            with self._lock:
+                self._refill()
+                # Requests bigger than the bucket go through once it is full
+                needed = min(tokens, self.capacity)
+                if self.tokens >= needed:
+                    self.tokens -= tokens
+                    return
+                wait = (needed - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill()
+            self.rate = rate
+            self.capacity = rate
+
+
+class AdaptiveRateLimiter:
+    """Shared rate limiting for the Gmail and Sheets clients.
+
+    Each API has a token bucket sized in quota units. Calls wait for their
+    units before going out. A 429/5xx response halves that API's rate and is
+    retried with exponential backoff and full jitter; every `increase_after`
+    clean calls the rate grows again by `increase_step` of its maximum
+    (AIMD), so throughput settles just under what Google will sustain.
+    """
+
+    def __init__(self, limits=None, max_retries=5, base_delay=1.0, max_delay=64.0,
+                 increase_after=20, increase_step=0.05, min_rate_ratio=0.05,
+                 shared_buckets=None, name='default'):
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        # Label for per-limiter quota accounting (e.g. the tenant name)
+        self.name = name
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.increase_after = increase_after
+        self.increase_step = increase_step
+        self.min_rate_ratio = min_rate_ratio
+        self.buckets = {api: TokenBucket(start) for api, (start, _) in self.limits.items()}
+        # Buckets passed in are shared with other limiters (e.g. one per spreadsheet)
+        self.buckets.update(shared_buckets or {})
+        self._clean_calls = {api: 0 for api in self.limits}
+        self._lock = threading.Lock()
+
+    def units(self, api, method):
+        return QUOTA_UNITS.get(api, {}).get(method, 1)
+
+    def acquire(self, api, method, count=1):
+        """Wait until `count` calls of `method` fit in the API's budget"""
+        units = self.units(api, method) * count
+        self.buckets[api].acquire(units)
+        metrics.inc('quota_units_total', units, api=api, limiter=self.name)
+
+    def on_success(self, api):
+        """Additive increase after a run of calls without throttling"""
+        with self._lock:
+            self._clean_calls[api] += 1
+            if self._clean_calls[api] < self.increase_after:
+                return
+            self._clean_calls[api] = 0
+            bucket = self.buckets[api]
+            max_rate = self.limits[api][1]
+            if bucket.rate < max_rate:
+                bucket.set_rate(min(max_rate, bucket.rate + max_rate * self.increase_step))
+
+    def on_throttle(self, api):
+        """Multiplicative decrease when Google pushes back"""
+        with self._lock:
+            self._clean_calls[api] = 0
+            bucket = self.buckets[api]
+            max_rate = self.limits[api][1]
+            bucket.set_rate(max(max_rate * self.min_rate_ratio, bucket.rate / 2))
+        metrics.inc('throttle_events_total', api=api)
+        metrics.gauge('rate_limit_units_per_sec', bucket.rate, api=api)
+
+    def backoff_delay(self, attempt):
+        """Exponential backoff with full jitter for the given retry attempt"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def execute(self, request, api, method, count=1):
+        """Execute a googleapiclient request under the limiter, retrying 429/5xx"""
+        attempt = 0
+        while True:
+            self.acquire(api, method, count)
+            started = time.perf_counter()
+            try:
+                response = request.execute()
+            except Exception as e:
+                status = e.resp.status if isinstance(e, HttpError) else type(e).__name__
+                metrics.api_call(api, method, time.perf_counter() - started, status)
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                self.on_throttle(api)
+                metrics.inc('retries_total', api=api, method=method)
+                time.sleep(self.backoff_delay(attempt))
+                attempt += 1
+                continue
+            metrics.api_call(api, method, time.perf_counter() - started, 200)
+            self.on_success(api)
+            return response
+
+
+# Limiter shared by every service in the process unless one is passed in
+default_limiter = AdaptiveRateLimiter()
@@ -1,51 +1,155 @@
 # sheets_service.py
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+import hashlib
+import json
 import os
+import re
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from src.body_store import BodyStore
+from src.google_client import SharedTransport, build_service
+from src.metrics import metrics
+from src.rate_limiter import default_limiter
+from src.sinks import BufferedSink
+
+# Sheets cell limit
+CELL_CHAR_LIMIT = 50000
+
+# Row numbers of an A1 range such as "'Email Log'!A5:F7"
+A1_ROWS = re.compile(r'^[A-Z]*(\d+)(?::[A-Z]*(\d+))?$')
+
+# Sheet columns in order: (row key, header, pixel width, hidden)
+COLUMN_SPECS = [
+    ('from', 'From', 200, False),
+    ('subject', 'Subject', 300, False),
+    ('date', 'Date', 150, False),
+    ('content', 'Content', 400, False),
+    ('content_hash', 'Content_Hash', 120, False),  # Body store key (BODY_STORE mode)
+    ('message_id', 'Message_ID', None, True),  # Used for duplicate tracking
+]
+# Columns used when none are configured (content_hash is opt-in)
+DEFAULT_COLUMNS = ['from', 'subject', 'date', 'content', 'message_id']
+
+
+def column_letter(index):
+    """1-based column index to A1 column letters (1 -> A, 27 -> AA)"""
+    letters = ''
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
 
 class SheetsService:
-    def __init__(self, credentials):
+    def __init__(self, credentials, limiter=None, cache_path=None, columns=None,
+                 http_factory=None):
         self.creds = credentials
-        self.service = build('sheets', 'v4', credentials=self.creds)
+        # Callable returning an httplib2-compatible transport per thread; pass
+        # the Gmail client's to share one authorized session
+        self.http_factory = http_factory or SharedTransport(credentials).http
+        self.column_specs = self._select_columns(columns)
+        self.column_keys = [key for key, _, _, _ in self.column_specs]
+        # Last column, and the column holding Message_ID (used for dedup)
+        self.last_column = column_letter(len(self.column_specs))
+        self.id_column = column_letter(self.column_keys.index('message_id') + 1)
+        self.limiter = limiter or default_limiter
+        BASE_DIR = Path(__file__).parent.parent
+        self.cache_path = Path(cache_path) if cache_path else BASE_DIR / "data" / "sheet_cache.json"
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+        self.service = self._build_service()
+    
+    @property
+    def service(self):
+        """Sheets API client for the calling thread (httplib2 is not thread-safe)"""
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = self._build_service()
+            self._local.service = service
+        return service
+    
+    @service.setter
+    def service(self, service):
+        self._local.service = service
+    
+    def _build_service(self):
+        return build_service('sheets', 'v4', http=self.http_factory())
+    
+    @staticmethod
+    def _select_columns(columns):
+        """Column specs for the configured column keys (DEFAULT_COLUMNS by default)"""
+        if columns is None:
+            columns = DEFAULT_COLUMNS
+        
+        specs = {spec[0]: spec for spec in COLUMN_SPECS}
+        unknown = [key for key in columns if key not in specs]
+        if unknown:
+            raise ValueError(f"Unknown sheet columns: {', '.join(unknown)}")
+        if 'message_id' not in columns:
+            raise ValueError("Sheet columns must include 'message_id' (used for duplicate tracking)")
+        return [specs[key] for key in columns]
+    
+    def _execute(self, method, request):
+        """Execute a Sheets request under the shared rate limiter"""
+        return self.limiter.execute(request, 'sheets', method)
+    
+    def _row_values(self, row_data):
+        """Build a sheet row in correct column order"""
+        values = []
+        for key in self.column_keys:
+            value = row_data.get(key, '')
+            if isinstance(value, str):
+                value = value[:CELL_CHAR_LIMIT]  # Sheets cell limit
+            values.append(value)
+        return values
     
     def append_row(self, spreadsheet_id, sheet_name, row_data):
         """Append a row to Google Sheet"""
+        return self.append_rows(spreadsheet_id, sheet_name, [row_data])
+    
+    def append_rows(self, spreadsheet_id, sheet_name, rows):
+        """Append many rows to Google Sheet with a single values().append call
+        
+        Returns (first_row, last_row) of the appended rows when the response
+        names them (True otherwise), or False on failure.
+        """
+        if not rows:
+            return True
+        
         try:
-            # Prepare the row in correct column order
-            values = [[
-                row_data['from'],
-                row_data['subject'],
-                row_data['date'],
-                row_data['content'][:50000],  # Sheets cell limit
-                row_data.get('message_id', '')  # Store message_id in column E
-            ]]
-            
             body = {
-                'values': values
+                'values': [self._row_values(row_data) for row_data in rows]
             }
             
-            result = self.service.spreadsheets().values().append(
+            result = self._execute('values.append', self.service.spreadsheets().values().append(
                 spreadsheetId=spreadsheet_id,
-                range=f"{sheet_name}!A:E",  # Changed to A:E to include column E
+                range=f"{sheet_name}!A:{self.last_column}",
                 valueInputOption="USER_ENTERED",
                 body=body,
                 insertDataOption="INSERT_ROWS"
-            ).execute()
+            ))
             
-            print(f"✓ Appended row. Updated cells: {result.get('updates', {}).get('updatedCells')}")
+            updates = result.get('updates', {})
+            print(f"✓ Appended {updates.get('updatedRows', len(rows))} rows. "
+                  f"Updated cells: {updates.get('updatedCells')}")
+            match = A1_ROWS.match(updates.get('updatedRange', '').rpartition('!')[2])
+            if match:
+                first_row = int(match.group(1))
+                return first_row, int(match.group(2) or first_row)
             return True
             
         except Exception as e:
-            print(f"✗ Error appending to sheet: {e}")
+            print(f"✗ Error appending to sheet: {e}", file=sys.stderr)
             return False
     
     def get_existing_message_ids(self, spreadsheet_id, sheet_name):
         """Get all already processed message IDs from sheet"""
         try:
-            result = self.service.spreadsheets().values().get(
+            result = self._execute('values.get', self.service.spreadsheets().values().get(
                 spreadsheetId=spreadsheet_id,
-                range=f"{sheet_name}!E:E"
-            ).execute()
+                range=f"{sheet_name}!{self.id_column}:{self.id_column}"
+            ))
             
             values = result.get('values', [])
             # Flatten list and skip header
@@ -57,151 +161,166 @@ class SheetsService:
                     existing_ids.append(row[0])
             return existing_ids
         except Exception as e:
-            print(f"Note: Could not retrieve existing message IDs: {e}")
+            print(f"Note: Could not retrieve existing message IDs: {e}", file=sys.stderr)
             return []
     
+    def get_message_ids_since(self, spreadsheet_id, sheet_name, start_row):
+        """Read message IDs from the Message_ID column starting at start_row (1-based)
+        
+        Returns (message_ids, last_row) where last_row is the last sheet row
+        that was read, or None if the sheet could not be read.
+        """
+        try:
+            result = self._execute('values.get', self.service.spreadsheets().values().get(
+                spreadsheetId=spreadsheet_id,
+                range=f"{sheet_name}!{self.id_column}{start_row}:{self.id_column}"
+            ))
+            
+            values = result.get('values', [])
+            message_ids = [row[0] for row in values if row and row[0]]
+            return message_ids, start_row + len(values) - 1
+        except Exception as e:
+            print(f"Note: Could not retrieve message IDs from row {start_row}: {e}",
+                  file=sys.stderr)
+            return None
+    
+    def _header_row(self):
+        return [header for _, header, _, _ in self.column_specs]
+    
+    def _format_requests(self, sheet_id):
+        """batchUpdate requests that style the header row and columns"""
+        requests = [
+            # Format header row
+            {
+                "repeatCell": {
+                    "range": {
+                        "sheetId": sheet_id,
+                        "startRowIndex": 0,
+                        "endRowIndex": 1,
+                        "startColumnIndex": 0,
+                        "endColumnIndex": len(self.column_specs)
+                    },
+                    "cell": {
+                        "userEnteredFormat": {
+                            "backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.9},
+                            "textFormat": {"bold": True},
+                            "horizontalAlignment": "CENTER"
+                        }
+                    },
+                    "fields": "userEnteredFormat(backgroundColor,textFormat,horizontalAlignment)"
+                }
+            }
+        ]
+        
+        # Set column widths and hide bookkeeping columns (Message_ID)
+        for index, (_, _, width, hidden) in enumerate(self.column_specs):
+            if hidden:
+                properties, fields = {"hiddenByUser": True}, "hiddenByUser"
+            else:
+                properties, fields = {"pixelSize": width}, "pixelSize"
+            requests.append({
+                "updateDimensionProperties": {
+                    "range": {
+                        "sheetId": sheet_id,
+                        "dimension": "COLUMNS",
+                        "startIndex": index,
+                        "endIndex": index + 1
+                    },
+                    "properties": properties,
+                    "fields": fields
+                }
+            })
+        
+        # Freeze header row
+        requests.append({
+            "updateSheetProperties": {
+                "properties": {
+                    "sheetId": sheet_id,
+                    "gridProperties": {
+                        "frozenRowCount": 1
+                    }
+                },
+                "fields": "gridProperties.frozenRowCount"
+            }
+        })
+        return requests
+    
+    def schema_fingerprint(self):
+        """Hash of the header row and formatting, to detect schema changes"""
+        schema = {
+            'headers': self._header_row(),
+            'requests': self._format_requests(0)
+        }
+        return hashlib.sha256(json.dumps(schema, sort_keys=True).encode()).hexdigest()
+    
+    def get_sheet_ids(self, spreadsheet_id):
+        """Map tab titles to sheetIds, fetching only sheet properties"""
+        spreadsheet = self._execute('get', self.service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields='sheets.properties(sheetId,title)'
+        ))
+        return {
+            sheet['properties']['title']: sheet['properties']['sheetId']
+            for sheet in spreadsheet.get('sheets', [])
+        }
+    
+    def _apply_format(self, spreadsheet_id, sheet_name, sheet_id):
+        # 1. Set headers
+        headers = [self._header_row()]
+        self._execute('values.update', self.service.spreadsheets().values().update(
+            spreadsheetId=spreadsheet_id,
+            range=f"{sheet_name}!A1:{self.last_column}1",
+            valueInputOption="USER_ENTERED",
+            body={'values': headers}
+        ))
+        
+        # 2. Apply all formatting requests
+        self._execute('batchUpdate', self.service.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={"requests": self._format_requests(sheet_id)}
+        ))
+        
+        print(f"✅ Sheet '{sheet_name}' formatted successfully!")
+        print(f"   - Headers: {' | '.join(self._header_row())}")
+        for index, (_, header, _, hidden) in enumerate(self.column_specs):
+            if hidden:
+                print(f"   - Column {column_letter(index + 1)} ({header}) is hidden")
+        print("   - Header row is frozen")
+    
     def format_sheet(self, spreadsheet_id, sheet_name):
         """Format the Google Sheet with proper headers and styling"""
         try:
             # First, get sheet ID by name
-            spreadsheet = self.service.spreadsheets().get(
-                spreadsheetId=spreadsheet_id
-            ).execute()
-            
-            sheet_id = None
-            for sheet in spreadsheet['sheets']:
-                if sheet['properties']['title'] == sheet_name:
-                    sheet_id = sheet['properties']['sheetId']
-                    break
+            sheet_id = self.get_sheet_ids(spreadsheet_id).get(sheet_name)
             
             if sheet_id is None:
                 print(f"Sheet '{sheet_name}' not found")
                 return False
             
-            # 1. Set headers
-            headers = [['From', 'Subject', 'Date', 'Content', 'Message_ID']]
-            self.service.spreadsheets().values().update(
-                spreadsheetId=spreadsheet_id,
-                range=f"{sheet_name}!A1:E1",
-                valueInputOption="USER_ENTERED",
-                body={'values': headers}
-            ).execute()
-            
-            # 2. Apply formatting
-            requests = [
-                # Format header row
-                {
-                    "repeatCell": {
-                        "range": {
-                            "sheetId": sheet_id,
-                            "startRowIndex": 0,
-                            "endRowIndex": 1,
-                            "startColumnIndex": 0,
-                            "endColumnIndex": 5
-                        },
-                        "cell": {
-                            "userEnteredFormat": {
-                                "backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.9},
-                                "textFormat": {"bold": True},
-                                "horizontalAlignment": "CENTER"
-                            }
-                        },
-                        "fields": "userEnteredFormat(backgroundColor,textFormat,horizontalAlignment)"
-                    }
-                },
-                # Set column widths
-                {
-                    "updateDimensionProperties": {
-                        "range": {
-                            "sheetId": sheet_id,
-                            "dimension": "COLUMNS",
-                            "startIndex": 0,
-                            "endIndex": 1
-                        },
-                        "properties": {"pixelSize": 200},
-                        "fields": "pixelSize"
-                    }
-                },
-                {
-                    "updateDimensionProperties": {
-                        "range": {
-                            "sheetId": sheet_id,
-                            "dimension": "COLUMNS",
-                            "startIndex": 1,
-                            "endIndex": 2
-                        },
-                        "properties": {"pixelSize": 300},
-                        "fields": "pixelSize"
-                    }
-                },
-                {
-                    "updateDimensionProperties": {
-                        "range": {
-                            "sheetId": sheet_id,
-                            "dimension": "COLUMNS",
-                            "startIndex": 2,
-                            "endIndex": 3
-                        },
-                        "properties": {"pixelSize": 150},
-                        "fields": "pixelSize"
-                    }
-                },
-                {
-                    "updateDimensionProperties": {
-                        "range": {
-                            "sheetId": sheet_id,
-                            "dimension": "COLUMNS",
-                            "startIndex": 3,
-                            "endIndex": 4
-                        },
-                        "properties": {"pixelSize": 400},
-                        "fields": "pixelSize"
-                    }
-                },
-                # Hide Message_ID column (E)
-                {
-                    "updateDimensionProperties": {
-                        "range": {
-                            "sheetId": sheet_id,
-                            "dimension": "COLUMNS",
-                            "startIndex": 4,
-                            "endIndex": 5
-                        },
-                        "properties": {"hiddenByUser": True},
-                        "fields": "hiddenByUser"
-                    }
-                },
-                # Freeze header row
-                {
-                    "updateSheetProperties": {
-                        "properties": {
-                            "sheetId": sheet_id,
-                            "gridProperties": {
-                                "frozenRowCount": 1
-                            }
-                        },
-                        "fields": "gridProperties.frozenRowCount"
-                    }
-                }
-            ]
-            
-            # Apply all formatting requests
-            body = {"requests": requests}
-            self.service.spreadsheets().batchUpdate(
-                spreadsheetId=spreadsheet_id,
-                body=body
-            ).execute()
-            
-            print(f"✅ Sheet '{sheet_name}' formatted successfully!")
-            print("   - Headers: From | Subject | Date | Content | Message_ID")
-            print("   - Column E (Message_ID) is hidden")
-            print("   - Header row is frozen")
+            self._apply_format(spreadsheet_id, sheet_name, sheet_id)
+            self._remember_sheet(spreadsheet_id, sheet_name, sheet_id)
             return True
             
         except Exception as e:
-            print(f"✗ Error formatting sheet: {e}")
+            print(f"✗ Error formatting sheet: {e}", file=sys.stderr)
             return False
     
+    def _add_sheet(self, spreadsheet_id, sheet_name):
+        """Create a new tab; returns its sheetId"""
+        requests = [{
+            "addSheet": {
+                "properties": {
+                    "title": sheet_name
+                }
+            }
+        }]
+        
+        response = self._execute('batchUpdate', self.service.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={"requests": requests}
+        ))
+        return response['replies'][0]['addSheet']['properties']['sheetId']
+    
     def create_or_reset_sheet(self, spreadsheet_id, sheet_name):
         """Create or reset a sheet with proper formatting"""
         try:
@@ -211,24 +330,230 @@ class SheetsService:
             if not success:
                 print("Creating new sheet...")
                 # If sheet doesn't exist, create it
-                requests = [{
-                    "addSheet": {
-                        "properties": {
-                            "title": sheet_name
-                        }
-                    }
-                }]
-                
-                self.service.spreadsheets().batchUpdate(
-                    spreadsheetId=spreadsheet_id,
-                    body={"requests": requests}
-                ).execute()
+                sheet_id = self._add_sheet(spreadsheet_id, sheet_name)
                 
                 # Now format it
-                self.format_sheet(spreadsheet_id, sheet_name)
+                self._apply_format(spreadsheet_id, sheet_name, sheet_id)
+                self._remember_sheet(spreadsheet_id, sheet_name, sheet_id)
             
             return True
             
         except Exception as e:
-            print(f"Error creating/resetting sheet: {e}")
-            return False
\ No newline at end of file
+            print(f"Error creating/resetting sheet: {e}", file=sys.stderr)
+            return False
+    
+    def _load_sheet_cache(self):
+        if os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, 'r') as f:
+                    return json.load(f)
+            except:
+                pass
+        return {}
+    
+    def _remember_sheet(self, spreadsheet_id, sheet_name, sheet_id):
+        """Cache the sheetId and the schema fingerprint that was applied to it"""
+        with self._cache_lock:
+            cache = self._load_sheet_cache()
+            cache[f"{spreadsheet_id}/{sheet_name}"] = {
+                'sheet_id': sheet_id,
+                'fingerprint': self.schema_fingerprint()
+            }
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(self.cache_path, 'w') as f:
+                json.dump(cache, f, indent=2)
+    
+    def ensure_sheet(self, spreadsheet_id, sheet_name):
+        """Make sure the sheet exists and is formatted, skipping work when cached
+        
+        Only a fields-masked metadata read is made when the cached sheetId
+        is still present and the header/format schema is unchanged. The tab
+        is created when missing and formatting is re-applied when the schema
+        fingerprint changed. Returns the sheetId, or None on failure.
+        """
+        try:
+            cached = self._load_sheet_cache().get(f"{spreadsheet_id}/{sheet_name}")
+            sheet_id = self.get_sheet_ids(spreadsheet_id).get(sheet_name)
+            
+            if sheet_id is None:
+                print(f"Creating new sheet '{sheet_name}'...")
+                sheet_id = self._add_sheet(spreadsheet_id, sheet_name)
+            elif (cached and cached.get('sheet_id') == sheet_id and
+                    cached.get('fingerprint') == self.schema_fingerprint()):
+                print(f"✓ Sheet '{sheet_name}' already formatted")
+                return sheet_id
+            
+            self._apply_format(spreadsheet_id, sheet_name, sheet_id)
+            self._remember_sheet(spreadsheet_id, sheet_name, sheet_id)
+            return sheet_id
+            
+        except Exception as e:
+            print(f"✗ Error preparing sheet: {e}", file=sys.stderr)
+            return None
+
+
+class BufferedSheetWriter(BufferedSink):
+    """Buffer parsed rows and flush them to a sheet in large batches.
+    
+    A flush happens when the buffer reaches max_rows, when the buffered
+    content grows past max_chars (keeps the request payload reasonable), or
+    when the oldest buffered row is older than max_delay seconds.
+    add() and flush() return the rows that actually landed in the sheet, so
+    callers can limit follow-up work (mark as read) to committed messages.
+    When the sheet has a content_hash column, rows carrying a hash get only
+    the first preview_chars of their body; the full body is in the BodyStore.
+    With a DedupIndex, appended rows are recorded in it right away, so the
+    next reconcile does not read them back.
+    """
+    
+    name = 'sheets'
+    
+    def __init__(self, sheets, spreadsheet_id, sheet_name,
+                 max_rows=500, max_chars=2_000_000, max_delay=10.0, preview_chars=500,
+                 dedup=None):
+        super().__init__(max_rows=max_rows, max_chars=max_chars, max_delay=max_delay)
+        self.sheets = sheets
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_name = sheet_name
+        self.preview_chars = preview_chars
+        self.dedup = dedup
+    
+    def add(self, row_data):
+        if row_data.get('content_hash') and 'content_hash' in self.sheets.column_keys:
+            # A copy: other sinks fed the same row keep the full body
+            row_data = dict(row_data, content=BodyStore.preview(
+                row_data.get('content') or '', self.preview_chars))
+        return super().add(row_data)
+    
+    def row_chars(self, row_data):
+        return len(row_data.get('content', '')[:CELL_CHAR_LIMIT])
+    
+    def write_rows(self, rows):
+        with metrics.stage('append'):
+            appended = self.sheets.append_rows(self.spreadsheet_id, self.sheet_name, rows)
+        if self.dedup is not None and isinstance(appended, tuple):
+            self.dedup.record_rows(self.spreadsheet_id, self.sheet_name,
+                                   [row['message_id'] for row in rows], *appended)
+        return bool(appended)
+
+
+class PartitionedSheetWriter:
+    """Spread rows over per-month or size-capped tabs of one spreadsheet.
+    
+    In "month" mode each row goes to the tab of its email's month
+    ('Email Log 2024-05'); in "size" mode one tab is filled at a time. In
+    both modes a partition holding max_rows data rows rolls over to the next
+    one ('Email Log 2024-05 (2)'). Tabs are created and formatted on demand
+    and recorded in a PartitionCatalog, which closes with the writer. Every
+    partition has its own BufferedSheetWriter; add()/flush() behave like
+    BufferedSheetWriter's.
+    """
+    
+    MONTH = re.compile(r'^\d{4}-\d{2}')
+    
+    def __init__(self, sheets, catalog, spreadsheet_id, base_name, mode='month',
+                 max_rows=100_000, **writer_options):
+        if mode not in ('month', 'size'):
+            raise ValueError(f"Unknown partition mode: {mode}")
+        self.sheets = sheets
+        self.catalog = catalog
+        self.spreadsheet_id = spreadsheet_id
+        self.base_name = base_name
+        self.mode = mode
+        self.max_rows = max_rows
+        self.writer_options = writer_options
+        self.writers = {}
+        # period -> [tab_name, seq, rows written or buffered]
+        self._active = {}
+    
+    @property
+    def failed(self):
+        return [row for writer in self.writers.values() for row in writer.failed]
+    
+    @property
+    def committed_count(self):
+        return sum(writer.committed_count for writer in self.writers.values())
+    
+    def period_for(self, row_data):
+        """Partition period of a row: its 'YYYY-MM' in month mode, else None"""
+        if self.mode != 'month':
+            return None
+        date = row_data.get('date') or ''
+        if self.MONTH.match(date):
+            return date[:7]
+        return datetime.now().strftime('%Y-%m')
+    
+    def _open_partition(self, period, seq):
+        tab_name = self.catalog.add_partition(self.spreadsheet_id, self.base_name, period, seq)
+        self.sheets.ensure_sheet(self.spreadsheet_id, tab_name)
+        return tab_name
+    
+    def _partition(self, period):
+        """Active partition for a period, rolled over first if it is full"""
+        active = self._active.get(period)
+        if active is None:
+            found = self.catalog.active(self.spreadsheet_id, self.base_name, period)
+            if found is None:
+                found = (self._open_partition(period, 1), 1, 0)
+            active = self._active[period] = list(found)
+        if active[2] >= self.max_rows:
+            seq = active[1] + 1
+            active[:] = [self._open_partition(period, seq), seq, 0]
+            print(f"   Sheet partition full, rolled over to '{active[0]}'")
+        return active
+    
+    def active_tabs(self):
+        """Existing tabs that new rows go to now: the current period's active
+        partition, else the newest one. Creates none; a tab is created when
+        the first row is routed to it.
+        """
+        period = datetime.now().strftime('%Y-%m') if self.mode == 'month' else None
+        found = self.catalog.active(self.spreadsheet_id, self.base_name, period)
+        if found is not None:
+            return [found[0]]
+        known = self.catalog.partitions(self.spreadsheet_id, self.base_name)
+        return [known[-1][0]] if known else []
+    
+    def sync_row_count(self, tab_name, row_count):
+        """Raise a partition's row count to what the sheet actually holds"""
+        self.catalog.set_row_count(self.spreadsheet_id, tab_name, row_count)
+        # Reload active partitions from the catalog on next use
+        self._active.clear()
+    
+    def _record(self, tab_name, rows):
+        if rows:
+            self.catalog.record_rows(self.spreadsheet_id, tab_name, rows)
+        return rows
+    
+    def add(self, row_data):
+        """Buffer a row in its partition; returns committed rows if that flushed"""
+        active = self._partition(self.period_for(row_data))
+        active[2] += 1
+        tab_name = active[0]
+        writer = self.writers.get(tab_name)
+        if writer is None:
+            writer = self.writers[tab_name] = BufferedSheetWriter(
+                self.sheets, self.spreadsheet_id, tab_name, **self.writer_options)
+        return self._record(tab_name, writer.add(row_data))
+    
+    def flush_if_due(self):
+        committed = []
+        for tab_name, writer in self.writers.items():
+            committed.extend(self._record(tab_name, writer.flush_if_due()))
+        return committed
+    
+    def flush(self):
+        committed = []
+        for tab_name, writer in self.writers.items():
+            committed.extend(self._record(tab_name, writer.flush()))
+        return committed
+    
+    def discard(self):
+        """Drop the rows buffered in every partition; returns them"""
+        return [row for writer in self.writers.values() for row in writer.discard()]
+    
+    def close(self):
+        """Flush every partition, then close the catalog"""
+        committed = self.flush()
+        self.catalog.close()
+        return committed
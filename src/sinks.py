@@ -0,0 +1,311 @@
+# sinks.py
+import csv
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from src.metrics import metrics
+
+# Record fields kept by the local sinks, in column order
+SINK_COLUMNS = ['message_id', 'thread_id', 'date', 'from', 'subject', 'content', 'content_hash']
+
+SINK_TYPES = ('sheets', 'sqlite', 'csv', 'parquet')
+
+
+class BufferedSink:
+    """Base for record sinks: buffer rows and write them in batches.
+
+    A flush happens when the buffer reaches max_rows, when the buffered
+    content grows past max_chars (if set), or when the oldest buffered row
+    is older than max_delay seconds. Subclasses implement write_rows(rows),
+    returning True once the batch is durable. add() and flush() return the
+    rows that were committed, so callers can limit follow-up work (mark as
+    read) to committed messages; rows of a failed batch collect in failed.
+    """
+
+    name = 'sink'
+
+    def __init__(self, max_rows=500, max_chars=None, max_delay=10.0):
+        self.max_rows = max_rows
+        self.max_chars = max_chars
+        self.max_delay = max_delay
+        self.buffer = []
+        self.buffered_chars = 0
+        self.first_buffered_at = None
+        self.committed_count = 0
+        self.failed = []
+
+    def row_chars(self, row_data):
+        return len(row_data.get('content') or '')
+
+    def add(self, row_data):
+        """Buffer a row; returns committed rows if this triggered a flush"""
+        if not self.buffer:
+            self.first_buffered_at = time.monotonic()
+        self.buffer.append(row_data)
+        if self.max_chars:
+            self.buffered_chars += self.row_chars(row_data)
+
+        if self._should_flush():
+            return self.flush()
+        return []
+
+    def _should_flush(self):
+        if len(self.buffer) >= self.max_rows:
+            return True
+        if self.max_chars and self.buffered_chars >= self.max_chars:
+            return True
+        return (self.first_buffered_at is not None and
+                time.monotonic() - self.first_buffered_at >= self.max_delay)
+
+    def flush_if_due(self):
+        """Flush only if a size or age limit has been reached"""
+        if self.buffer and self._should_flush():
+            return self.flush()
+        return []
+
+    def flush(self):
+        """Write all buffered rows; returns the rows that were committed"""
+        if not self.buffer:
+            return []
+
+        rows = self.buffer
+        self.buffer = []
+        self.buffered_chars = 0
+        self.first_buffered_at = None
+
+        if self.write_rows(rows):
+            self.committed_count += len(rows)
+            metrics.inc('sink_rows_total', len(rows), sink=self.name)
+            return rows
+
+        self.failed.extend(rows)
+        return []
+
+    def write_rows(self, rows):
+        raise NotImplementedError
+
+    def discard(self):
+        """Drop the buffered rows without writing them; returns them"""
+        rows = self.buffer
+        self.buffer = []
+        self.buffered_chars = 0
+        self.first_buffered_at = None
+        return rows
+
+    def close(self):
+        """Flush what is left and release the sink's resources"""
+        return self.flush()
+
+
+class SQLiteSink(BufferedSink):
+    """Rows in a local SQLite table, one transaction per batch.
+
+    message_id is the primary key and rows are upserted, so re-importing a
+    message replaces its row instead of duplicating it. Columns added to
+    the configuration later are added to an existing table.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path, columns=None, table='emails', max_rows=5000, max_delay=10.0):
+        super().__init__(max_rows=max_rows, max_delay=max_delay)
+        self.path = Path(path)
+        self.columns = list(columns or SINK_COLUMNS)
+        if 'message_id' not in self.columns:
+            raise ValueError("Sink columns must include 'message_id'")
+        self.table = table
+        os.makedirs(self.path.parent, exist_ok=True)
+
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        # WAL lets readers (reports, notebooks) query while an import runs
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        columns_sql = ', '.join(
+            f'"{key}" TEXT PRIMARY KEY' if key == 'message_id' else f'"{key}" TEXT'
+            for key in self.columns
+        )
+        with self.conn:
+            self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({columns_sql})')
+            existing = {row[1] for row in self.conn.execute(f'PRAGMA table_info("{table}")')}
+            for key in self.columns:
+                if key not in existing:
+                    self.conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{key}" TEXT')
+
+        placeholders = ', '.join('?' for _ in self.columns)
+        names = ', '.join(f'"{key}"' for key in self.columns)
+        self._insert = f'INSERT OR REPLACE INTO "{table}" ({names}) VALUES ({placeholders})'
+
+    def write_rows(self, rows):
+        try:
+            with metrics.stage('sink_sqlite'), self.conn:
+                self.conn.executemany(
+                    self._insert,
+                    ([row.get(key) for key in self.columns] for row in rows)
+                )
+            return True
+        except sqlite3.Error as e:
+            print(f"✗ Error writing to {self.path}: {e}", file=sys.stderr)
+            return False
+
+    def close(self):
+        committed = super().close()
+        self.conn.close()
+        return committed
+
+
+class CSVSink(BufferedSink):
+    """Rows streamed to a CSV file, appended and flushed once per batch"""
+
+    name = 'csv'
+
+    def __init__(self, path, columns=None, max_rows=5000, max_delay=10.0):
+        super().__init__(max_rows=max_rows, max_delay=max_delay)
+        self.path = Path(path)
+        self.columns = list(columns or SINK_COLUMNS)
+        os.makedirs(self.path.parent, exist_ok=True)
+
+        is_new = not self.path.exists() or self.path.stat().st_size == 0
+        if not is_new:
+            with open(self.path, newline='', encoding='utf-8') as f:
+                header = next(csv.reader(f), [])
+            if header != self.columns:
+                raise ValueError(f"{self.path} has columns {header}, expected {self.columns}; "
+                                 f"move it aside to start a new file")
+        self.file = open(self.path, 'a', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=self.columns, extrasaction='ignore')
+        if is_new:
+            self.writer.writeheader()
+            self.file.flush()
+
+    def write_rows(self, rows):
+        try:
+            with metrics.stage('sink_csv'):
+                self.writer.writerows(rows)
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            return True
+        except OSError as e:
+            print(f"✗ Error writing to {self.path}: {e}", file=sys.stderr)
+            return False
+
+    def close(self):
+        committed = super().close()
+        self.file.close()
+        return committed
+
+
+class ParquetSink(BufferedSink):
+    """Rows written as Parquet files under a dataset directory.
+
+    Every batch becomes one complete file with a single row group, written
+    to a temp name and renamed, so a committed batch is always readable and
+    an interrupted run never leaves a file without its footer. Readers
+    treat the directory as one dataset (pyarrow.dataset, pandas, DuckDB).
+    Needs pyarrow (pip install pyarrow).
+    """
+
+    name = 'parquet'
+
+    def __init__(self, directory, columns=None, max_rows=50_000, max_delay=30.0,
+                 compression='zstd'):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("The parquet sink needs pyarrow: pip install pyarrow") from None
+        super().__init__(max_rows=max_rows, max_delay=max_delay)
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.directory = Path(directory)
+        self.columns = list(columns or SINK_COLUMNS)
+        self.compression = compression
+        self.schema = pyarrow.schema([(key, pyarrow.string()) for key in self.columns])
+        self.prefix = f"part-{datetime.now().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        self.files_written = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def write_rows(self, rows):
+        self.files_written += 1
+        path = self.directory / f"{self.prefix}-{self.files_written:05d}.parquet"
+        tmp_path = path.with_name(path.name + '.tmp')
+        try:
+            with metrics.stage('sink_parquet'):
+                table = self.pa.Table.from_pydict(
+                    {key: [row.get(key) for row in rows] for key in self.columns},
+                    schema=self.schema
+                )
+                self.pq.write_table(table, tmp_path, row_group_size=len(rows),
+                                    compression=self.compression)
+                os.replace(tmp_path, path)
+            return True
+        except (OSError, self.pa.ArrowException) as e:
+            print(f"✗ Error writing {path}: {e}", file=sys.stderr)
+            return False
+
+
+class FanOutSink:
+    """Write every row to several sinks (e.g. Sheets and SQLite).
+
+    Sinks flush on their own schedules; a row counts as committed once all
+    of them have committed it, so a message is only marked as read when
+    every destination has it. A row that failed in any sink is reported in
+    failed and retried on a later run (sinks that already hold it see it
+    again: SQLite upserts it, CSV appends it a second time).
+    """
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+        # message_id -> number of sinks that have not committed the row yet
+        self._pending = {}
+        self.committed_count = 0
+
+    @property
+    def failed(self):
+        failed = {}
+        for sink in self.sinks:
+            for row in sink.failed:
+                failed.setdefault(row['message_id'], row)
+        return list(failed.values())
+
+    def _collect(self, committed_lists):
+        committed = []
+        for rows in committed_lists:
+            for row in rows:
+                remaining = self._pending.get(row['message_id'])
+                if remaining is None:
+                    continue
+                if remaining > 1:
+                    self._pending[row['message_id']] = remaining - 1
+                else:
+                    del self._pending[row['message_id']]
+                    committed.append(row)
+        self.committed_count += len(committed)
+        return committed
+
+    def add(self, row_data):
+        self._pending[row_data['message_id']] = len(self.sinks)
+        return self._collect([sink.add(row_data) for sink in self.sinks])
+
+    def flush_if_due(self):
+        return self._collect([sink.flush_if_due() for sink in self.sinks])
+
+    def flush(self):
+        return self._collect([sink.flush() for sink in self.sinks])
+
+    def discard(self):
+        """Drop rows not yet committed by every sink; returns them"""
+        discarded = {}
+        for sink in self.sinks:
+            for row in sink.discard():
+                discarded.setdefault(row['message_id'], row)
+        for msg_id in discarded:
+            self._pending.pop(msg_id, None)
+        return list(discarded.values())
+
+    def close(self):
+        return self._collect([sink.close() if hasattr(sink, 'close') else sink.flush()
+                              for sink in self.sinks])
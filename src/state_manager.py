@@ -3,25 +3,56 @@ import os
 from datetime import datetime
 from pathlib import Path
 
+from src.metrics import metrics
+
+def write_json_atomic(path, data):
+    """Write JSON to a temp file and rename it over path
+    
+    A crash mid-write leaves the previous file intact instead of a
+    truncated one; os.replace is atomic on POSIX and Windows.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
 class StateManager:
-    def __init__(self):
+    def __init__(self, state_file=None):
         BASE_DIR = Path(__file__).parent.parent
-        self.state_file = BASE_DIR / "data" / "last_processed.json"
+        self.state_file = Path(state_file) if state_file else BASE_DIR / "data" / "last_processed.json"
         
         # Create directory if it doesn't exist
         os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
         
-    def load_state(self):
-        """Load last processed timestamp"""
+    def _read_state(self):
+        """Read the raw state dict, empty if missing or unreadable"""
         if os.path.exists(self.state_file):
             try:
                 with open(self.state_file, 'r') as f:
-                    state = json.load(f)
-                    last_processed_str = state.get('last_processed')
-                    if last_processed_str:
-                        return datetime.fromisoformat(last_processed_str)
+                    return json.load(f)
             except:
                 pass
+        return {}
+    
+    def _write_state(self, updates):
+        """Merge updates into the stored state, keeping unrelated keys"""
+        state = self._read_state()
+        state.update(updates)
+        state['updated_at'] = datetime.now().isoformat()
+        
+        with metrics.stage('state_save'):
+            write_json_atomic(self.state_file, state)
+    
+    def load_state(self):
+        """Load last processed timestamp"""
+        last_processed_str = self._read_state().get('last_processed')
+        if last_processed_str:
+            try:
+                return datetime.fromisoformat(last_processed_str)
+            except ValueError:
+                pass
         return None
     
     def save_state(self, timestamp=None):
@@ -29,16 +60,27 @@ class StateManager:
         if timestamp is None:
             timestamp = datetime.now()
         
-        state = {
-            'last_processed': timestamp.isoformat(),
-            'updated_at': datetime.now().isoformat()
-        }
-        
-        with open(self.state_file, 'w') as f:
-            json.dump(state, f, indent=2)
+        self._write_state({'last_processed': timestamp.isoformat()})
         
         print(f"State saved. Last processed: {timestamp}")
     
+    def load_history_id(self):
+        """Load the Gmail historyId checkpoint for incremental sync"""
+        return self._read_state().get('history_id')
+    
+    def save_history_id(self, history_id):
+        """Save the Gmail historyId that the next incremental sync starts from"""
+        self._write_state({'history_id': str(history_id)})
+        print(f"State saved. History checkpoint: {history_id}")
+    
+    def load_unlabelled(self):
+        """Ids written to the sheet by an earlier run but not yet marked as read"""
+        return list(self._read_state().get('unlabelled', []))
+    
+    def save_unlabelled(self, msg_ids):
+        """Remember ids to mark as read on the next run (dedup skips them on listing)"""
+        self._write_state({'unlabelled': list(msg_ids)})
+    
     def update_last_processed(self, email_date):
         """Update state with the latest email date"""
         try:
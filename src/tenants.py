@@ -0,0 +1,192 @@
+# tenants.py
+import json
+import re
+import sys
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from src.dedup_index import DedupIndex
+from src.gmail_service import GmailService
+from src.rate_limiter import DEFAULT_LIMITS, AdaptiveRateLimiter, TokenBucket
+from src.sheets_service import SheetsService
+from src.state_manager import StateManager
+
+BASE_DIR = Path(__file__).parent.parent
+
+_TENANT_NAME = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+
+class Tenant:
+    """One mailbox -> spreadsheet mapping.
+
+    Every tenant has its own OAuth token, Gmail quota bucket (Gmail quota is
+    per user), state file, dedup index and sheet format cache under
+    data/tenants/<name>/, so tenants never see each other's progress.
+    """
+
+    def __init__(self, name, spreadsheet_id, sheet_name="Sheet1", token_path=None,
+                 columns=None, weight=1, gmail_rate=None, data_dir=None):
+        if not _TENANT_NAME.match(name or ''):
+            raise ValueError(f"Invalid tenant name {name!r} (use letters, digits, '.', '_', '-')")
+        self.name = name
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_name = sheet_name
+        self.token_path = Path(token_path) if token_path else BASE_DIR / "credentials" / f"{name}_token.json"
+        self.columns = columns
+        self.weight = max(1, int(weight))
+        self.gmail_rate = gmail_rate
+        self.data_dir = Path(data_dir) if data_dir else BASE_DIR / "data" / "tenants" / name
+        self.gmail = None
+        self.sheets = None
+        self.state = None
+        self.dedup = None
+        self.committed = 0
+        self.slices = 0
+        self.errors = 0
+
+    def open(self, sheets_bucket, credentials=None, http_factory=None):
+        """Authenticate and build this tenant's services and local stores"""
+        limits = {}
+        if self.gmail_rate:
+            limits['gmail'] = (min(self.gmail_rate, DEFAULT_LIMITS['gmail'][0]), self.gmail_rate)
+        # Gmail bucket is the tenant's own; the Sheets bucket is shared per
+        # spreadsheet and its budget is also its ceiling, so additive
+        # increases cannot grow it past the spreadsheet's share of quota
+        limits['sheets'] = (sheets_bucket.rate, sheets_bucket.rate)
+        limiter = AdaptiveRateLimiter(limits, shared_buckets={'sheets': sheets_bucket},
+                                      name=self.name)
+        self.gmail = GmailService(limiter, credentials=credentials, http_factory=http_factory,
+                                  token_path=self.token_path)
+        self.sheets = SheetsService(self.gmail.creds, limiter,
+                                    cache_path=self.data_dir / "sheet_cache.json",
+                                    columns=self.columns,
+                                    http_factory=self.gmail.http_factory)
+        self.state = StateManager(self.data_dir / "last_processed.json")
+        self.dedup = DedupIndex(self.data_dir / "processed_ids.db")
+
+    def close(self):
+        if self.dedup is not None:
+            self.dedup.close()
+        if self.gmail is not None and self.gmail.message_cache is not None:
+            self.gmail.message_cache.close()
+
+
+def load_tenants(path):
+    """Read tenants and per-spreadsheet Sheets budgets from a JSON file:
+
+        {
+          "tenants": [
+            {"name": "alice", "spreadsheet_id": "1AbC...", "sheet_name": "Inbox",
+             "token_path": "credentials/alice_token.json", "weight": 2},
+            {"name": "bob", "spreadsheet_id": "1AbC...", "sheet_name": "Bob"}
+          ],
+          "spreadsheets": {"1AbC...": {"requests_per_sec": 1.0}}
+        }
+
+    Optional tenant keys: sheet_name, token_path, columns, weight (share of
+    scheduling slices) and gmail_rate (quota units/sec). Returns
+    (tenants, {spreadsheet_id: requests_per_sec}).
+    """
+    with open(path) as f:
+        data = json.load(f)
+
+    tenants = []
+    for entry in data.get('tenants', []):
+        if 'name' not in entry or 'spreadsheet_id' not in entry:
+            raise ValueError(f"Tenant entries need 'name' and 'spreadsheet_id': {entry}")
+        tenants.append(Tenant(**entry))
+    if not tenants:
+        raise ValueError(f"No tenants configured in {path}")
+    names = [tenant.name for tenant in tenants]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate tenant names: {', '.join(sorted(duplicates))}")
+
+    budgets = {
+        spreadsheet_id: float(settings.get('requests_per_sec', DEFAULT_LIMITS['sheets'][0]))
+        for spreadsheet_id, settings in data.get('spreadsheets', {}).items()
+    }
+    return tenants, budgets
+
+
+class MultiTenantRunner:
+    """Run sync passes for many tenants on one shared pool of worker slots.
+
+    Scheduling is round-robin in slices: a tenant runs until it has queued
+    slice_size * weight emails, then goes to the back of the queue if it
+    still has mail, so one large mailbox cannot hold a slot while others
+    wait. Quota is isolated the same way: each tenant throttles on its own
+    Gmail bucket, and tenants writing to the same spreadsheet share one
+    Sheets bucket, so a slow or throttled tenant only ever slows itself
+    (and its spreadsheet's neighbours).
+    """
+
+    def __init__(self, tenants, sync, workers=2, slice_size=500, sheets_budgets=None):
+        # sync(tenant, budget) runs one pass and returns its PipelineResult
+        self.tenants = tenants
+        self.sync = sync
+        self.workers = max(1, workers)
+        self.slice_size = max(1, slice_size)
+        self.sheets_budgets = sheets_budgets or {}
+        self.sheets_buckets = {}
+        self._lock = threading.Lock()
+
+    def sheets_bucket(self, spreadsheet_id):
+        """The Sheets token bucket shared by every tenant writing to spreadsheet_id"""
+        with self._lock:
+            bucket = self.sheets_buckets.get(spreadsheet_id)
+            if bucket is None:
+                rate = self.sheets_budgets.get(spreadsheet_id, DEFAULT_LIMITS['sheets'][0])
+                bucket = self.sheets_buckets[spreadsheet_id] = TokenBucket(rate)
+            return bucket
+
+    def open(self, credentials=None, http_factory=None):
+        """Open every tenant; ones that fail to authenticate are dropped"""
+        opened = []
+        for tenant in self.tenants:
+            try:
+                tenant.open(self.sheets_bucket(tenant.spreadsheet_id), credentials, http_factory)
+                opened.append(tenant)
+            except Exception as e:
+                print(f"✗ Tenant {tenant.name}: could not open services: {e}", file=sys.stderr)
+        self.tenants = opened
+        return opened
+
+    def _run_slice(self, tenant):
+        tenant.slices += 1
+        try:
+            result = self.sync(tenant, self.slice_size * tenant.weight)
+        except Exception as e:
+            tenant.errors += 1
+            print(f"✗ Tenant {tenant.name}: sync failed: {e}", file=sys.stderr)
+            return None
+        tenant.committed += result.committed
+        return result
+
+    def run(self):
+        """Run until every tenant is caught up; returns the tenants"""
+        waiting = deque(self.tenants)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while waiting or running:
+                while waiting and len(running) < self.workers:
+                    tenant = waiting.popleft()
+                    running[pool.submit(self._run_slice, tenant)] = tenant
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    tenant = running.pop(future)
+                    result = future.result()
+                    if result is not None and result.budget_exhausted:
+                        # More mail waiting: back of the line behind the others
+                        waiting.append(tenant)
+
+        for tenant in self.tenants:
+            print(f"   {tenant.name}: {tenant.committed} emails in {tenant.slices} slices"
+                  + (f", {tenant.errors} failed" if tenant.errors else ""))
+        return self.tenants
+
+    def close(self):
+        for tenant in self.tenants:
+            tenant.close()
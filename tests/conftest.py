@@ -0,0 +1,95 @@
+# tests/conftest.py
+"""Shared fixtures: real services wired to the offline Gmail/Sheets stand-in."""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from google.auth.credentials import AnonymousCredentials
+
+from benchmarks.fake_google import FakeGoogleBackend, SyntheticMailbox
+from src.dedup_index import DedupIndex
+from src.gmail_service import GmailService
+from src.rate_limiter import AdaptiveRateLimiter
+from src.sheets_service import SheetsService
+from src.sinks import BufferedSink
+from src.state_manager import StateManager
+
+SPREADSHEET_ID = 'test-spreadsheet'
+SHEET_NAME = 'Sheet1'
+# Unknown to the mailbox, so messages.get answers 404
+MISSING_ID = 'ffffffffffffffff'
+
+
+@pytest.fixture
+def backend():
+    return FakeGoogleBackend(SyntheticMailbox(30, seed=1))
+
+
+@pytest.fixture
+def limiter():
+    # No waiting and no backoff sleeps: the fake backend never throttles
+    return AdaptiveRateLimiter(limits={'gmail': (1e9, 1e9), 'sheets': (1e9, 1e9)},
+                               base_delay=0)
+
+
+@pytest.fixture
+def gmail(backend, limiter):
+    return GmailService(limiter, credentials=AnonymousCredentials(), http_factory=backend.http)
+
+
+@pytest.fixture
+def sheets(backend, limiter, tmp_path):
+    return SheetsService(AnonymousCredentials(), limiter, cache_path=tmp_path / "sheet_cache.json",
+                         http_factory=backend.http)
+
+
+@pytest.fixture
+def state(tmp_path):
+    return StateManager(tmp_path / "last_processed.json")
+
+
+@pytest.fixture
+def dedup(tmp_path):
+    index = DedupIndex(tmp_path / "processed_ids.db")
+    yield index
+    index.close()
+
+
+class ListSink(BufferedSink):
+    """Keeps committed rows in memory; a batch holding a poisoned id fails"""
+
+    name = 'list'
+
+    def __init__(self, poisoned=(), **options):
+        super().__init__(**options)
+        self.poisoned = set(poisoned)
+        self.rows = []
+
+    def write_rows(self, rows):
+        if any(row['message_id'] in self.poisoned for row in rows):
+            return False
+        self.rows.extend(rows)
+        return True
+
+
+def sheet_ids(backend, tab=SHEET_NAME):
+    """Message ids in a fake sheet tab, in row order"""
+    return backend.spreadsheets[SPREADSHEET_ID].tabs[tab]['ids']
+
+
+def reject_batch_modify(backend, status, times=None):
+    """Make messages.batchModify calls fail with status (the first `times` only)"""
+    route = backend._gmail
+    rejected = [0]
+
+    def gmail(method, path, query, data):
+        if path == 'messages/batchModify' and (times is None or rejected[0] < times):
+            rejected[0] += 1
+            backend._count('gmail.messages.batchModify')
+            return status, {'error': {'code': status, 'message': 'Rejected'}}
+        return route(method, path, query, data)
+
+    backend._gmail = gmail
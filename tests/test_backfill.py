@@ -0,0 +1,183 @@
+# tests/test_backfill.py
+import json
+
+from benchmarks.fake_google import SyntheticMailbox
+from src.backfill import BackfillJournal, run_backfill
+from src.email_parser import EmailParser
+from src.pipeline import EmailPipeline
+
+from conftest import SHEET_NAME, SPREADSHEET_ID, sheet_ids
+
+
+def write_journal(path, records, torn=''):
+    with open(path, 'w') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+        f.write(torn)
+
+
+def test_replay_stops_at_a_torn_line(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    write_journal(path, [
+        {'type': 'start', 'query': 'in:inbox'},
+        {'type': 'page', 'token': None, 'next': 'p2', 'ids': ['a', 'b', 'c']},
+        {'type': 'appended', 'ids': ['a']},
+    ], torn='{"type": "appended", "ids": ["b"')
+
+    journal = BackfillJournal(path)
+
+    assert journal.query == 'in:inbox'
+    assert journal.cursor == 'p2'
+    assert not journal.listing_complete
+    assert list(journal.pending) == ['b', 'c']
+    assert list(journal.unlabelled) == ['a']
+    assert journal.appended_count == 1
+
+
+def test_compacted_journal_replays_to_the_same_state(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = BackfillJournal(path)
+    journal.start('in:inbox')
+    journal.record_page(None, 'p2', ['a', 'b', 'c'])
+    journal.record_appended(['a', 'b'])
+    journal.record_labelled(['a'])
+    journal.compact()
+    journal.close()
+
+    replayed = BackfillJournal(path)
+
+    assert path.read_text().count('\n') == 1
+    assert replayed.cursor == 'p2'
+    assert list(replayed.pending) == ['c']
+    assert list(replayed.unlabelled) == ['b']
+    assert (replayed.appended_count, replayed.labelled_count) == (2, 1)
+
+
+def test_interrupted_backfill_resumes_without_duplicates(gmail, sheets, dedup, backend, tmp_path):
+    path = tmp_path / "journal.jsonl"
+    budget = [12]
+
+    def backfill(journal):
+        def make_pipeline(writer):
+            return EmailPipeline(gmail, writer, dedup, batch_size=5, budget=budget[0],
+                                 journal=journal)
+        return run_backfill(gmail, sheets, dedup, journal, SPREADSHEET_ID, SHEET_NAME,
+                            'in:inbox', make_pipeline, page_size=10)
+
+    journal = BackfillJournal(path)
+    result = backfill(journal)
+    journal.close()
+
+    assert result.budget_exhausted
+    assert not journal.done
+    assert journal.appended_count == 12
+    # The rest of the second page was listed and journalled, not appended
+    assert len(journal.pending) == 8
+
+    # Crash while writing the next record
+    with open(path, 'a') as f:
+        f.write('{"type": "appended", "ids": ["')
+    budget[0] = None
+    journal = BackfillJournal(path)
+    result = backfill(journal)
+    journal.close()
+
+    assert result.ok
+    assert journal.done
+    assert journal.appended_count == journal.labelled_count == 30
+    assert not journal.pending and not journal.unlabelled
+    assert len(sheet_ids(backend)) == len(set(sheet_ids(backend))) == 30
+    assert len(backend.mailbox.read) == 30
+    assert backfill(BackfillJournal(path)) is None
+
+
+def backfill(gmail, sheets, dedup, journal, parser=None):
+    def make_pipeline(writer):
+        return EmailPipeline(gmail, writer, dedup, parser=parser, batch_size=5,
+                             journal=journal)
+    return run_backfill(gmail, sheets, dedup, journal, SPREADSHEET_ID, SHEET_NAME,
+                        'in:inbox', make_pipeline, page_size=10)
+
+
+def test_message_deleted_after_listing_does_not_block_the_backfill(
+        gmail, sheets, dedup, backend, tmp_path):
+    deleted = SyntheticMailbox.message_id(7)
+    contains = backend.mailbox.contains
+    # Still listed, but messages.get answers 404
+    backend.mailbox.contains = lambda msg_id: msg_id != deleted and contains(msg_id)
+    path = tmp_path / "journal.jsonl"
+    journal = BackfillJournal(path)
+
+    result = backfill(gmail, sheets, dedup, journal)
+    journal.close()
+
+    assert result.gone == 1
+    assert journal.done
+    assert not journal.pending
+    assert (journal.appended_count, journal.skipped_count) == (29, 1)
+    assert deleted not in sheet_ids(backend)
+    assert BackfillJournal(path).skipped_count == 1
+
+
+class FailingParser(EmailParser):
+    """Parses every email except the ones in bad"""
+
+    def __init__(self, bad):
+        super().__init__()
+        self.bad = set(bad)
+
+    def parse_email(self, message):
+        if message['id'] in self.bad:
+            raise ValueError("unparseable")
+        return super().parse_email(message)
+
+
+def test_permanently_failing_email_is_given_up_after_max_attempts(
+        gmail, sheets, dedup, backend, tmp_path):
+    bad = SyntheticMailbox.message_id(3)
+    parser = FailingParser([bad])
+    path = tmp_path / "journal.jsonl"
+
+    journal = BackfillJournal(path, max_attempts=2)
+    result = backfill(gmail, sheets, dedup, journal, parser)
+    journal.close()
+
+    assert result.parse_failed == 1
+    assert not journal.done
+    assert list(journal.pending) == [bad]
+    assert journal.attempts == {bad: 1}
+
+    # The resume compacts the journal; attempts survive it
+    journal = BackfillJournal(path, max_attempts=2)
+    result = backfill(gmail, sheets, dedup, journal, parser)
+    journal.close()
+
+    assert result.queued == 1
+    assert journal.done
+    assert not journal.pending
+    assert list(journal.abandoned) == [bad]
+    assert journal.appended_count == 29
+
+    replayed = BackfillJournal(path, max_attempts=2)
+    assert replayed.done
+    assert list(replayed.abandoned) == [bad]
+    assert backfill(gmail, sheets, dedup, replayed, parser) is None
+
+
+def test_compaction_keeps_skipped_and_failed_ids(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = BackfillJournal(path, max_attempts=2)
+    journal.start('in:inbox')
+    journal.record_page(None, None, ['a', 'b', 'c', 'd'])
+    journal.record_skipped(['a'])
+    journal.record_failed(['b', 'c'])
+    journal.record_failed(['c'])
+    journal.compact()
+    journal.close()
+
+    replayed = BackfillJournal(path, max_attempts=2)
+
+    assert list(replayed.pending) == ['b', 'd']
+    assert replayed.attempts == {'b': 1}
+    assert list(replayed.abandoned) == ['c']
+    assert replayed.skipped_count == 1
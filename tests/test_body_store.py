@@ -0,0 +1,61 @@
+# tests/test_body_store.py
+import os
+import threading
+import zlib
+
+from src.body_store import BodyStore
+
+
+def disk_bytes(store):
+    return sum(stat.st_size for _, stat in store._iter_files())
+
+
+def test_bodies_round_trip_and_are_stored_once(tmp_path):
+    store = BodyStore(tmp_path / "bodies")
+
+    digest = store.put("Hello\nworld")
+
+    assert store.put("Hello\nworld") == digest == BodyStore.content_hash("Hello\nworld")
+    assert store.get(digest) == "Hello\nworld"
+    assert store.get(BodyStore.content_hash("unknown")) is None
+    assert store.total_bytes == disk_bytes(store)
+
+
+def test_concurrent_puts_of_one_body_count_it_once(tmp_path, monkeypatch):
+    store = BodyStore(tmp_path / "bodies")
+    store.total_bytes  # start tracking before the writers race
+    # Every writer has seen the body missing before any of them stores it
+    barrier = threading.Barrier(8)
+    compress = zlib.compress
+
+    def compress_together(data, level):
+        barrier.wait()
+        return compress(data, level)
+
+    monkeypatch.setattr(zlib, 'compress', compress_together)
+    threads = [threading.Thread(target=store.put, args=("newsletter " * 1000,))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(list(store._iter_files())) == 1
+    assert store.total_bytes == disk_bytes(store)
+
+
+def test_least_recently_used_bodies_are_evicted(tmp_path):
+    store = BodyStore(tmp_path / "bodies")
+    digests = [store.put(f"body {i} " + os.urandom(200).hex()) for i in range(3)]
+    # Oldest first; reading the first body makes it the most recent
+    for age, digest in zip((300, 200, 100), digests):
+        stamp = store._path(digest).stat().st_mtime - age
+        os.utime(store._path(digest), (stamp, stamp))
+    store.get(digests[0])
+
+    removed = store.evict(max_bytes=disk_bytes(store) - 1)
+
+    assert removed == 1
+    assert digests[1] not in store
+    assert digests[0] in store and digests[2] in store
+    assert store.total_bytes == disk_bytes(store)
@@ -0,0 +1,53 @@
+# tests/test_email_parser.py
+import base64
+
+import pytest
+from bs4 import BeautifulSoup
+
+from benchmarks.corpus import leaf, make_message
+from src.email_parser import BODY_CHAR_LIMIT, DECODE_CHUNK_SIZE, EmailParser
+
+# Decoded characters per base64 chunk, so markup can straddle chunk edges
+CHUNK_CHARS = DECODE_CHUNK_SIZE // 4 * 3
+
+
+def html_message(markup):
+    return {'payload': leaf('text/html', markup), 'snippet': ''}
+
+
+def soup_text(markup):
+    """The body text the BeautifulSoup-based parser produced"""
+    return BeautifulSoup(markup, 'html.parser').get_text()[:BODY_CHAR_LIMIT]
+
+
+def first_html(message):
+    for part in EmailParser._iter_parts(message['payload']):
+        if part['mimeType'] == 'text/html':
+            return base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
+
+
+@pytest.mark.parametrize('shape', ['html_only', 'newsletter', 'nested'])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_html_bodies_match_beautifulsoup(shape, seed):
+    message = make_message(seed, shape, seed)
+
+    assert EmailParser.get_body(message) == soup_text(first_html(message))
+
+
+@pytest.mark.parametrize('markup', [
+    '<p>Fish &amp; chips &lt;3 &eacute;t&eacute;</p><!-- hidden <b>x</b> -->'
+    '<SCRIPT>if (a < b) {}</SCRIPT>done',
+    '<style>p{}</style><div>a<br/>b</div>&nbsp;end',
+    # A tag, then an entity and a script block, cut by a chunk boundary
+    'x' * (CHUNK_CHARS - 3) + '<b>bold</b> &amp; more',
+    'y' * (CHUNK_CHARS - 2) + '&amp;<script>var x = "</p>";</script>tail',
+])
+def test_markup_edge_cases_match_beautifulsoup(markup):
+    assert EmailParser.get_body(html_message(markup)) == soup_text(markup)
+
+
+def test_plain_part_wins_over_html():
+    message = make_message(0, 'alternative')
+    plain = base64.urlsafe_b64decode(message['payload']['parts'][0]['body']['data']).decode()
+
+    assert EmailParser.get_body(message) == plain
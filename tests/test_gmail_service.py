@@ -0,0 +1,110 @@
+# tests/test_gmail_service.py
+from google.auth.credentials import AnonymousCredentials
+
+from benchmarks.corpus import leaf, multipart
+from benchmarks.fake_google import FakeGoogleBackend, SyntheticMailbox
+from src.email_parser import EmailParser
+from src.gmail_service import GmailService, is_projection_truncated
+
+from conftest import MISSING_ID, reject_batch_modify
+
+
+def test_permanent_fetch_failure_is_reported_not_retried(gmail, backend):
+    found = SyntheticMailbox.message_id(0)
+    failures = {}
+
+    details = gmail.get_email_details_batch([found, MISSING_ID], failures=failures)
+
+    assert list(details) == [found]
+    assert failures == {MISSING_ID: 404}
+    assert backend.calls['batch'] == 1
+
+
+def test_throttled_fetches_are_retried(limiter):
+    backend = FakeGoogleBackend(SyntheticMailbox(30, seed=1), error_rate=0.3, seed=3)
+    gmail = GmailService(limiter, credentials=AnonymousCredentials(), http_factory=backend.http)
+    msg_ids = [SyntheticMailbox.message_id(i) for i in range(30)]
+    failures = {}
+
+    details = gmail.get_email_details_batch(msg_ids, max_retries=10, failures=failures)
+
+    assert backend.throttled > 0
+    assert sorted(details) == msg_ids
+    assert failures == {}
+
+
+def test_batch_modify_fails_fast_on_non_400(gmail, backend):
+    reject_batch_modify(backend, 403)
+
+    marked = gmail.mark_as_read_batch([SyntheticMailbox.message_id(i) for i in range(8)])
+
+    assert marked == []
+    assert backend.calls['gmail.messages.batchModify'] == 1
+
+
+def test_batch_modify_bisects_on_400(gmail, backend):
+    reject_batch_modify(backend, 400)
+
+    marked = gmail.mark_as_read_batch([SyntheticMailbox.message_id(i) for i in range(4)])
+
+    assert marked == []
+    # 4 ids, then 2 + 2, then 1 + 1 + 1 + 1
+    assert backend.calls['gmail.messages.batchModify'] == 7
+
+
+def test_batch_modify_retries_transient_errors(gmail, backend):
+    reject_batch_modify(backend, 503, times=2)
+    msg_ids = [SyntheticMailbox.message_id(i) for i in range(8)]
+
+    marked = gmail.mark_as_read_batch(msg_ids)
+
+    assert marked == msg_ids
+    assert backend.mailbox.read == set(msg_ids)
+
+
+def nest_body_deeply(backend, msg_id, depth=8):
+    """Serve msg_id with its text part nested deeper than the text projection"""
+    get = backend.mailbox.get
+
+    def deep_get(requested):
+        message = get(requested)
+        if requested == msg_id:
+            part = leaf('text/plain', 'Deep body')
+            for _ in range(depth):
+                part = multipart('multipart/mixed', [part])
+            message['payload'] = dict(part, headers=message['payload']['headers'])
+        return message
+
+    backend.mailbox.get = deep_get
+
+
+def test_truncated_text_projection_is_refetched_in_full(gmail, backend):
+    msg_ids = [SyntheticMailbox.message_id(i) for i in range(3)]
+    nest_body_deeply(backend, msg_ids[1])
+
+    details = gmail.get_email_details_batch(msg_ids, profile='text')
+
+    assert not is_projection_truncated(details[msg_ids[1]])
+    assert EmailParser.get_body(details[msg_ids[1]]) == 'Deep body'
+    # One extra messages.get, for the nested email only
+    assert backend.calls['gmail.messages.get'] == 4
+
+
+def test_failed_refetch_keeps_the_projection_and_reports_once(gmail, backend, capsys):
+    msg_id = SyntheticMailbox.message_id(1)
+    nest_body_deeply(backend, msg_id)
+    route = backend._gmail
+
+    def gmail_route(method, path, query, data):
+        if path == f'messages/{msg_id}' and 'fields' not in query:
+            return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}}
+        return route(method, path, query, data)
+
+    backend._gmail = gmail_route
+    failures = {}
+
+    details = gmail.get_email_details_batch([msg_id], profile='text', failures=failures)
+
+    assert msg_id in details
+    assert failures == {}
+    assert capsys.readouterr().err.count(f"Error fetching email {msg_id}") == 1
@@ -0,0 +1,76 @@
+# tests/test_message_cache.py
+import pytest
+
+from benchmarks.fake_google import SyntheticMailbox
+from src.main import run_reparse, run_sync
+from src.message_cache import MessageCache
+
+from conftest import SHEET_NAME, SPREADSHEET_ID, sheet_ids
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = MessageCache(tmp_path / "message_cache.db")
+    yield cache
+    cache.close()
+
+
+def message(msg_id, size=200):
+    return {'id': msg_id, 'snippet': msg_id * size}
+
+
+def gmail_calls(backend):
+    return sum(count for name, count in backend.calls.items() if name.startswith('gmail.'))
+
+
+def test_cached_profile_serves_itself_and_cheaper_ones(cache):
+    cache.put_many({'a': message('a')}, profile='text')
+
+    assert cache.get('a', 'metadata') == message('a')
+    assert cache.get('a', 'text') == message('a')
+    assert cache.get('a', 'full') is None
+
+    # A cheaper response never replaces a more complete one
+    cache.put_many({'a': {'id': 'a'}}, profile='metadata')
+    assert cache.get('a', 'text') == message('a')
+
+
+def test_least_recently_used_messages_are_evicted(cache):
+    cache.put_many({msg_id: message(msg_id) for msg_id in 'abc'})
+    with cache.conn:
+        cache.conn.executemany("UPDATE messages SET accessed = ? WHERE message_id = ?",
+                               [(1, 'a'), (2, 'b'), (3, 'c')])
+    cache.get('a')
+    per_entry = cache.total_bytes / 3
+
+    removed = cache.evict(max_bytes=per_entry * 2.5)
+
+    assert removed == 1
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.total_bytes == pytest.approx(per_entry * 2, rel=0.1)
+
+
+def test_fetches_are_served_from_the_cache(gmail, backend, cache):
+    gmail.message_cache = cache
+    msg_ids = [SyntheticMailbox.message_id(i) for i in range(10)]
+
+    first = gmail.get_email_details_batch(msg_ids, profile='text')
+    second = gmail.get_email_details_batch(msg_ids, profile='text')
+
+    assert second == first
+    assert backend.calls['gmail.messages.get'] == 10
+    assert len(cache) == 10
+
+
+def test_reparse_rebuilds_rows_without_gmail_calls(gmail, sheets, state, dedup, backend, cache):
+    gmail.message_cache = cache
+    run_sync(gmail, sheets, state, dedup, SPREADSHEET_ID, SHEET_NAME, sinks=['sheets'])
+    calls = gmail_calls(backend)
+
+    result = run_reparse(sheets, dedup, cache, SPREADSHEET_ID, 'Reparsed', sinks=['sheets'])
+
+    assert result.ok
+    assert gmail_calls(backend) == calls
+    assert sorted(sheet_ids(backend, 'Reparsed')) == sorted(sheet_ids(backend))
+    assert len(sheet_ids(backend, 'Reparsed')) == 30
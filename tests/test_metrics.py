@@ -0,0 +1,40 @@
+# tests/test_metrics.py
+import pytest
+
+from src import metrics as run_metrics
+from src.metrics import metrics
+
+from conftest import MISSING_ID, ListSink
+from test_pipeline import FlakyParser, listing, run_pipeline
+
+
+@pytest.fixture
+def enabled_metrics():
+    metrics.enable()
+    yield metrics
+    metrics.disable()
+    metrics.reset()
+
+
+def test_summary_is_rendered_from_the_registry(gmail, enabled_metrics, capsys):
+    run_pipeline(gmail, ListSink(max_rows=5), listing(10) + [MISSING_ID])
+    capsys.readouterr()
+
+    run_metrics.print_summary()
+
+    out = capsys.readouterr().out
+    assert "📬 Emails: 11 listed, 11 queued, 1 gone, 10 committed, 10 marked" in out
+    assert "⏱  Stage timings:" in out
+
+
+def test_errors_go_to_stderr(gmail, capsys):
+    msg_ids = listing(10)
+
+    result = run_pipeline(gmail, ListSink(max_rows=5), msg_ids + [MISSING_ID],
+                          parser=FlakyParser([msg_ids[2]]))
+
+    captured = capsys.readouterr()
+    assert (result.gone, result.stage_failed) == (1, 5)
+    assert f"Error fetching email {MISSING_ID}" in captured.err
+    assert "✗ Error in parse stage" in captured.err
+    assert "Error" not in captured.out and "✗" not in captured.out
@@ -0,0 +1,96 @@
+# tests/test_partitions.py
+from pathlib import Path
+
+import pytest
+
+import config
+from src.main import run_sync
+from src.partition_catalog import PartitionCatalog
+from src.sheets_service import PartitionedSheetWriter
+
+from conftest import SPREADSHEET_ID, sheet_ids
+
+BASE_NAME = 'Log'
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = PartitionCatalog(tmp_path / "partitions.db")
+    yield catalog
+    catalog.close()
+
+
+def partitioned(sheets, catalog, **options):
+    return PartitionedSheetWriter(sheets, catalog, SPREADSHEET_ID, BASE_NAME, **options)
+
+
+def row(msg_id, date):
+    return {'message_id': msg_id, 'date': date, 'from': 'a@example.com', 'subject': msg_id}
+
+
+def test_rows_go_to_the_tab_of_their_month(sheets, catalog, backend):
+    writer = partitioned(sheets, catalog, mode='month')
+    for msg_id, date in [('may-1', '2024-05-03 10:00:00'), ('jun-1', '2024-06-01 08:00:00'),
+                         ('may-2', '2024-05-30 23:59:00')]:
+        writer.add(row(msg_id, date))
+    writer.flush()
+
+    assert sheet_ids(backend, 'Log 2024-05') == ['may-1', 'may-2']
+    assert sheet_ids(backend, 'Log 2024-06') == ['jun-1']
+    assert catalog.find_message('jun-1') == (SPREADSHEET_ID, 'Log 2024-06')
+    assert catalog.find_message('unknown') is None
+    assert catalog.partitions(SPREADSHEET_ID, BASE_NAME, start_date='2024-06-01') == [
+        ('Log 2024-06', '2024-06', 1, 1, '2024-06-01 08:00:00', '2024-06-01 08:00:00')]
+
+
+def test_full_partition_rolls_over_to_the_next_tab(sheets, catalog, backend):
+    writer = partitioned(sheets, catalog, mode='size', max_rows=2)
+    for i in range(5):
+        writer.add(row(f'id-{i}', f'2024-05-0{i + 1} 10:00:00'))
+    writer.flush()
+
+    assert sheet_ids(backend, 'Log') == ['id-0', 'id-1']
+    assert sheet_ids(backend, 'Log (2)') == ['id-2', 'id-3']
+    assert sheet_ids(backend, 'Log (3)') == ['id-4']
+    counts = [(tab, count) for tab, _, _, count, *_ in
+              catalog.partitions(SPREADSHEET_ID, BASE_NAME)]
+    assert counts == [('Log', 2), ('Log (2)', 2), ('Log (3)', 1)]
+    assert catalog.find_message('id-4') == (SPREADSHEET_ID, 'Log (3)')
+
+    # A new writer continues in the newest partition
+    writer = partitioned(sheets, catalog, mode='size', max_rows=2)
+    assert writer.active_tabs() == ['Log (3)']
+
+
+def test_partition_tabs_are_created_on_their_first_row(sheets, catalog, backend):
+    writer = partitioned(sheets, catalog, mode='month')
+
+    assert writer.active_tabs() == []
+    assert backend.calls['sheets.batchUpdate'] == 0
+    assert catalog.partitions(SPREADSHEET_ID, BASE_NAME) == []
+
+    writer.add(row('old', '2023-01-15 12:00:00'))
+    writer.flush()
+
+    assert sheet_ids(backend, 'Log 2023-01') == ['old']
+    # No tab for the current month yet, so reconciles read the newest one
+    assert partitioned(sheets, catalog, mode='month').active_tabs() == ['Log 2023-01']
+
+
+def test_partitioned_sync_creates_only_the_months_it_writes(
+        gmail, sheets, state, dedup, backend, monkeypatch):
+    monkeypatch.setattr(config, 'SHEET_PARTITION', 'month')
+
+    result = run_sync(gmail, sheets, state, dedup, SPREADSHEET_ID, BASE_NAME,
+                      rebuild_index=True)
+
+    tabs = {title: tab for title, tab in backend.spreadsheets[SPREADSHEET_ID].tabs.items()
+            if title.startswith(BASE_NAME)}
+    catalog = PartitionCatalog(Path(dedup.db_path).with_name("partitions.db"))
+    assert result.ok and result.committed == 30
+    assert sum(len(tabs[tab]['ids']) for tab in tabs) == 30
+    assert sorted(tabs) == sorted(tab for tab, *_ in catalog.partitions(SPREADSHEET_ID, BASE_NAME))
+    for tab in tabs:
+        assert all(catalog.find_message(msg_id) == (SPREADSHEET_ID, tab)
+                   for msg_id in tabs[tab]['ids'])
+    catalog.close()
@@ -0,0 +1,119 @@
+# tests/test_pipeline.py
+from benchmarks.fake_google import SyntheticMailbox
+from src.email_parser import EmailParser
+from src.message_cache import ReparseIndex
+from src.pipeline import EmailPipeline
+
+from conftest import MISSING_ID, ListSink
+
+
+class FlakyParser(EmailParser):
+    """Parser whose batch call blows up on chunks holding a poisoned id"""
+
+    def __init__(self, poisoned):
+        self.poisoned = set(poisoned)
+
+    def parse_batch(self, messages):
+        if any(message['id'] in self.poisoned for message in messages):
+            raise RuntimeError("parser crashed")
+        return [self.parse_email(message) for message in messages]
+
+
+def listing(count):
+    return [SyntheticMailbox.message_id(i) for i in range(count)]
+
+
+def run_pipeline(gmail, writer, msg_ids, **options):
+    pipeline = EmailPipeline(gmail, writer, ReparseIndex(), fetch_workers=4, parse_workers=2,
+                             batch_size=5, **options)
+    return pipeline.run(msg_ids)
+
+
+def test_rows_commit_in_listing_order(gmail, backend):
+    writer = ListSink(max_rows=5)
+    msg_ids = listing(30)
+
+    result = run_pipeline(gmail, writer, msg_ids)
+
+    assert result.ok
+    assert result.committed == 30
+    assert [row['message_id'] for row in writer.rows] == msg_ids
+    assert backend.mailbox.read == set(msg_ids)
+
+
+def test_only_committed_rows_are_marked_read(gmail, backend):
+    msg_ids = listing(30)
+    writer = ListSink(poisoned=[msg_ids[12]], max_rows=5)
+
+    result = run_pipeline(gmail, writer, msg_ids)
+
+    lost = set(msg_ids[10:15])
+    assert not result.ok
+    assert result.write_failed == 5
+    assert result.committed == result.marked == 25
+    assert [row['message_id'] for row in writer.rows] == [m for m in msg_ids if m not in lost]
+    assert backend.mailbox.read == set(msg_ids) - lost
+
+
+def test_stage_error_counts_the_chunk_and_keeps_order(gmail, backend):
+    msg_ids = listing(30)
+    writer = ListSink(max_rows=5)
+
+    result = run_pipeline(gmail, writer, msg_ids, parser=FlakyParser([msg_ids[7]]))
+
+    lost = set(msg_ids[5:10])
+    assert not result.ok
+    assert result.stage_failed == 5
+    assert result.committed == 25
+    assert [row['message_id'] for row in writer.rows] == [m for m in msg_ids if m not in lost]
+    assert backend.mailbox.read == set(msg_ids) - lost
+
+
+def test_message_deleted_after_listing_is_skipped(gmail, backend):
+    msg_ids = listing(9) + [MISSING_ID]
+    writer = ListSink(max_rows=5)
+
+    result = run_pipeline(gmail, writer, msg_ids)
+
+    assert result.ok
+    assert result.gone == 1
+    assert result.fetch_failed == 0
+    assert [row['message_id'] for row in writer.rows] == msg_ids[:9]
+
+
+def test_budget_stops_listing(gmail):
+    writer = ListSink(max_rows=5)
+
+    result = run_pipeline(gmail, writer, listing(30), budget=12)
+
+    assert result.budget_exhausted
+    assert not result.ok
+    assert result.committed == 12
+
+
+class BrokenSink(ListSink):
+    """Sink whose add() raises once a row is buffered past `limit` rows"""
+
+    def __init__(self, limit, **options):
+        super().__init__(**options)
+        self.limit = limit
+
+    def add(self, row_data):
+        committed = super().add(row_data)
+        if len(self.buffer) >= self.limit:
+            raise RuntimeError("sink broke")
+        return committed
+
+
+def test_writer_error_counts_buffered_rows_and_drops_them(gmail, backend):
+    writer = BrokenSink(limit=9, max_rows=20)
+
+    result = run_pipeline(gmail, writer, listing(30))
+
+    assert not result.ok
+    assert result.committed == 0
+    assert result.stage_failed == 30
+    assert writer.buffer == []
+    assert writer.close() == []
+    assert writer.rows == []
+    assert backend.mailbox.read == set()
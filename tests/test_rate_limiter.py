@@ -0,0 +1,94 @@
+# tests/test_rate_limiter.py
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from src.rate_limiter import AdaptiveRateLimiter, TokenBucket
+
+
+class ScriptedRequest:
+    """Request whose execute() fails with the given statuses, then succeeds"""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def execute(self):
+        self.calls += 1
+        if self.statuses:
+            status = self.statuses.pop(0)
+            raise HttpError(httplib2.Response({'status': status}), b'{}')
+        return {'ok': True}
+
+
+def make_limiter(**options):
+    options.setdefault('base_delay', 0)
+    return AdaptiveRateLimiter(limits={'gmail': (100.0, 200.0)}, **options)
+
+
+def test_throttling_halves_the_rate_down_to_the_floor():
+    limiter = make_limiter(min_rate_ratio=0.1)
+    bucket = limiter.buckets['gmail']
+
+    limiter.on_throttle('gmail')
+    assert bucket.rate == 50.0
+
+    for _ in range(5):
+        limiter.on_throttle('gmail')
+    assert bucket.rate == 20.0
+
+
+def test_clean_calls_raise_the_rate_up_to_the_maximum():
+    limiter = make_limiter(increase_after=3, increase_step=0.25)
+    bucket = limiter.buckets['gmail']
+
+    for _ in range(2):
+        limiter.on_success('gmail')
+    assert bucket.rate == 100.0
+    limiter.on_success('gmail')
+    assert bucket.rate == 150.0
+
+    for _ in range(30):
+        limiter.on_success('gmail')
+    assert bucket.rate == 200.0
+
+
+def test_retryable_errors_are_retried_and_slow_the_api_down():
+    limiter = make_limiter()
+    request = ScriptedRequest(429, 503)
+
+    assert limiter.execute(request, 'gmail', 'messages.get') == {'ok': True}
+    assert request.calls == 3
+    assert limiter.buckets['gmail'].rate == 25.0
+
+
+def test_other_errors_and_exhausted_retries_are_raised():
+    limiter = make_limiter(max_retries=2)
+
+    request = ScriptedRequest(404)
+    with pytest.raises(HttpError):
+        limiter.execute(request, 'gmail', 'messages.get')
+    assert request.calls == 1
+
+    request = ScriptedRequest(500, 500, 500)
+    with pytest.raises(HttpError):
+        limiter.execute(request, 'gmail', 'messages.get')
+    assert request.calls == 3
+
+
+def test_calls_are_charged_in_quota_units():
+    limiter = make_limiter()
+    bucket = limiter.buckets['gmail']
+
+    limiter.acquire('gmail', 'messages.get', count=4)
+    limiter.acquire('gmail', 'getProfile')
+
+    assert 100.0 - bucket.tokens == pytest.approx(21, abs=1)
+
+
+def test_oversized_request_goes_through_once_the_bucket_is_full():
+    bucket = TokenBucket(rate=10.0)
+
+    bucket.acquire(50)
+
+    assert bucket.tokens < 0
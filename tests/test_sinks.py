@@ -0,0 +1,64 @@
+# tests/test_sinks.py
+import sqlite3
+
+from src.sinks import FanOutSink, SQLiteSink
+
+from conftest import ListSink
+
+
+def row(n):
+    return {'message_id': f'id-{n}', 'from': 'a@example.com', 'subject': f'Subject {n}',
+            'date': f'2024-01-{n + 1:02d}', 'content': 'body', 'thread_id': 't'}
+
+
+def ids(rows):
+    return [r['message_id'] for r in rows]
+
+
+def test_row_commits_once_every_sink_has_it():
+    fast = ListSink(max_rows=1)
+    slow = ListSink(max_rows=3)
+    sink = FanOutSink([fast, slow])
+
+    assert sink.add(row(0)) == []
+    assert sink.add(row(1)) == []
+    assert ids(sink.add(row(2))) == ['id-0', 'id-1', 'id-2']
+    assert sink.committed_count == 3
+
+
+def test_row_failed_in_one_sink_is_not_committed():
+    good = ListSink(max_rows=10)
+    bad = ListSink(poisoned=['id-1'], max_rows=10)
+    sink = FanOutSink([good, bad])
+    for n in range(3):
+        sink.add(row(n))
+
+    assert sink.close() == []
+    assert ids(good.rows) == ['id-0', 'id-1', 'id-2']
+    assert sorted(ids(sink.failed)) == ['id-0', 'id-1', 'id-2']
+
+
+def test_close_flushes_and_releases_every_sink(tmp_path):
+    sqlite = SQLiteSink(tmp_path / "emails.db", max_rows=10)
+    listed = ListSink(max_rows=10)
+    sink = FanOutSink([sqlite, listed])
+    for n in range(4):
+        sink.add(row(n))
+
+    assert ids(sink.close()) == ['id-0', 'id-1', 'id-2', 'id-3']
+    assert sink.committed_count == 4
+    assert ids(listed.rows) == ['id-0', 'id-1', 'id-2', 'id-3']
+    with sqlite3.connect(tmp_path / "emails.db") as conn:
+        assert conn.execute("SELECT COUNT(*) FROM emails").fetchone()[0] == 4
+
+
+def test_discard_drops_rows_not_committed_everywhere():
+    fast = ListSink(max_rows=1)
+    slow = ListSink(max_rows=10)
+    sink = FanOutSink([fast, slow])
+    for n in range(3):
+        sink.add(row(n))
+
+    assert ids(sink.discard()) == ['id-0', 'id-1', 'id-2']
+    assert sink.close() == []
+    assert slow.rows == []
@@ -0,0 +1,118 @@
+# tests/test_sync.py
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from src.main import run_sync
+from src.pipeline import EmailPipeline
+
+from conftest import SHEET_NAME, SPREADSHEET_ID, reject_batch_modify, sheet_ids
+
+
+def sync(gmail, sheets, state, dedup, **options):
+    return run_sync(gmail, sheets, state, dedup, SPREADSHEET_ID, SHEET_NAME, **options)
+
+
+def test_checkpoints_wait_until_budgeted_passes_drain_the_listing(
+        gmail, sheets, state, dedup, backend):
+    for _ in range(2):
+        result = sync(gmail, sheets, state, dedup, budget=10)
+        assert result.budget_exhausted
+        assert result.committed == 10
+        # Older unread mail is still below the newest committed date
+        assert state.load_state() is None
+        assert state.load_history_id() is None
+
+    result = sync(gmail, sheets, state, dedup, budget=10)
+
+    assert result.ok
+    assert result.committed == 10
+    assert state.load_state() is not None
+    assert state.load_history_id() is not None
+    assert len(sheet_ids(backend)) == len(set(sheet_ids(backend))) == 30
+    assert len(backend.mailbox.read) == 30
+
+
+def test_failed_append_keeps_checkpoints_and_leaves_mail_unread(
+        gmail, sheets, state, dedup, backend):
+    sheets.append_rows = lambda spreadsheet_id, sheet_name, rows: False
+
+    result = sync(gmail, sheets, state, dedup)
+
+    assert result.write_failed == 30
+    assert result.marked == 0
+    assert backend.mailbox.read == set()
+    assert state.load_state() is None
+
+
+def test_unmarked_emails_block_checkpoints_and_are_marked_next_run(
+        gmail, sheets, state, dedup, backend):
+    route = backend._gmail
+    reject_batch_modify(backend, 403)
+
+    result = sync(gmail, sheets, state, dedup)
+
+    assert result.committed == 30
+    assert len(result.unmarked_ids) == 30
+    assert not result.ok
+    assert state.load_state() is None
+    assert len(state.load_unlabelled()) == 30
+
+    backend._gmail = route
+    result = sync(gmail, sheets, state, dedup)
+
+    assert result.ok
+    assert result.committed == 0
+    assert len(backend.mailbox.read) == 30
+    assert state.load_unlabelled() == []
+    assert len(sheet_ids(backend)) == 30
+
+
+def test_appended_rows_are_not_read_back_by_the_next_reconcile(
+        gmail, sheets, state, dedup, backend):
+    sync(gmail, sheets, state, dedup, budget=10)
+
+    # Header plus the ten rows this run appended
+    assert dedup.get_row_count(SPREADSHEET_ID, SHEET_NAME) == 11
+    assert dedup.reconcile(sheets, SPREADSHEET_ID, SHEET_NAME) == 0
+
+
+def test_rows_appended_by_someone_else_are_left_for_reconcile(sheets, dedup, backend):
+    sheets.ensure_sheet(SPREADSHEET_ID, SHEET_NAME)
+    sheets.append_rows(SPREADSHEET_ID, SHEET_NAME, [{'message_id': 'by-hand'}])
+
+    first_row, last_row = sheets.append_rows(SPREADSHEET_ID, SHEET_NAME,
+                                             [{'message_id': 'ours'}])
+    dedup.record_rows(SPREADSHEET_ID, SHEET_NAME, ['ours'], first_row, last_row)
+
+    assert (first_row, last_row) == (3, 3)
+    assert dedup.get_row_count(SPREADSHEET_ID, SHEET_NAME) == 1
+    assert dedup.reconcile(sheets, SPREADSHEET_ID, SHEET_NAME) == 2
+    assert 'by-hand' in dedup and 'ours' in dedup
+
+
+def test_daemon_passes_reuse_pipeline_threads_and_skip_sheet_checks(
+        gmail, sheets, state, dedup, backend):
+    threads_needed = EmailPipeline.thread_count(
+        config.FETCH_WORKERS, config.PARSE_WORKERS, config.LABEL_WORKERS)
+    executor = ThreadPoolExecutor(max_workers=threads_needed)
+    formatted_tabs = set()
+    checked = []
+    ensure_sheet = sheets.ensure_sheet
+
+    def counting_ensure_sheet(spreadsheet_id, sheet_name):
+        checked.append(sheet_name)
+        return ensure_sheet(spreadsheet_id, sheet_name)
+
+    sheets.ensure_sheet = counting_ensure_sheet
+    try:
+        for _ in range(3):
+            result = sync(gmail, sheets, state, dedup, budget=10, executor=executor,
+                          formatted_tabs=formatted_tabs)
+            assert result.committed == 10
+        threads = set(executor._threads)
+    finally:
+        executor.shutdown(wait=True)
+
+    assert checked == [SHEET_NAME]
+    assert len(threads) <= threads_needed
+    assert len(sheet_ids(backend)) == len(set(sheet_ids(backend))) == 30
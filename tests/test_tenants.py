@@ -0,0 +1,113 @@
+# tests/test_tenants.py
+import json
+
+import pytest
+from google.auth.credentials import AnonymousCredentials
+
+from src.main import run_sync
+from src.pipeline import PipelineResult
+from src.tenants import MultiTenantRunner, Tenant, load_tenants
+
+from conftest import SPREADSHEET_ID, sheet_ids
+
+
+def write_config(path, data):
+    path.write_text(json.dumps(data))
+    return path
+
+
+def test_config_lists_tenants_and_spreadsheet_budgets(tmp_path):
+    path = write_config(tmp_path / "tenants.json", {
+        'tenants': [
+            {'name': 'alice', 'spreadsheet_id': 'shared', 'sheet_name': 'Alice', 'weight': 2},
+            {'name': 'bob', 'spreadsheet_id': 'shared'},
+        ],
+        'spreadsheets': {'shared': {'requests_per_sec': 0.5}},
+    })
+
+    tenants, budgets = load_tenants(path)
+
+    assert [(t.name, t.sheet_name, t.weight) for t in tenants] == [
+        ('alice', 'Alice', 2), ('bob', 'Sheet1', 1)]
+    assert budgets == {'shared': 0.5}
+
+
+@pytest.mark.parametrize('tenants, message', [
+    ([{'name': 'a', 'spreadsheet_id': 's'}, {'name': 'a', 'spreadsheet_id': 't'}], 'Duplicate'),
+    ([{'name': '../a', 'spreadsheet_id': 's'}], 'Invalid tenant name'),
+    ([{'name': 'a'}], 'need'),
+    ([], 'No tenants'),
+])
+def test_bad_tenant_configs_are_rejected(tmp_path, tenants, message):
+    path = write_config(tmp_path / "tenants.json", {'tenants': tenants})
+
+    with pytest.raises(ValueError, match=message):
+        load_tenants(path)
+
+
+def result_for(queued, budget):
+    result = PipelineResult()
+    result.committed = result.queued = min(queued, budget)
+    result.budget_exhausted = queued > budget
+    return result
+
+
+def test_slices_rotate_so_a_large_mailbox_cannot_hog_the_pool(tmp_path):
+    backlog = {'big': 25, 'small': 5}
+    order = []
+
+    def sync(tenant, budget):
+        order.append(tenant.name)
+        result = result_for(backlog[tenant.name], budget)
+        backlog[tenant.name] -= result.queued
+        return result
+
+    tenants = [Tenant(name, 's', data_dir=tmp_path / name) for name in ('big', 'small')]
+    MultiTenantRunner(tenants, sync, workers=1, slice_size=10).run()
+
+    assert order == ['big', 'small', 'big', 'big']
+    assert [tenant.committed for tenant in tenants] == [25, 5]
+
+
+def test_tenants_on_one_spreadsheet_share_its_sheets_budget(backend, tmp_path):
+    tenants = [Tenant(name, SPREADSHEET_ID, sheet_name=name, data_dir=tmp_path / name)
+               for name in ('alice', 'bob')]
+    runner = MultiTenantRunner(tenants, sync=None, sheets_budgets={SPREADSHEET_ID: 1e9})
+
+    runner.open(credentials=AnonymousCredentials(), http_factory=backend.http)
+
+    alice, bob = (tenant.sheets.limiter for tenant in tenants)
+    assert alice.buckets['sheets'] is bob.buckets['sheets']
+    assert alice.buckets['gmail'] is not bob.buckets['gmail']
+    # Additive increases never lift the shared bucket past the spreadsheet budget
+    for _ in range(100):
+        alice.on_success('sheets')
+    assert alice.buckets['sheets'].rate == 1e9
+    runner.close()
+
+
+def test_each_tenant_syncs_into_its_own_tab_with_its_own_state(backend, tmp_path):
+    tenants = [Tenant(name, SPREADSHEET_ID, sheet_name=name, data_dir=tmp_path / name)
+               for name in ('alice', 'bob')]
+
+    def sync(tenant, budget):
+        return run_sync(tenant.gmail, tenant.sheets, tenant.state, tenant.dedup,
+                        tenant.spreadsheet_id, tenant.sheet_name, budget=budget)
+
+    runner = MultiTenantRunner(tenants, sync, workers=1, slice_size=10,
+                               sheets_budgets={SPREADSHEET_ID: 1e9})
+    runner.open(credentials=AnonymousCredentials(), http_factory=backend.http)
+    for tenant in tenants:
+        tenant.gmail.limiter.base_delay = 0
+    runner.run()
+    runner.close()
+
+    # Both tenants read the same fake mailbox; mail one marks read is gone
+    # for the other, so slices alternate until the 30 unread emails run out
+    alice, bob = (sheet_ids(backend, tenant.name) for tenant in tenants)
+    assert (len(alice), len(bob)) == (20, 10)
+    assert not set(alice) & set(bob)
+    assert [tenant.slices for tenant in tenants] == [2, 2]
+    for tenant in tenants:
+        assert (tmp_path / tenant.name / "processed_ids.db").exists()
+        assert (tmp_path / tenant.name / "last_processed.json").exists()